@@ -8,17 +8,55 @@ from result import Result
 
 from TrafficGenerator import TrafficGenerator
 from simulation import ServiceChain, Substrate
+from simulation.ActionLog import ActionLog, recorded
+from simulation.Metrics import MetricsRegistry
 from simulation.Simulation import Simulation
 
 
 class Environment:
     simulation: Simulation = None
     traffic_generator: TrafficGenerator = None
+    actionLog: ActionLog | None = None
 
-    def __init__(self):
-        self.simulation = Simulation()
+    def __init__(self, substrate: Substrate.Substrate | None = None):
+        self.simulation = Simulation(substrate)
         self.traffic_generator = TrafficGenerator()
 
+    @property
+    def metrics(self) -> MetricsRegistry:
+        return self.simulation.metrics
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["actionLog"] = None
+        return state
+
+    def record_actions(self, path: str, keyframe_interval: int = 100) -> ActionLog:
+        """
+        write every poll, embed and step to a binary action log from now on, replay it with
+        simulation.ActionLog.replay
+        :param path:
+        :param keyframe_interval: steps between keyframes
+        :return:
+        """
+        self.stop_recording()
+        self.actionLog = ActionLog(path, self, "step", keyframe_interval)
+        return self.actionLog
+
+    def stop_recording(self) -> None:
+        if self.actionLog is not None:
+            self.actionLog.close()
+            self.actionLog = None
+
+    @staticmethod
+    def replay_entities() -> list:
+        return []
+
+    @staticmethod
+    def replay_entity_types() -> tuple:
+        return ()
+
+    @recorded
     def poll(self) -> (Substrate, ServiceChain):
         """
         return the current state of the substrate and a service request
@@ -30,6 +68,7 @@ class Environment:
 
         return state, request
 
+    @recorded
     def embed(self, embedding: ServiceChain) -> Result[None, str]:
         """
         given a service chain containing a proposed embedding, try to
@@ -44,4 +83,6 @@ class Environment:
         update the simulation time
         :return:
         """
-        self.simulation.step(time_elapsed)
\ No newline at end of file
+        self.simulation.step(time_elapsed)
+        if self.actionLog is not None:
+            self.actionLog.write_tick(self, time_elapsed)
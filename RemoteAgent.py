@@ -3,17 +3,36 @@ dummy remote agent used for testing,
 a RemoteAgent receives the state of the substrate network and
 a service request and tries to map the request on the network.
 """
+from result import Result
 
 from Environment import Environment
 from simulation import Substrate, ServiceChain
+from simulation import Embedding
+
+
+def build_substrate(hosts: int = 4) -> Substrate.Substrate:
+    """
+    small ring of hosts, each big enough for a few requests of the TrafficGenerator
+    :param hosts:
+    :return:
+    """
+    substrate = Substrate.Substrate()
+    for _ in range(hosts):
+        substrate.add_host(Substrate.Host(cpu_avail=2000, mem_avail=1000, storage_avail=2048))
+    host_uids = list(substrate.nodes)
+    for source_host, destination_host in zip(host_uids, host_uids[1:] + host_uids[:1]):
+        substrate.add_link(source_host, destination_host, Substrate.Link(bandwidth_avail=1000, latency=5,
+                                                                          transfer_rate=1000))
+    return substrate
+
 
 # init the environment
-env = Environment()
+env = Environment(build_substrate())
 
 (state, service_request) = env.poll()  # these could be serialized in the future
 
 
-def generate_embedding(state: Substrate, request: ServiceChain) -> ServiceChain:
+def generate_embedding(state: Substrate, request: ServiceChain) -> Result[ServiceChain, str]:
     """
     receives the state of the substrate network and an unembedded servicechain
     and returns a service chain with the proposed embedding
@@ -22,9 +41,17 @@ def generate_embedding(state: Substrate, request: ServiceChain) -> ServiceChain:
     :return:
     """
     print("Generating embedding..")
+    embedding, elapsed = Embedding.solve("latency_greedy", state, request)
+    print(f'Embedding solved in {elapsed * 1000:.3f} ms')
+
+    return embedding
 
 
 embedding = generate_embedding(state, service_request)
 
-env.embed(embedding).unwrap()
-env.step()
+if embedding.is_ok():
+    allocation = env.embed(embedding.ok_value)
+    print("Embedded" if allocation.is_ok() else f'Embedding rejected: {allocation.err_value}')
+else:
+    print(f'No embedding: {embedding.err_value}')
+env.step(1.0)
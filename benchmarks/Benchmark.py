@@ -0,0 +1,296 @@
+"""
+Scaling benchmark suite for VNFnet.
+
+Builds seeded synthetic topologies of increasing size and measures the cost of the
+main APIs (admission, teardown, migration, metrics, simulation step), the peak RSS
+and the import time. Every topology size runs in its own interpreter so peak RSS
+is not shared between sizes. Results are compared against a stored JSON baseline
+and regressions beyond the tolerance are flagged (exit code 1).
+
+usage:
+    python benchmarks/Benchmark.py                       # default sizes, compare with baseline.json
+    python benchmarks/Benchmark.py --sizes 100 1000      # subset of sizes
+    python benchmarks/Benchmark.py --update-baseline     # store the results as the new baseline
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_SIZES = [100, 1000, 10000, 50000]
+
+# metric name -> True when a higher value is better
+METRICS = {
+    "build_s": False,
+    "admissions_per_sec": True,
+    "teardowns_per_sec": True,
+    "migrations_per_sec": True,
+    "service_data_per_sec": True,
+    "tick_metric_ms": False,
+    "steps_per_sec": True,
+    "peak_rss_mb": False,
+    "csr_paths_per_sec": True,
+    "nx_paths_per_sec": True,
+    "csr_k_paths_per_sec": True,
+    "nx_k_paths_per_sec": True,
+}
+
+
+def build_network(hosts: int, seed: int):
+    """
+    the seeded topology of simulation.Scenario.random_topology with one user per admission
+    attached to a random host
+    :param hosts:
+    :param seed:
+    :return:
+    """
+    from simulation.Scenario import random_topology
+
+    net, hostObjects, vms, chains, rng = random_topology(hosts, seed, title="benchmark_" + str(hosts))
+
+    users = []
+    for i in range(min(500, hosts)):
+        user = net.add_user("user" + str(i), rng.choice(chains), data_rate=0.01)
+        net.add_link(user, rng.choice(hostObjects), bandwidth=100, delay=1)
+        users.append(user)
+
+    return net, users, vms, hostObjects, rng
+
+
+def run_routing(net, hostObjects: list, rng: random.Random, results: dict) -> None:
+    """
+    compare the CSR routing engine of simulation.Substrate with networkx on the host-to-host links of net:
+    point-to-point shortest paths and k = 4 shortest paths (Yen) between the same random host pairs
+    :param net:
+    :param hostObjects:
+    :param rng:
+    :param results:
+    :return:
+    """
+    import networkx as nx
+
+    from simulation.Substrate import Substrate, Host, Link
+
+    substrate = Substrate()
+    substrateUid = {}
+    for host in hostObjects:
+        substrate.add_host(Host(host.CPUcap, host.RAMcap, host.StorageCap))
+        substrateUid[host.uid] = substrate.uid_counter
+    graph = nx.Graph()
+    for link in net.networkLinks:
+        if link.source.uid in substrateUid and link.destination.uid in substrateUid:
+            substrate.add_link(substrateUid[link.source.uid], substrateUid[link.destination.uid],
+                               Link(link.bandwidthCap, link.latency, link.bandwidthCap))
+            graph.add_edge(link.source.uid, link.destination.uid, delay=link.latency)
+    substrate.routing_graph()
+
+    pairs = [rng.sample(hostObjects, 2) for _ in range(200)]
+
+    start = time.perf_counter()
+    for a, b in pairs:
+        substrate.shortest_path(substrateUid[a.uid], substrateUid[b.uid])
+    results["csr_paths_per_sec"] = len(pairs) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for a, b in pairs:
+        nx.single_source_dijkstra(graph, a.uid, b.uid, weight='delay')
+    results["nx_paths_per_sec"] = len(pairs) / (time.perf_counter() - start)
+
+    pairs = pairs[:20]
+    start = time.perf_counter()
+    for a, b in pairs:
+        substrate.k_shortest_paths(substrateUid[a.uid], substrateUid[b.uid], 4)
+    results["csr_k_paths_per_sec"] = len(pairs) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for a, b in pairs:
+        list(itertools.islice(nx.shortest_simple_paths(graph, a.uid, b.uid, weight='delay'), 4))
+    results["nx_k_paths_per_sec"] = len(pairs) / (time.perf_counter() - start)
+
+
+def run_size(hosts: int, seed: int) -> dict:
+    """
+    run all benchmarks on one topology size, in the current process
+    :param hosts:
+    :param seed:
+    :return:
+    """
+    import resource
+
+    import vnfnet  # imported up front so the build time does not include it
+    from simulation.Simulation import Simulation
+
+    results = {}
+
+    start = time.perf_counter()
+    net, users, vms, hostObjects, rng = build_network(hosts, seed)
+    results["build_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    connections = [net.start_traffic(user) for user in users]
+    results["admissions_per_sec"] = len(users) / (time.perf_counter() - start)
+    connections = [connection for connection in connections if connection]
+
+    start = time.perf_counter()
+    for connection in connections:
+        net.service_data(connection)
+    results["service_data_per_sec"] = len(connections) / max(time.perf_counter() - start, 1e-12)
+
+    # per-tick metric cost: RTT and throughput sample of every active connection
+    ticks = 5
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for connection in connections:
+            net.service_ping(connection)
+            net.service_perf(connection)
+    results["tick_metric_ms"] = (time.perf_counter() - start) / ticks * 1000
+
+    migrations = 20
+    start = time.perf_counter()
+    for _ in range(migrations):
+        vm = rng.choice(vms)
+        net.migrate_vm(vm, vm.host, rng.choice(hostObjects))
+    results["migrations_per_sec"] = migrations / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for connection in connections:
+        net.stop_traffic(connection)
+    results["teardowns_per_sec"] = len(connections) / max(time.perf_counter() - start, 1e-12)
+
+    run_routing(net, hostObjects, rng, results)
+
+    simulation = Simulation()
+    steps = 10000
+    start = time.perf_counter()
+    for _ in range(steps):
+        simulation.step(1)
+    results["steps_per_sec"] = steps / (time.perf_counter() - start)
+
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    results["admitted"] = len(connections)
+
+    return results
+
+
+def measure_import_time(work_dir: str, repeats=5) -> float:
+    """
+    best of several cold imports of vnfnet, in ms
+    :param work_dir:
+    :param repeats:
+    :return:
+    """
+    code = "import time; t = time.perf_counter(); import vnfnet; print(time.perf_counter() - t)"
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_ROOT)
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], cwd=work_dir, env=environment, check=True,
+                                capture_output=True, text=True).stdout
+        timings.append(float(output.strip().splitlines()[-1]) * 1000)
+    return min(timings)
+
+
+def run_suite(sizes: list[int], seed: int) -> dict:
+    # vnfnet writes its log next to the working directory, keep it out of the repository
+    work_dir = tempfile.mkdtemp(prefix="vnfnet_benchmark_")
+    environment = dict(os.environ, PYTHONPATH=REPOSITORY_ROOT)
+
+    suite = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": seed,
+        },
+        "import_time_ms": measure_import_time(work_dir),
+        "sizes": {},
+    }
+
+    for hosts in sizes:
+        print("[Benchmark] " + str(hosts) + " hosts ...", flush=True)
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", str(hosts), "--seed", str(seed)],
+                                cwd=work_dir, env=environment, check=True, capture_output=True, text=True).stdout
+        suite["sizes"][str(hosts)] = json.loads(output.strip().splitlines()[-1])
+
+    return suite
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    return a message for every metric that is worse than the baseline by more than tolerance
+    :param results:
+    :param baseline:
+    :param tolerance: relative, e.g. 0.2 for 20%
+    :return:
+    """
+    regressions = []
+
+    pairs = [("import_time_ms", results["import_time_ms"], baseline.get("import_time_ms"), False)]
+    for size, metrics in results["sizes"].items():
+        baselineMetrics = baseline.get("sizes", {}).get(size, {})
+        for name, higherIsBetter in METRICS.items():
+            pairs.append((size + "/" + name, metrics.get(name), baselineMetrics.get(name), higherIsBetter))
+
+    for name, current, reference, higherIsBetter in pairs:
+        if current is None or not reference:
+            continue
+        if higherIsBetter and current < reference * (1 - tolerance):
+            regressions.append(name + ": " + format(current, ".4g") + " < baseline " + format(reference, ".4g"))
+        if not higherIsBetter and current > reference * (1 + tolerance):
+            regressions.append(name + ": " + format(current, ".4g") + " > baseline " + format(reference, ".4g"))
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="VNFnet scaling benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="topology sizes (hosts)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown flagged as regression")
+    parser.add_argument("--output", help="write the results JSON to this file")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        print(json.dumps(run_size(args.worker, args.seed)))
+        return 0
+
+    results = run_suite(args.sizes, args.seed)
+
+    for size, metrics in results["sizes"].items():
+        print(" |- " + size + " hosts: " + ", ".join(name + "=" + format(value, ".4g")
+                                                   for name, value in metrics.items()))
+    print(" |- import_time_ms=" + format(results["import_time_ms"], ".4g"))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print("Baseline updated: " + args.baseline)
+        return 0
+
+    if not os.path.isfile(args.baseline):
+        print("No baseline found at " + args.baseline + ", run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline) as file:
+        regressions = compare(results, json.load(file), args.tolerance)
+    for regression in regressions:
+        print("[Regression] " + regression)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Deterministic binary log of the external actions on a simulation target (vnfnet Network or
+Environment), to reproduce a long run up to a given tick without running it from the start.
+
+Every call of a method decorated with @recorded is written with its arguments; entities
+(the replay_entity_types of the target, e.g. hosts, VMs, users, connections) are written as
+their uid and resolved again during replay, other objects are pickled. Calls made from
+inside another recorded call are not written, they are repeated by the outer call. The tick
+method of the target (e.g. Network.tick) is written as a tick record, and every
+keyframe_interval ticks the whole target is written as a keyframe (pickled together with
+the random and numpy random generator states), so replay starts from the newest keyframe
+at or before the wanted tick.
+
+Records (little endian), after the b"VNFLOG" magic, the format version (u16) and the tick
+method name:
+    DEFINE   u8 0, u16 id, name           method id of the later actions
+    ACTION   u8 1, u16 id, u8 positional count, u8 keyword count, values (keywords as name, value)
+    TICK     u8 2, f64 time elapsed
+    KEYFRAME u8 3, u64 tick, u32 size, pickle
+"""
+import functools
+import logging
+import pickle
+import random
+import struct
+from enum import Enum
+
+import numpy as np
+
+MAGIC = b"VNFLOG"
+VERSION = 1
+
+_DEFINE, _ACTION, _TICK, _KEYFRAME = range(4)
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _REF, _LIST, _ENUM, _OBJECT = range(10)
+
+
+def recorded(method):
+    """
+    method decorator writing the call to self.actionLog (if the target is recording)
+    :param method:
+    :return:
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        log = self.actionLog
+        if log is None:
+            return method(self, *args, **kwargs)
+        if log.depth == 0:
+            log.write_action(method.__name__, args, kwargs)
+        log.depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            log.depth -= 1
+    return wrapper
+
+
+def _write_string(file, text: str) -> None:
+    data = text.encode()
+    file.write(struct.pack("<H", len(data)))
+    file.write(data)
+
+
+def _read_string(file) -> str:
+    size, = struct.unpack("<H", file.read(2))
+    return file.read(size).decode()
+
+
+def _write_value(file, value, entity_types: tuple) -> None:
+    if value is None:
+        file.write(bytes((_NONE,)))
+    elif isinstance(value, bool):
+        file.write(bytes((_TRUE if value else _FALSE,)))
+    elif isinstance(value, Enum):
+        file.write(bytes((_ENUM,)))
+        _write_string(file, type(value).__module__ + ":" + type(value).__name__)
+        _write_string(file, value.name)
+    elif isinstance(value, (int, np.integer)):
+        file.write(struct.pack("<Bq", _INT, int(value)))
+    elif isinstance(value, (float, np.floating)):
+        file.write(struct.pack("<Bd", _FLOAT, float(value)))
+    elif isinstance(value, str):
+        file.write(bytes((_STR,)))
+        _write_string(file, value)
+    elif isinstance(value, (list, tuple)):
+        file.write(struct.pack("<BI", _LIST, len(value)))
+        for item in value:
+            _write_value(file, item, entity_types)
+    elif isinstance(value, entity_types):
+        file.write(struct.pack("<Bq", _REF, value.uid))
+    else:
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        file.write(struct.pack("<BI", _OBJECT, len(data)))
+        file.write(data)
+
+
+def _read_value(file, entities: dict):
+    tag = file.read(1)[0]
+    if tag == _NONE:
+        return None
+    if tag in (_FALSE, _TRUE):
+        return tag == _TRUE
+    if tag == _INT:
+        return struct.unpack("<q", file.read(8))[0]
+    if tag == _FLOAT:
+        return struct.unpack("<d", file.read(8))[0]
+    if tag == _STR:
+        return _read_string(file)
+    if tag == _REF:
+        uid = struct.unpack("<q", file.read(8))[0]
+        return entities[uid]
+    if tag == _LIST:
+        count, = struct.unpack("<I", file.read(4))
+        return [_read_value(file, entities) for _ in range(count)]
+    if tag == _ENUM:
+        moduleName, className = _read_string(file).split(":")
+        enumClass = getattr(__import__(moduleName, fromlist=[className]), className)
+        return enumClass[_read_string(file)]
+    if tag == _OBJECT:
+        size, = struct.unpack("<I", file.read(4))
+        return pickle.loads(file.read(size))
+    raise ValueError(f'unknown value tag {tag} in action log')
+
+
+def _skip_value(file) -> None:
+    tag = file.read(1)[0]
+    if tag in (_INT, _FLOAT, _REF):
+        file.seek(8, 1)
+    elif tag == _STR:
+        _read_string(file)
+    elif tag == _LIST:
+        count, = struct.unpack("<I", file.read(4))
+        for _ in range(count):
+            _skip_value(file)
+    elif tag == _ENUM:
+        _read_string(file)
+        _read_string(file)
+    elif tag == _OBJECT:
+        size, = struct.unpack("<I", file.read(4))
+        file.seek(size, 1)
+
+
+def _register(entities: dict, value, entity_types: tuple) -> None:
+    """ remember the entities a replayed action returned, later actions refer to them by uid """
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            _register(entities, item, entity_types)
+    elif isinstance(value, entity_types):
+        entities[value.uid] = value
+
+
+class ActionLog:
+    """
+    Writer of an action log, created by the record_actions method of the target.
+    """
+    path: str
+    keyframe_interval: int
+    ticks: int  # tick records written so far
+    depth: int  # nesting of recorded calls in progress
+
+    def __init__(self, path: str, target, tick_method: str, keyframe_interval: int = 100) -> None:
+        self.path = path
+        self.keyframe_interval = keyframe_interval
+        self.ticks = 0
+        self.depth = 0
+        self._method_ids: dict[str, int] = {}
+        self._entity_types = tuple(target.replay_entity_types())
+
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + struct.pack("<H", VERSION))
+        _write_string(self._file, tick_method)
+        self.write_keyframe(target)
+
+    def write_action(self, name: str, args: tuple, kwargs: dict) -> None:
+        methodId = self._method_ids.get(name)
+        if methodId is None:
+            methodId = self._method_ids[name] = len(self._method_ids)
+            self._file.write(struct.pack("<BH", _DEFINE, methodId))
+            _write_string(self._file, name)
+
+        self._file.write(struct.pack("<BHBB", _ACTION, methodId, len(args), len(kwargs)))
+        for value in args:
+            _write_value(self._file, value, self._entity_types)
+        for name, value in kwargs.items():
+            _write_string(self._file, name)
+            _write_value(self._file, value, self._entity_types)
+
+    def write_tick(self, target, time_elapsed: float) -> None:
+        """
+        mark the end of a tick, written by the tick method of the target after it ran
+        :param target:
+        :param time_elapsed:
+        :return:
+        """
+        self._file.write(struct.pack("<Bd", _TICK, time_elapsed))
+        self.ticks += 1
+        if self.keyframe_interval and self.ticks % self.keyframe_interval == 0:
+            self.write_keyframe(target)
+
+    def write_keyframe(self, target) -> None:
+        data = pickle.dumps((target, random.getstate(), np.random.get_state()), protocol=pickle.HIGHEST_PROTOCOL)
+        self._file.write(struct.pack("<BQI", _KEYFRAME, self.ticks, len(data)))
+        self._file.write(data)
+        self._file.flush()
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+
+def _scan(file, tick: int | None) -> tuple[dict[int, str], int]:
+    """
+    :return: the method names by id and the offset of the newest keyframe at or before tick
+    """
+    names = {}
+    keyframeOffset = None
+    while True:
+        offset = file.tell()
+        kind = file.read(1)
+        if not kind:
+            break
+        kind = kind[0]
+        if kind == _DEFINE:
+            methodId, = struct.unpack("<H", file.read(2))
+            names[methodId] = _read_string(file)
+        elif kind == _ACTION:
+            _, positional, keywords = struct.unpack("<HBB", file.read(4))
+            for _ in range(positional):
+                _skip_value(file)
+            for _ in range(keywords):
+                _read_string(file)
+                _skip_value(file)
+        elif kind == _TICK:
+            file.seek(8, 1)
+        elif kind == _KEYFRAME:
+            keyframeTick, size = struct.unpack("<QI", file.read(12))
+            if tick is not None and keyframeTick > tick:
+                break
+            keyframeOffset = offset
+            file.seek(size, 1)
+        else:
+            raise ValueError(f'unknown record {kind} in action log')
+    return names, keyframeOffset
+
+
+def replay(path: str, tick: int | None = None):
+    """
+    fast-forward a recorded run: load the newest keyframe at or before tick, then apply the
+    recorded actions up to the end of tick (to the end of the log if None). Logging and the
+    metrics of the target are off while replaying.
+    :param path:
+    :param tick: ticks to replay
+    :return: the target (e.g. Network) as it was at the end of tick, not recording
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not an action log')
+        version, = struct.unpack("<H", file.read(2))
+        if version != VERSION:
+            raise ValueError(f'action log version {version} is not supported')
+        tickMethod = _read_string(file)
+
+        names, keyframeOffset = _scan(file, tick)
+        if keyframeOffset is None:
+            raise ValueError(f'no keyframe at or before tick {tick} in {path}')
+
+        file.seek(keyframeOffset + 1)
+        ticks, size = struct.unpack("<QI", file.read(12))
+        target, randomState, numpyState = pickle.loads(file.read(size))
+        random.setstate(randomState)
+        np.random.set_state(numpyState)
+
+        entityTypes = tuple(target.replay_entity_types())
+        entities = {}
+        _register(entities, list(target.replay_entities()), entityTypes)
+        metrics = getattr(target, "metrics", None)
+        metricsEnabled = metrics is not None and metrics.enabled
+        if metrics is not None:
+            metrics.enabled = False
+        previousDisable = logging.root.manager.disable
+        logging.disable(logging.CRITICAL)
+        try:
+            while tick is None or ticks < tick:
+                kind = file.read(1)
+                if not kind:
+                    break
+                kind = kind[0]
+                if kind == _DEFINE:
+                    file.seek(2, 1)
+                    _read_string(file)
+                elif kind == _ACTION:
+                    methodId, positional, keywords = struct.unpack("<HBB", file.read(4))
+                    args = [_read_value(file, entities) for _ in range(positional)]
+                    kwargs = {}
+                    for _ in range(keywords):
+                        name = _read_string(file)
+                        kwargs[name] = _read_value(file, entities)
+                    _register(entities, getattr(target, names[methodId])(*args, **kwargs), entityTypes)
+                elif kind == _TICK:
+                    timeElapsed, = struct.unpack("<d", file.read(8))
+                    getattr(target, tickMethod)(timeElapsed)
+                    ticks += 1
+                elif kind == _KEYFRAME:
+                    file.seek(8, 1)
+                    size, = struct.unpack("<I", file.read(4))
+                    file.seek(size, 1)
+        finally:
+            logging.disable(previousDisable)
+            if metrics is not None:
+                metrics.enabled = metricsEnabled
+
+    if tick is not None and ticks < tick:
+        raise ValueError(f'{path} ends at tick {ticks}, before tick {tick}')
+    return target
@@ -0,0 +1,235 @@
+from collections import deque
+from enum import Enum
+
+
+class ChangeKind(Enum):
+    VM_PLACED = 1  # value: host uid
+    VM_REMOVED = 2  # value: host uid
+    HOST_CHANGED = 3  # value: (CPU, RAM, storage) utilization
+    LINK_BANDWIDTH_CHANGED = 4  # value: residual bandwidth
+    TOPOLOGY_CHANGED = 5  # hosts or links were added, removed, failed or repaired, uid is None
+    CONNECTION_STARTED = 6
+    CONNECTION_REROUTED = 7
+    CONNECTION_STOPPED = 8  # stopped or dropped
+    CHAIN_EXPIRED = 9
+
+
+_CONNECTION_KINDS = (ChangeKind.CONNECTION_STARTED, ChangeKind.CONNECTION_REROUTED, ChangeKind.CONNECTION_STOPPED)
+
+
+class ChangeEvent:
+    kind: ChangeKind
+    uid: int | None  # of the VM, host, link, connection or chain
+    subject: object  # the changed object (VM, Host, Link, Connection, ServiceChain) if there is one
+    value: object  # see ChangeKind
+
+    def __init__(self, kind: ChangeKind, uid: int | None, subject=None, value=None) -> None:
+        self.kind = kind
+        self.uid = uid
+        self.subject = subject
+        self.value = value
+
+    def __repr__(self) -> str:
+        return "ChangeEvent(" + self.kind.name + ", " + str(self.uid) + ", " + repr(self.value) + ")"
+
+
+def _coalesce(events: dict, event: ChangeEvent) -> None:
+    """
+    add event to the net changes of a batch (key -> event): the last bandwidth or utilization
+    of a link or host wins, a VM placed on and removed from the same host cancels out, and a
+    connection started and stopped within the batch is left out
+    """
+    if event.kind in (ChangeKind.VM_PLACED, ChangeKind.VM_REMOVED):
+        key = ("vm", event.uid, event.value)
+    elif event.kind in _CONNECTION_KINDS:
+        key = ("connection", event.uid)
+    else:
+        key = (event.kind, event.uid)
+
+    previous = events.pop(key, None)
+    if previous is None:
+        events[key] = event
+    elif event.kind in (ChangeKind.VM_PLACED, ChangeKind.VM_REMOVED):
+        if previous.kind == event.kind:
+            events[key] = event
+    elif previous.kind == ChangeKind.CONNECTION_STARTED:
+        if event.kind != ChangeKind.CONNECTION_STOPPED:
+            events[key] = previous
+    else:
+        events[key] = event
+
+
+class ChangeBatch:
+    """
+    Net changes between two flushes of the feed, at most one event per changed entity.
+    A batch merged under backpressure covers the sequence numbers first_sequence to sequence.
+    """
+    sequence: int
+    first_sequence: int
+    tick: float | None
+
+    def __init__(self, sequence: int, tick: float | None, events: dict) -> None:
+        self.sequence = sequence
+        self.first_sequence = sequence
+        self.tick = tick
+        self._events = events
+
+    @property
+    def events(self) -> list[ChangeEvent]:
+        return list(self._events.values())
+
+    def merge(self, batch: "ChangeBatch") -> None:
+        """
+        fold a later batch into this one
+        :param batch:
+        :return:
+        """
+        for event in batch._events.values():
+            _coalesce(self._events, event)
+        self.sequence = batch.sequence
+        self.tick = batch.tick
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+
+class Subscription:
+    """
+    Queue of the batches of one consumer. When the consumer falls max_batches behind, new
+    batches are merged into the newest queued one instead of growing the queue, so a slow
+    consumer costs memory in proportion to the entities that changed, not to the ticks it missed.
+    """
+    kinds: frozenset[ChangeKind] | None
+    max_batches: int
+    mergedBatches: int  # batches folded into a queued one because the queue was full
+
+    def __init__(self, kinds: frozenset[ChangeKind] | None, max_batches: int) -> None:
+        self.kinds = kinds
+        self.max_batches = max(1, max_batches)
+        self.mergedBatches = 0
+        self._queue = deque()
+
+    def _deliver(self, batch: ChangeBatch) -> None:
+        if self.kinds is not None:
+            events = {key: event for key, event in batch._events.items() if event.kind in self.kinds}
+            if not events:
+                return
+            batch = ChangeBatch(batch.sequence, batch.tick, events)
+        else:
+            batch = ChangeBatch(batch.sequence, batch.tick, dict(batch._events))
+
+        if len(self._queue) >= self.max_batches:
+            self._queue[-1].merge(batch)
+            self.mergedBatches += 1
+        else:
+            self._queue.append(batch)
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    def poll(self, max_batches: int | None = None) -> list[ChangeBatch]:
+        """
+        take the queued batches, oldest first
+        :param max_batches: at most this many, all if None
+        :return:
+        """
+        count = len(self._queue) if max_batches is None else min(max_batches, len(self._queue))
+        return [self._queue.popleft() for _ in range(count)]
+
+
+class ChangeFeed:
+    """
+    Publish/subscribe feed of typed change events, so consumers (agents, recorders,
+    visualizers) can keep their own views up to date with work proportional to the change
+    instead of polling the full state. Given a vnfnet Network, the feed registers itself as a
+    state listener and turns its notifications into events; anything else (e.g. Simulation
+    for expired chains) can publish directly. Events are coalesced per entity until flush,
+    which seals them into one numbered batch and hands it to every subscription.
+    """
+    sequence: int  # of the last flushed batch
+
+    def __init__(self, network=None) -> None:
+        self.network = network
+        self.sequence = 0
+        self._events: dict = {}  # net changes since the last flush
+        self._subscriptions: list[Subscription] = []
+        self._active_connections: set[int] = set()  # connection uids, tells started from rerouted
+
+        if network is not None:
+            self._active_connections = {connection.uid for connection in network.trafficActivityList}
+            network.stateListeners.append(self)
+
+    def close(self) -> None:
+        """
+        stop listening to the network
+        :return:
+        """
+        if self.network is not None and self in self.network.stateListeners:
+            self.network.stateListeners.remove(self)
+
+    # Subscriptions
+
+    def subscribe(self, kinds=None, max_batches=64) -> Subscription:
+        """
+        :param kinds: ChangeKinds to receive, all if None
+        :param max_batches: queued batches before new ones are merged into the newest
+        :return:
+        """
+        subscription = Subscription(None if kinds is None else frozenset(kinds), max_batches)
+        self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        if subscription in self._subscriptions:
+            self._subscriptions.remove(subscription)
+
+    # Publishing
+
+    def publish(self, kind: ChangeKind, uid: int | None, subject=None, value=None) -> None:
+        _coalesce(self._events, ChangeEvent(kind, uid, subject, value))
+
+    def flush(self, tick: float | None = None) -> ChangeBatch | None:
+        """
+        seal the changes since the last flush into a batch and deliver it, e.g. once per tick
+        :param tick: simulation time of the batch
+        :return: the batch, None if nothing changed
+        """
+        if not self._events:
+            return None
+
+        self.sequence += 1
+        batch = ChangeBatch(self.sequence, tick, self._events)
+        self._events = {}
+        for subscription in self._subscriptions:
+            subscription._deliver(batch)
+        return batch
+
+    # State listener
+
+    def host_changed(self, host_uid: int) -> None:
+        host = self.network.networkHosts[self.network.hostIndex[host_uid]]
+        self.publish(ChangeKind.HOST_CHANGED, host_uid, host, (host.CPUUtil, host.RAMUtil, host.StorageUtil))
+
+    def link_changed(self, link_uid: int) -> None:
+        link = self.network.linksByUid[link_uid]
+        self.publish(ChangeKind.LINK_BANDWIDTH_CHANGED, link_uid, link, link.bandwidthUtil)
+
+    def topology_changed(self) -> None:
+        self.publish(ChangeKind.TOPOLOGY_CHANGED, None)
+
+    def vm_changed(self, vm, host_uid: int, placed: bool) -> None:
+        self.publish(ChangeKind.VM_PLACED if placed else ChangeKind.VM_REMOVED, vm.uid, vm, host_uid)
+
+    def connection_changed(self, connection) -> None:
+        if not connection.active:
+            if connection.uid not in self._active_connections:
+                return
+            self._active_connections.discard(connection.uid)
+            kind = ChangeKind.CONNECTION_STOPPED
+        elif connection.uid in self._active_connections:
+            kind = ChangeKind.CONNECTION_REROUTED
+        else:
+            self._active_connections.add(connection.uid)
+            kind = ChangeKind.CONNECTION_STARTED
+        self.publish(kind, connection.uid, connection)
@@ -0,0 +1,246 @@
+"""
+Baseline embedding solvers: each takes a Substrate and an unembedded ServiceChain and
+returns a copy of the chain with the host of every function set in vm_id. The substrate
+itself is not changed, the proposed embedding is allocated by Simulation.allocate_chain.
+
+The host residuals are kept in one (hosts x [cpu, memory, storage]) array, so the
+feasibility test and the fit score of a function cover all hosts in one numpy expression.
+Rows follow the substrate delay matrix, so delays index the same rows.
+"""
+import copy
+import time
+
+import numpy as np
+from result import Result, Ok, Err
+
+from simulation.Metrics import MetricsRegistry
+from simulation.ServiceChain import ServiceChain
+from simulation.Substrate import Substrate
+
+uid = int
+
+
+def _host_state(substrate: Substrate) -> tuple[list[uid], np.ndarray, np.ndarray]:
+    """
+    :return: host uid per row, residual resources per row and the delay matrix
+    """
+    delay_matrix, host_index = substrate.delay_matrix()
+
+    host_uids = [0] * len(host_index)
+    for host_uid, row in host_index.items():
+        host_uids[row] = host_uid
+
+    residual = np.array([[substrate.nodes[host_uid].cpu_avail, substrate.nodes[host_uid].memory_avail,
+                          substrate.nodes[host_uid].storage_avail] for host_uid in host_uids],
+                        dtype=np.float64).reshape(len(host_uids), 3)
+
+    return host_uids, residual, delay_matrix
+
+
+def _demands(chain: ServiceChain) -> np.ndarray:
+    return np.array([[function.cpu_usage, function.memory_usage, function.storage_usage]
+                     for function in chain.functions], dtype=np.float64).reshape(len(chain.functions), 3)
+
+
+def feasible_hosts(residual: np.ndarray, demand: np.ndarray) -> np.ndarray:
+    """
+    :return: boolean mask of the rows that can hold demand
+    """
+    return np.all(residual >= demand, axis=1)
+
+
+def fit_scores(residual: np.ndarray, demand: np.ndarray) -> np.ndarray:
+    """
+    resources left on every row after placing demand, each resource relative to the largest
+    residual of that resource, lower is a tighter fit
+    """
+    scale = residual.max(axis=0)
+    scale[scale <= 0] = 1
+    return ((residual - demand) / scale).sum(axis=1)
+
+
+def _embedded_chain(request: ServiceChain, host_uids: list[uid], rows: list[int]) -> ServiceChain:
+    chain = copy.copy(request)
+    chain.functions = []
+    for function, row in zip(request.functions, rows):
+        function = copy.copy(function)
+        function.vm_id = host_uids[row]
+        chain.functions.append(function)
+    return chain
+
+
+def _no_host(request: ServiceChain, position: int) -> Err:
+    return Err(f'no host can hold function {position} of the chain ({request.functions[position].cpu_usage} cpu, '
+               f'{request.functions[position].memory_usage} memory, {request.functions[position].storage_usage} '
+               f'storage)')
+
+
+def first_fit(substrate: Substrate, request: ServiceChain) -> Result[ServiceChain, str]:
+    """
+    place every function on the first host (in host order) that can hold it
+    :param substrate:
+    :param request:
+    :return:
+    """
+    host_uids, residual, _ = _host_state(substrate)
+
+    rows = []
+    for position, demand in enumerate(_demands(request)):
+        candidates = np.flatnonzero(feasible_hosts(residual, demand))
+        if not len(candidates):
+            return _no_host(request, position)
+        rows.append(int(candidates[0]))
+        residual[rows[-1]] -= demand
+
+    return Ok(_embedded_chain(request, host_uids, rows))
+
+
+def best_fit(substrate: Substrate, request: ServiceChain) -> Result[ServiceChain, str]:
+    """
+    place every function on the host it leaves the fewest resources on
+    :param substrate:
+    :param request:
+    :return:
+    """
+    host_uids, residual, _ = _host_state(substrate)
+
+    rows = []
+    for position, demand in enumerate(_demands(request)):
+        scores = np.where(feasible_hosts(residual, demand), fit_scores(residual, demand), np.inf)
+        row = int(np.argmin(scores))
+        if scores[row] == np.inf:
+            return _no_host(request, position)
+        rows.append(row)
+        residual[row] -= demand
+
+    return Ok(_embedded_chain(request, host_uids, rows))
+
+
+def latency_greedy(substrate: Substrate, request: ServiceChain,
+                   source_host: uid | None = None) -> Result[ServiceChain, str]:
+    """
+    place every function on the feasible host closest to the previous function (to source_host
+    for the first one, best fit if there is no source), ties broken by best fit
+    :param substrate:
+    :param request:
+    :param source_host: host the traffic enters the chain at
+    :return:
+    """
+    host_uids, residual, delay_matrix = _host_state(substrate)
+
+    previous = None
+    if source_host is not None:
+        if source_host not in substrate.nodes:
+            return Err(f'host {source_host} not found')
+        previous = host_uids.index(source_host)
+
+    rows = []
+    for position, demand in enumerate(_demands(request)):
+        mask = feasible_hosts(residual, demand)
+        if not mask.any():
+            return _no_host(request, position)
+        scores = fit_scores(residual, demand)
+        if previous is not None:
+            delays = np.where(mask, delay_matrix[previous], np.inf)
+            if np.isinf(delays.min()):
+                return Err(f'no host that can hold function {position} of the chain is reachable')
+            mask &= delays == delays.min()
+        row = int(np.argmin(np.where(mask, scores, np.inf)))
+        rows.append(row)
+        residual[row] -= demand
+        previous = row
+
+    return Ok(_embedded_chain(request, host_uids, rows))
+
+
+def dynamic_programming(substrate: Substrate, request: ServiceChain,
+                        source_host: uid | None = None) -> Result[ServiceChain, str]:
+    """
+    latency placement over the chain order: cost[h] of a function is the lowest total delay
+    of the chain up to that function placed on host h. Every function is checked against the
+    residuals on its own; when the result overloads a host shared by several functions, the
+    last of them is banned from that host and the placement is solved again. The recursion is
+    exact only while no host is overloaded, the ban-and-resolve loop is a heuristic: a ban is
+    never lifted, so the returned placement can be slower than the best feasible one, and a
+    request can be rejected although a feasible placement exists.
+    :param substrate:
+    :param request:
+    :param source_host: host the traffic enters the chain at
+    :return:
+    """
+    host_uids, residual, delay_matrix = _host_state(substrate)
+    demands = _demands(request)
+    if not len(demands):
+        return Ok(_embedded_chain(request, host_uids, []))
+
+    if source_host is not None and source_host not in substrate.nodes:
+        return Err(f'host {source_host} not found')
+
+    allowed = np.array([feasible_hosts(residual, demand) for demand in demands]).reshape(len(demands),
+                                                                                        len(host_uids))
+    columns = np.arange(len(host_uids))
+    while True:
+        if source_host is not None:
+            cost = delay_matrix[host_uids.index(source_host)].copy()
+        else:
+            cost = np.zeros(len(host_uids))
+
+        choices = []  # per function after the first: best previous row for every row
+        for position in range(len(demands)):
+            if position > 0:
+                total = cost[:, None] + delay_matrix
+                choices.append(np.argmin(total, axis=0))
+                cost = total[choices[-1], columns]
+            cost = np.where(allowed[position], cost, np.inf)
+            if np.isinf(cost.min()):
+                return _no_host(request, position)
+
+        rows = [int(np.argmin(cost))]
+        for choice in reversed(choices):
+            rows.append(int(choice[rows[-1]]))
+        rows.reverse()
+
+        used = np.zeros_like(residual)
+        overloaded = None
+        for position, row in enumerate(rows):
+            used[row] += demands[position]
+            if (used[row] > residual[row]).any():
+                overloaded = position
+                break
+        if overloaded is None:
+            return Ok(_embedded_chain(request, host_uids, rows))
+        allowed[overloaded, rows[overloaded]] = False
+
+
+SOLVERS = {
+    "first_fit": first_fit,
+    "best_fit": best_fit,
+    "latency_greedy": latency_greedy,
+    "dynamic_programming": dynamic_programming,
+}
+
+
+def solve(solver: str, substrate: Substrate, request: ServiceChain, metrics: MetricsRegistry | None = None,
+          **options) -> tuple[Result[ServiceChain, str], float]:
+    """
+    run one of the SOLVERS and time it, the solve time is also recorded in the
+    histogram embedding_<solver>_seconds of metrics
+    :param solver: name in SOLVERS
+    :param substrate:
+    :param request:
+    :param metrics:
+    :param options: passed to the solver, e.g. source_host
+    :return: (embedded chain or error message, solve time in seconds)
+    """
+    if solver not in SOLVERS:
+        return Err(f'unknown solver {solver}'), 0.0
+
+    start = time.perf_counter()
+    embedding = SOLVERS[solver](substrate, request, **options)
+    elapsed = time.perf_counter() - start
+
+    if metrics is not None:
+        metrics.observe(f'embedding_{solver}_seconds', elapsed)
+        metrics.increment("embedding_requests_total", solver=solver, outcome="ok" if embedding.is_ok() else "err")
+
+    return embedding, elapsed
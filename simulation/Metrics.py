@@ -0,0 +1,195 @@
+import bisect
+import functools
+import time
+from contextlib import contextmanager
+
+# upper bounds (seconds) of the timing histogram buckets, +Inf is implicit
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10
+)
+
+
+class Histogram:
+    buckets: tuple[float, ...]
+    counts: list[int]  # per bucket, last entry is the +Inf bucket
+    sum: float
+    count: int
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> list[int]:
+        cumulative = []
+        total = 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+
+class MetricsRegistry:
+    """
+    Counters and timing histograms for the hot paths of the simulator.
+    Recording is a dictionary update (plus a bisect for histograms), so the registry
+    is meant to stay enabled; set enabled to False to turn every call into a no-op.
+    Calls too frequent even for that (e.g. Simulation.step) count in a plain integer
+    attribute of their object, registered with register_counter, and sample their timing.
+    """
+    enabled: bool = True
+    counters: dict[tuple[str, tuple], float]  # (name, sorted label items) -> value
+    histograms: dict[str, Histogram]
+    attribute_counters: dict[str, tuple[object, str]]  # name -> (object, attribute) holding the value
+    prefix: str
+
+    def __init__(self, prefix: str = "vnfnet") -> None:
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self.attribute_counters = {}
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+        """
+        increase a counter, labels distinguish series of the same counter (e.g. cause="cpu")
+        :param name:
+        :param amount:
+        :param labels:
+        :return:
+        """
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def register_counter(self, name: str, owner: object, attribute: str) -> None:
+        """
+        expose the integer attribute of owner as the counter name (without labels)
+        :param name:
+        :param owner:
+        :param attribute:
+        :return:
+        """
+        self.attribute_counters[name] = (owner, attribute)
+
+    def _all_counters(self) -> dict[tuple[str, tuple], float]:
+        counters = dict(self.counters)
+        for name, (owner, attribute) in self.attribute_counters.items():
+            counters[(name, ())] = getattr(owner, attribute)
+        return counters
+
+    def observe(self, name: str, value: float) -> None:
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str):
+        """
+        record the duration of the enclosed block in the histogram name
+        :param name:
+        :return:
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter_value(self, name: str, **labels) -> float:
+        if not labels and name in self.attribute_counters:
+            owner, attribute = self.attribute_counters[name]
+            return getattr(owner, attribute)
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def reset(self) -> None:
+        self.counters = {}
+        self.histograms = {}
+        for owner, attribute in self.attribute_counters.values():
+            setattr(owner, attribute, 0)
+
+    @staticmethod
+    def _series_name(name: str, labels: tuple) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+    def snapshot(self) -> dict:
+        """
+        return a plain dict copy of all counters and histograms
+        :return:
+        """
+        return {
+            "counters": {self._series_name(name, labels): value
+                         for (name, labels), value in self._all_counters().items()},
+            "histograms": {
+                name: {
+                    "buckets": dict(zip([str(bound) for bound in histogram.buckets] + ["+Inf"],
+                                        histogram.cumulative_counts())),
+                    "sum": histogram.sum,
+                    "count": histogram.count,
+                }
+                for name, histogram in self.histograms.items()
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        return the registry in the Prometheus text exposition format
+        :return:
+        """
+        lines = []
+
+        typed = set()
+        for (name, labels), value in sorted(self._all_counters().items()):
+            metric = f'{self.prefix}_{name}'
+            if metric not in typed:
+                lines.append(f'# TYPE {metric} counter')
+                typed.add(metric)
+            lines.append(f'{self._series_name(metric, labels)} {value}')
+
+        for name, histogram in sorted(self.histograms.items()):
+            metric = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {metric} histogram')
+            for bound, count in zip([str(bound) for bound in histogram.buckets] + ["+Inf"],
+                                    histogram.cumulative_counts()):
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {count}')
+            lines.append(f'{metric}_sum {histogram.sum}')
+            lines.append(f'{metric}_count {histogram.count}')
+
+        return "\n".join(lines) + "\n"
+
+
+def timed(name: str, sample: int = 1):
+    """
+    method decorator recording the call latency in the histogram name of self.metrics
+    :param name:
+    :param sample: time one call in sample, the histogram count is then the number of timed calls
+    :return:
+    """
+    def decorator(method):
+        calls = 0
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            nonlocal calls
+            calls += 1
+            metrics = self.metrics
+            if calls % sample or not metrics.enabled:
+                return method(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                metrics.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
@@ -0,0 +1,157 @@
+import numpy as np
+
+
+class GraphObservationEncoder:
+    """
+    Graph tensors of a vnfnet Network for GNN agents, over the physical hosts and the
+    host-to-host links:
+     - node_features (hosts, 3): residual CPU, RAM and storage per host, over maxNetCPU/RAM/Storage
+     - edge_index (2, 2 * links): host rows of every working link, once per direction
+     - edge_features (2 * links, 2): residual bandwidth over maxNetBandwidth and delay over maxNetLatency
+    The delay is the one routing sees on the graph edge, load dependent while the congestion
+    delay model of the network is enabled (read from the model every encode). The encoder
+    registers itself as a state listener of the network. The edge index is built once; after
+    that only the rows of the hosts and links reported as changed are rewritten. Adding,
+    removing, failing or repairing hosts or links, switching the delay model, or a change of
+    the network maxima used as scales rebuilds everything on the next encode.
+    """
+    node_features: np.ndarray | None = None
+    edge_index: np.ndarray | None = None
+    edge_features: np.ndarray | None = None
+
+    def __init__(self, network) -> None:
+        self.network = network
+        self._host_row: dict[int, int] = {}  # host uid -> row of node_features
+        self._link_rows: dict[int, tuple[int, int]] = {}  # link uid -> its two rows of edge_features
+        self._dirty_hosts: set[int] = set()
+        self._dirty_links: set[int] = set()
+        self._stale = True
+        self._scales = None  # network maxima the features were scaled with
+        self._model = None  # LinkDelayModel of the network the edge rows were mapped to
+        self._model_edges = np.zeros(0, dtype=np.int64)  # first of the two edge rows per entry of _model_rows
+        self._model_rows = np.zeros(0, dtype=np.int64)
+
+        network.stateListeners.append(self)
+
+    def close(self) -> None:
+        """
+        stop listening to the network
+        :return:
+        """
+        if self in self.network.stateListeners:
+            self.network.stateListeners.remove(self)
+
+    # State listener
+
+    def host_changed(self, host_uid: int) -> None:
+        self._dirty_hosts.add(host_uid)
+
+    def link_changed(self, link_uid: int) -> None:
+        self._dirty_links.add(link_uid)
+
+    def topology_changed(self) -> None:
+        self._stale = True
+
+    def vm_changed(self, vm, host_uid: int, placed: bool) -> None:
+        pass
+
+    def connection_changed(self, connection) -> None:
+        pass
+
+    # Encoding
+
+    @staticmethod
+    def _scale(maximum: float) -> float:
+        # the network maxima start at -1 before the first host or link
+        return float(maximum) if maximum > 0 else 1.0
+
+    def _network_scales(self) -> tuple[float, ...]:
+        network = self.network
+        return (self._scale(network.maxNetCPU), self._scale(network.maxNetRAM), self._scale(network.maxNetStorage),
+                self._scale(network.maxNetBandwidth), self._scale(network.maxNetLatency))
+
+    def _rebuild(self) -> None:
+        network = self.network
+        hosts = network.networkHosts
+        graph = network.topologyGraph
+        self._host_row = {host.uid: row for row, host in enumerate(hosts)}
+        links = [link for link in network.networkLinks if link.uid not in network.failedLinks and
+                 link.source.uid in self._host_row and link.destination.uid in self._host_row]
+        self._link_rows = {link.uid: (2 * n, 2 * n + 1) for n, link in enumerate(links)}
+
+        self._scales = self._network_scales()
+        self._host_scale = np.array(self._scales[:3], dtype=np.float32)
+        self._bandwidth_scale = self._scales[3]
+        self._latency_scale = self._scales[4]
+
+        capacity = np.array([(h.CPUcap, h.RAMcap, h.StorageCap) for h in hosts], dtype=np.float32).reshape(-1, 3)
+        utilization = np.array([(h.CPUUtil, h.RAMUtil, h.StorageUtil) for h in hosts],
+                               dtype=np.float32).reshape(-1, 3)
+        self.node_features = np.ascontiguousarray((capacity - utilization) / self._host_scale, dtype=np.float32)
+
+        sources = np.array([self._host_row[link.source.uid] for link in links], dtype=np.int64)
+        destinations = np.array([self._host_row[link.destination.uid] for link in links], dtype=np.int64)
+        self.edge_index = np.empty((2, 2 * len(links)), dtype=np.int64)
+        self.edge_index[0, 0::2] = sources
+        self.edge_index[1, 0::2] = destinations
+        self.edge_index[0, 1::2] = destinations
+        self.edge_index[1, 1::2] = sources
+
+        linkValues = np.array([(link.bandwidthUtil / self._bandwidth_scale,
+                                graph[link.source.uid][link.destination.uid]["delay"] / self._latency_scale)
+                               for link in links], dtype=np.float32).reshape(-1, 2)
+        self.edge_features = np.ascontiguousarray(np.repeat(linkValues, 2, axis=0), dtype=np.float32)
+
+        self._model = network.linkDelayModel
+        if self._model is not None:
+            self._model_edges = np.arange(0, 2 * len(links), 2, dtype=np.int64)
+            self._model_rows = np.array([self._model.rows[link.uid] for link in links], dtype=np.int64)
+
+        self._stale = False
+
+    def _patch(self) -> None:
+        hosts = self.network.networkHosts
+        for host_uid in self._dirty_hosts:
+            row = self._host_row.get(host_uid)
+            if row is None:
+                continue
+            host = hosts[row]
+            self.node_features[row] = (np.array((host.CPUcap - host.CPUUtil, host.RAMcap - host.RAMUtil,
+                                                 host.StorageCap - host.StorageUtil), dtype=np.float32)
+                                       / self._host_scale)
+
+        linksByUid = self.network.linksByUid
+        for link_uid in self._dirty_links:
+            rows = self._link_rows.get(link_uid)
+            if rows is None:  # user or VM attachment
+                continue
+            self.edge_features[rows[0], 0] = self.edge_features[rows[1], 0] = (linksByUid[link_uid].bandwidthUtil
+                                                                               / self._bandwidth_scale)
+
+        if self._model is not None:
+            delay = self._model.delay[self._model_rows] / self._latency_scale
+            self.edge_features[self._model_edges, 1] = delay
+            self.edge_features[self._model_edges + 1, 1] = delay
+
+    def encode(self) -> dict[str, np.ndarray]:
+        """
+        return node_features, edge_index and edge_features as contiguous arrays (float32, edge
+        index int64). They are read-only views of the encoder state and change with the next
+        encode, copy them to keep a snapshot.
+        :return:
+        """
+        if self.network.linkDelayModel is not self._model or self._network_scales() != self._scales:
+            self._stale = True
+        if self._stale:
+            self._rebuild()
+        else:
+            self._patch()
+        self._dirty_hosts.clear()
+        self._dirty_links.clear()
+
+        observation = {}
+        for name in ("node_features", "edge_index", "edge_features"):
+            view = getattr(self, name).view()
+            view.flags.writeable = False
+            observation[name] = view
+        return observation
@@ -0,0 +1,146 @@
+import glob
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+class TimeSeriesRecorder:
+    """
+    Per-tick state recorder with bounded memory.
+    Every column has a fixed width (e.g. one value per host); rows are appended to
+    preallocated chunk buffers and full chunks are written as compressed .npz files by a
+    background thread, so the simulation loop never waits on disk unless all buffers
+    are still being written (backpressure).
+    Values shorter than the column width are padded with NaN (-1 in integer columns), longer
+    ones are truncated and counted in truncated.
+    """
+    directory: str
+    columns: dict[str, int]  # column name -> values per tick
+    dtypes: dict[str, np.dtype]  # column name -> dtype, for the columns not given in dtypes int64 if the name
+    # ends in "_uid" (uids do not survive float32) and dtype otherwise
+    chunk_size: int  # ticks per chunk file
+    truncated: dict[str, int]  # column name -> ticks whose values did not fit the column width
+
+    def __init__(self, directory: str, columns: dict[str, int], chunk_size: int = 1024, buffers: int = 3,
+                 dtype=np.float32, dtypes: dict | None = None) -> None:
+        self.directory = directory
+        self.columns = dict(columns)
+        self.dtypes = {name: np.dtype((dtypes or {}).get(name, np.int64 if name.endswith("_uid") else dtype))
+                       for name in self.columns}
+        self.chunk_size = chunk_size
+        self.truncated = {name: 0 for name in self.columns}
+
+        os.makedirs(directory, exist_ok=True)
+
+        # buffer sets cycle between the simulation (filling) and the writer thread (flushing)
+        self._free_buffers = queue.Queue()
+        for _ in range(max(buffers, 2)):
+            self._free_buffers.put(self._allocate_buffers())
+        self._pending = queue.Queue()
+
+        self._current = self._free_buffers.get()
+        self._row = 0
+        self._chunk_index = len(glob.glob(os.path.join(directory, "chunk_*.npz")))
+        self._error: BaseException | None = None
+
+        self._writer = threading.Thread(target=self._write_chunks, name="TimeSeriesRecorder", daemon=True)
+        self._writer.start()
+
+    def _allocate_buffers(self) -> dict[str, np.ndarray]:
+        buffers = {"tick": np.empty(self.chunk_size, dtype=np.float64)}
+        for name, width in self.columns.items():
+            buffers[name] = np.empty((self.chunk_size, width), dtype=self.dtypes[name])
+        return buffers
+
+    def _write_chunks(self) -> None:
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+            chunk_index, rows, buffers = item
+            try:
+                path = os.path.join(self.directory, f'chunk_{chunk_index:06d}.npz')
+                np.savez_compressed(path, **{name: values[:rows] for name, values in buffers.items()})
+            except BaseException as error:  # reported to the simulation thread on its next call
+                self._error = error
+            self._free_buffers.put(buffers)
+
+    def _check_writer(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f'time series writer failed: {self._error}') from self._error
+
+    def append(self, tick: float, **values) -> None:
+        """
+        append one tick, every keyword is a column name with its values for this tick
+        :param tick:
+        :param values:
+        :return:
+        """
+        self._check_writer()
+
+        row = self._row
+        self._current["tick"][row] = tick
+        for name, width in self.columns.items():
+            target = self._current[name][row]
+            padding = -1 if np.issubdtype(target.dtype, np.integer) else np.nan
+            value = values.get(name)
+            if value is None:
+                target.fill(padding)
+                continue
+            value = np.asarray(value).ravel()
+            if len(value) > width:
+                self.truncated[name] += 1
+            count = min(len(value), width)
+            target[:count] = value[:count]
+            target[count:] = padding
+
+        self._row += 1
+        if self._row == self.chunk_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        hand the filled rows to the writer thread, blocks only when no free buffer is left
+        :return:
+        """
+        self._check_writer()
+        if self._row == 0:
+            return
+
+        self._pending.put((self._chunk_index, self._row, self._current))
+        self._chunk_index += 1
+        self._row = 0
+        self._current = self._free_buffers.get()
+
+    def close(self) -> None:
+        """
+        write the remaining rows and wait for the writer thread
+        :return:
+        """
+        if not self._writer.is_alive():
+            return
+        self.flush()
+        self._pending.put(None)
+        self._writer.join()
+        self._check_writer()
+
+    def __enter__(self) -> "TimeSeriesRecorder":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @staticmethod
+    def load(directory: str) -> dict[str, np.ndarray]:
+        """
+        read all chunks of a recording back, concatenated in tick order
+        :param directory:
+        :return:
+        """
+        chunks = [np.load(path) for path in sorted(glob.glob(os.path.join(directory, "chunk_*.npz")))]
+        if not chunks:
+            return {}
+
+        return {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0].files}
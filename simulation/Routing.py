@@ -0,0 +1,190 @@
+"""
+Routing engine working directly on the compressed sparse row (CSR) adjacency of a Substrate.
+Every undirected link is stored as two arcs; arcs are grouped per source row so the
+neighbours of row u are arcs indptr[u] .. indptr[u + 1] - 1. Parallel per-arc lists
+hold the destination row, the latency, the available bandwidth and the link index.
+Paths are returned as (latency, rows, links).
+"""
+import heapq
+import math
+from itertools import count
+
+
+def _as_list(values) -> list:
+    # numpy scalars are much slower than Python numbers in the loops below
+    return values.tolist() if hasattr(values, 'tolist') else list(values)
+
+
+class CSRGraph:
+    """
+    Plain Python lists mirroring the numpy CSR arrays of the substrate, so the heap
+    loops below index lists instead of numpy scalars.
+    """
+    indptr: list[int]
+    indices: list[int]  # destination row per arc
+    latency: list[float]  # per arc
+    bandwidth: list[float]  # available bandwidth per arc
+    arc_link: list[int]  # link index per arc
+    link_latency: list[float]  # per link
+
+    def __init__(self, indptr, indices, latency, bandwidth, arc_link) -> None:
+        self.indptr = _as_list(indptr)
+        self.indices = _as_list(indices)
+        self.latency = _as_list(latency)
+        self.bandwidth = _as_list(bandwidth)
+        self.arc_link = _as_list(arc_link)
+
+        self.link_latency = [0.0] * (max(self.arc_link) + 1 if self.arc_link else 0)
+        for arc, link in enumerate(self.arc_link):
+            self.link_latency[link] = self.latency[arc]
+
+    @property
+    def node_count(self) -> int:
+        return len(self.indptr) - 1
+
+
+def dijkstra(graph: CSRGraph, source: int, min_bandwidth: float = 0.0) -> list[float]:
+    """
+    heap based single source Dijkstra over the arcs with at least min_bandwidth available
+    :return: distance per row, inf when unreachable
+    """
+    indptr, indices, latency, bandwidth = graph.indptr, graph.indices, graph.latency, graph.bandwidth
+    heappush, heappop = heapq.heappush, heapq.heappop
+    constrained = min_bandwidth > 0
+
+    distance = [math.inf] * graph.node_count
+    distance[source] = 0.0
+    heap = [(0.0, source)]
+    while heap:
+        current, u = heappop(heap)
+        if current > distance[u]:
+            continue
+        for arc in range(indptr[u], indptr[u + 1]):
+            if constrained and bandwidth[arc] < min_bandwidth:
+                continue
+            v = indices[arc]
+            candidate = current + latency[arc]
+            if candidate < distance[v]:
+                distance[v] = candidate
+                heappush(heap, (candidate, v))
+
+    return distance
+
+
+def shortest_path(graph: CSRGraph, source: int, target: int, min_bandwidth: float = 0.0,
+                  banned_nodes: set[int] | None = None,
+                  banned_links: set[int] | None = None) -> tuple[float, list[int], list[int]] | None:
+    """
+    bidirectional Dijkstra between source and target over the arcs with at least min_bandwidth
+    available, skipping banned nodes and links. The arcs are symmetric, so the backward search
+    walks the same adjacency.
+    :return: (latency, rows, links) or None if there is no such path
+    """
+    if source == target:
+        return 0.0, [source], []
+
+    indptr, indices, latency, bandwidth, arc_link = (graph.indptr, graph.indices, graph.latency, graph.bandwidth,
+                                                     graph.arc_link)
+    heappush, heappop = heapq.heappush, heapq.heappop
+    filtered = min_bandwidth > 0 or banned_nodes or banned_links
+
+    distances = ({source: 0.0}, {target: 0.0})
+    previous = ({source: (-1, -1)}, {target: (-1, -1)})  # row -> (previous row, link)
+    settled = (set(), set())
+    heaps = ([(0.0, source)], [(0.0, target)])
+    best = math.inf
+    meeting = -1
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+        distance, other_distance = distances[side], distances[1 - side]
+
+        current, u = heappop(heaps[side])
+        if u in settled[side]:
+            continue
+        settled[side].add(u)
+
+        for arc in range(indptr[u], indptr[u + 1]):
+            v = indices[arc]
+            if filtered and (bandwidth[arc] < min_bandwidth or (banned_nodes and v in banned_nodes) or
+                             (banned_links and arc_link[arc] in banned_links)):
+                continue
+            candidate = current + latency[arc]
+            if candidate < distance.get(v, math.inf):
+                distance[v] = candidate
+                previous[side][v] = (u, arc_link[arc])
+                heappush(heaps[side], (candidate, v))
+            if v in other_distance and distance[v] + other_distance[v] < best:
+                best = distance[v] + other_distance[v]
+                meeting = v
+
+    if meeting < 0:
+        return None
+
+    rows = [meeting]
+    links = []
+    node = meeting
+    while node != source:
+        node, link = previous[0][node]
+        rows.append(node)
+        links.append(link)
+    rows.reverse()
+    links.reverse()
+    node = meeting
+    while node != target:
+        node, link = previous[1][node]
+        rows.append(node)
+        links.append(link)
+
+    return best, rows, links
+
+
+def k_shortest_paths(graph: CSRGraph, source: int, target: int, k: int,
+                     min_bandwidth: float = 0.0) -> list[tuple[float, list[int], list[int]]]:
+    """
+    Yen's algorithm: up to k loopless paths as (latency, rows, links), shortest first, all
+    with at least min_bandwidth available on every arc
+    """
+    first = shortest_path(graph, source, target, min_bandwidth)
+    if first is None:
+        return []
+
+    accepted = [first]
+    seen = {tuple(first[2])}
+    candidates = []
+    tie_breaker = count()
+
+    while len(accepted) < k:
+        _, previous_rows, previous_links = accepted[-1]
+
+        root_latency = 0.0
+        for i in range(len(previous_links)):
+            spur_node = previous_rows[i]
+            root_rows = previous_rows[:i + 1]
+
+            # links leaving the spur node on paths that share this root, and the root itself, are off limits
+            banned_links = set()
+            for _, rows, links in accepted:
+                if len(links) > i and rows[:i + 1] == root_rows:
+                    banned_links.add(links[i])
+            banned_nodes = set(root_rows[:-1])
+
+            spur = shortest_path(graph, spur_node, target, min_bandwidth, banned_nodes, banned_links)
+            if spur is not None:
+                links = previous_links[:i] + spur[2]
+                key = tuple(links)
+                if key not in seen:
+                    seen.add(key)
+                    heapq.heappush(candidates, (root_latency + spur[0], next(tie_breaker), root_rows[:-1] + spur[1],
+                                                links))
+
+            root_latency += graph.link_latency[previous_links[i]]
+
+        if not candidates:
+            break
+        latency, _, rows, links = heapq.heappop(candidates)
+        accepted.append((latency, rows, links))
+
+    return accepted
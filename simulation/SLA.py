@@ -0,0 +1,311 @@
+import numpy as np
+
+# TrafficPattern values of vnfnet, mirrored so this module does not import vnfnet
+_SQUARE = 2
+_SAW = 3
+
+
+class SLAReport:
+    """
+    One tick of the SLA monitor. rtt, throughput and score cover every active connection
+    (in the order of connections); the violators are sorted by severity, the relative
+    overshoot of the RTT over the chain SLA, worst first.
+    """
+    connections: np.ndarray  # Connection objects
+    rtt: np.ndarray  # ms, sum of the link delays along nodePath (as service_ping), split connections: slowest path per segment
+    throughput: np.ndarray  # Gbps, data rate of the user's traffic pattern at User.counter (as the next service_perf)
+    score: np.ndarray  # throughput / rtt (as service_performance_score)
+    violators: np.ndarray  # Connection objects
+    severity: np.ndarray  # per violator, (rtt - sla) / sla
+
+    def __init__(self, connections: np.ndarray, rtt: np.ndarray, throughput: np.ndarray, score: np.ndarray,
+                 violators: np.ndarray, severity: np.ndarray) -> None:
+        self.connections = connections
+        self.rtt = rtt
+        self.throughput = throughput
+        self.score = score
+        self.violators = violators
+        self.severity = severity
+
+    def __str__(self) -> str:
+        return "connections: " + str(len(self.connections)) + ", violations: " + str(len(self.violators)) + \
+            (", worst severity: " + format(float(self.severity[0]), ".3g") if len(self.violators) else "")
+
+
+class SLAMonitor:
+    """
+    Per-tick SLA check of every active connection of a vnfnet Network in one vectorized pass.
+    Every connection keeps a row with its path as link columns (padded to the longest path),
+    so the RTT of all connections is one gather and sum over the link delays (read from the
+    congestion-aware delay model of the network every tick when it is enabled). A split connection
+    is as slow as its slowest path, its row stays empty and every path of every segment is
+    gathered on its own; the RTT adds the slowest path of each segment. The monitor
+    registers itself as a state listener of the network and only rewrites the rows of
+    connections that were admitted, stopped or rerouted; new links get new columns. Violations
+    (RTT above Chain.sla) are also counted per chain over the last window ticks.
+    """
+    window: int
+    ticks: int
+
+    def __init__(self, network, window: int = 100, capacity: int = 1024) -> None:
+        self.network = network
+        self.window = window
+        self.ticks = 0
+
+        self._dirty: set = set()
+        self._stale = True  # rebuild every row
+        self._links_stale = True  # links were added or removed
+
+        # Connection rows
+        self._row: dict = {}  # connection -> row
+        self._rows = 0  # rows in use or freed
+        self._connections = np.full(capacity, None, dtype=object)  # row -> connection, None for free rows
+        self._free_rows: list[int] = []
+        self._path = np.zeros((capacity, 1), dtype=np.int32)  # link columns, padded with column 0 (zero delay)
+        self._active = np.zeros(capacity, dtype=bool)
+        self._bandwidth = np.zeros(capacity)
+        self._pattern = np.zeros(capacity, dtype=np.int8)
+        self._sla = np.full(capacity, np.nan)
+        self._chain = np.zeros(capacity, dtype=np.int64)  # row of the chain in the violation counters
+
+        # Paths of split connections
+        self._split: dict = {}  # connection -> per segment, the link columns of every path
+        self._split_stale = False
+        self._split_paths = np.zeros((0, 1), dtype=np.int32)  # one path per row, padded like _path
+        self._split_segment = np.zeros(0, dtype=np.int64)  # path -> segment
+        self._split_row = np.zeros(0, dtype=np.int64)  # segment -> connection row
+
+        # Links
+        self._link_column: dict[int, int] = {}  # link uid -> column, removed links keep theirs until a rebuild
+        self._delay = np.zeros(1)  # per column
+        self._model = None  # LinkDelayModel of the network the columns were mapped to
+        self._model_columns = np.zeros(0, dtype=np.int64)
+        self._model_rows = np.zeros(0, dtype=np.int64)  # per entry of _model_columns, its row in the model
+
+        # Rolling violations per chain
+        self._chain_row: dict[int, int] = {}  # chain uid -> row
+        self._chain_uids: list[int] = []
+        self._violations = np.zeros((0, window), dtype=np.int64)  # chain row x tick in the window
+        self.violationsTotal = np.zeros(0, dtype=np.int64)
+
+        network.stateListeners.append(self)
+
+    def close(self) -> None:
+        """
+        stop listening to the network
+        :return:
+        """
+        if self in self.network.stateListeners:
+            self.network.stateListeners.remove(self)
+
+    # State listener
+
+    def host_changed(self, host_uid: int) -> None:
+        pass
+
+    def link_changed(self, link_uid: int) -> None:
+        pass
+
+    def topology_changed(self) -> None:
+        self._links_stale = True
+
+    def vm_changed(self, vm, host_uid: int, placed: bool) -> None:
+        pass
+
+    def connection_changed(self, connection) -> None:
+        self._dirty.add(connection)
+
+    # Rows
+
+    def _grow_rows(self) -> None:
+        capacity = len(self._active)
+        self._path = np.vstack((self._path, np.zeros_like(self._path)))
+        for name in ("_connections", "_active", "_bandwidth", "_pattern", "_sla", "_chain"):
+            values = getattr(self, name)
+            setattr(self, name, np.concatenate((values, np.zeros(capacity, dtype=values.dtype))))
+        self._connections[capacity:] = None
+        self._sla[capacity:] = np.nan
+
+    def _chain_index(self, chain) -> int:
+        row = self._chain_row.get(chain.uid)
+        if row is None:
+            row = self._chain_row[chain.uid] = len(self._chain_uids)
+            self._chain_uids.append(chain.uid)
+            self._violations = np.vstack((self._violations, np.zeros((1, self.window), dtype=np.int64)))
+            self.violationsTotal = np.append(self.violationsTotal, 0)
+        return row
+
+    def _release_row(self, connection) -> None:
+        row = self._row.pop(connection, None)
+        if row is None:
+            return
+        self._active[row] = False
+        self._connections[row] = None
+        self._free_rows.append(row)
+        if self._split.pop(connection, None) is not None:
+            self._split_stale = True
+
+    def _columns(self, node_path: list[int]) -> list[int]:
+        graph = self.network.topologyGraph
+        return [self._link_column[graph[node_path[edge]][node_path[edge + 1]]["uid"]]
+                for edge in range(len(node_path) - 1)]
+
+    def _write_row(self, connection) -> None:
+        if connection.segmentFlows is None:
+            columns = self._columns(connection.nodePath)
+            if self._split.pop(connection, None) is not None:
+                self._split_stale = True
+        else:
+            columns = []
+            self._split[connection] = [[self._columns(path) for path, _ in flows]
+                                       for flows in connection.segmentFlows]
+            self._split_stale = True
+
+        row = self._row.get(connection)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                row = self._rows
+                self._rows += 1
+                if row == len(self._active):
+                    self._grow_rows()
+            self._row[connection] = row
+            self._connections[row] = connection
+
+        if len(columns) > self._path.shape[1]:
+            padding = np.zeros((len(self._path), len(columns) - self._path.shape[1]), dtype=np.int32)
+            self._path = np.hstack((self._path, padding))
+        self._path[row] = 0
+        self._path[row, :len(columns)] = columns
+
+        user = connection.userObject
+        sla = user.userChain.sla
+        self._active[row] = True
+        self._bandwidth[row] = user.bandwidth
+        self._pattern[row] = user.traffic_pattern.value
+        self._sla[row] = np.nan if sla is None else sla
+        self._chain[row] = self._chain_index(user.userChain)
+
+    def _refresh_links(self) -> None:
+        links = self.network.networkLinks
+        for link in links:
+            if link.uid not in self._link_column:
+                self._link_column[link.uid] = len(self._link_column) + 1
+        self._delay = np.zeros(len(self._link_column) + 1)
+        self._delay[[self._link_column[link.uid] for link in links]] = [link.latency for link in links]
+
+        self._model = self.network.linkDelayModel
+        if self._model is not None:
+            self._model_columns = np.array([self._link_column[link.uid] for link in links], dtype=np.int64)
+            self._model_rows = np.array([self._model.rows[link.uid] for link in links], dtype=np.int64)
+        self._links_stale = False
+
+    def _rebuild(self) -> None:
+        self._link_column = {}
+        self._refresh_links()
+
+        self._path = np.zeros((len(self._active), 1), dtype=np.int32)
+        self._split = {}
+        self._split_stale = True
+        self._row = {}
+        self._rows = 0
+        self._connections[:] = None
+        self._free_rows = []
+        self._active[:] = False
+        for connection in self.network.trafficActivityList:
+            self._write_row(connection)
+
+        self._dirty.clear()
+        self._stale = False
+
+    def _update(self) -> None:
+        if self.network.linkDelayModel is not self._model:
+            self._links_stale = True
+        # columns of removed links pile up under churn (e.g. user links), compact them now and then
+        if self._links_stale and len(self._link_column) > 2 * len(self.network.networkLinks) + 1024:
+            self._stale = True
+        if self._stale:
+            self._rebuild()
+            return
+        if self._links_stale:
+            self._refresh_links()
+        for connection in self._dirty:
+            if connection.active:
+                self._write_row(connection)
+            else:
+                self._release_row(connection)
+        self._dirty.clear()
+
+    def _compile_split(self) -> None:
+        paths, segments, rows = [], [], []
+        for connection, segmentPaths in self._split.items():
+            for segment in segmentPaths:
+                paths.extend(segment)
+                segments.extend([len(rows)] * len(segment))
+                rows.append(self._row[connection])
+
+        width = max((len(columns) for columns in paths), default=1)
+        self._split_paths = np.zeros((len(paths), width), dtype=np.int32)
+        for n, columns in enumerate(paths):
+            self._split_paths[n, :len(columns)] = columns
+        self._split_segment = np.array(segments, dtype=np.int64)
+        self._split_row = np.array(rows, dtype=np.int64)
+        self._split_stale = False
+
+    # Monitoring
+
+    def evaluate(self) -> SLAReport:
+        """
+        advance one tick: RTT, throughput and score of every active connection, the SLA
+        violators sorted by severity, and the per chain violation counters
+        :return:
+        """
+        self._update()
+        if self._model is not None:
+            self._delay[self._model_columns] = self._model.delay[self._model_rows]
+
+        rows = np.flatnonzero(self._active[:self._rows])
+        # free rows are summed too, it saves copying the paths of the active rows
+        rtt = self._delay[self._path[:self._rows]].sum(axis=1)
+        if self._split:
+            if self._split_stale:
+                self._compile_split()
+            segmentRtt = np.zeros(len(self._split_row))
+            np.maximum.at(segmentRtt, self._split_segment, self._delay[self._split_paths].sum(axis=1))
+            rtt += np.bincount(self._split_row, weights=segmentRtt, minlength=self._rows)
+        rtt = rtt[rows]
+
+        connections = self._connections[rows]
+        # the traffic pattern of User.traffic_pattern_generator at the user's current step, which
+        # service_perf advances
+        counter = np.fromiter((connection.userObject.counter for connection in connections), dtype=np.int64,
+                              count=len(rows))
+        factor = np.ones(len(rows))
+        pattern = self._pattern[rows]
+        square = pattern == _SQUARE
+        factor[square] = np.where(counter[square] % 2 == 0, 0.3, 1.0)
+        saw = pattern == _SAW
+        factor[saw] = np.abs(counter[saw]) % 10 * 0.1
+        throughput = self._bandwidth[rows] * factor
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            score = throughput / rtt
+            severity = (rtt - self._sla[rows]) / self._sla[rows]
+        violating = np.flatnonzero(rtt > self._sla[rows])  # False for chains without an SLA (NaN)
+        violating = violating[np.argsort(-severity[violating], kind="stable")]
+
+        slot = self.ticks % self.window
+        self._violations[:, slot] = np.bincount(self._chain[rows[violating]], minlength=len(self._chain_uids))
+        self.violationsTotal += self._violations[:, slot]
+        self.ticks += 1
+
+        return SLAReport(connections, rtt, throughput, score, connections[violating], severity[violating])
+
+    def chain_violations(self) -> dict[int, int]:
+        """
+        violations per chain uid over the last window ticks
+        :return:
+        """
+        counts = self._violations.sum(axis=1)
+        return {chain_uid: int(counts[row]) for chain_uid, row in self._chain_row.items() if counts[row]}
@@ -0,0 +1,37 @@
+"""
+Seeded synthetic vnfnet topologies shared by the benchmark suite, the parameter sweeps and
+the tests, so they all measure the same kind of network.
+"""
+import random
+
+
+def random_topology(hosts: int, seed: int, link_bandwidth: float = 100, title: str = "scenario"):
+    """
+    a random spanning tree of hosts plus hosts / 2 extra links (delays 1 to 10 ms), a pool of
+    single core VMs and twenty three-VM chains with a 100 ms SLA. Users are left to the caller,
+    drawing them from the returned generator keeps the run reproducible from seed.
+    :param hosts:
+    :param seed:
+    :param link_bandwidth: of every host-to-host link
+    :param title: of the network
+    :return: network, hosts, VMs, chains and the random generator
+    """
+    from vnfnet import Network
+
+    rng = random.Random(seed)
+    net = Network(title)
+
+    hostObjects = [net.add_host("h" + str(i), 64, 256, 4096) for i in range(hosts)]
+    for i in range(1, hosts):
+        net.add_link(hostObjects[i], hostObjects[rng.randrange(i)], bandwidth=link_bandwidth,
+                     delay=rng.randint(1, 10))
+    for _ in range(hosts // 2):
+        a, b = rng.sample(hostObjects, 2)
+        if not net.topologyGraph.has_edge(a.uid, b.uid):
+            net.add_link(a, b, bandwidth=link_bandwidth, delay=rng.randint(1, 10))
+
+    services = [net.add_service("svc" + str(i), cpu_cores=1, ram=1, storage=1) for i in range(5)]
+    vms = [net.instantiate_vm(rng.choice(services), rng.choice(hostObjects)) for _ in range(max(10, hosts // 10))]
+    chains = [net.add_chain("chain" + str(i), rng.sample(vms, 3), sla=100) for i in range(20)]
+
+    return net, hostObjects, vms, chains, rng
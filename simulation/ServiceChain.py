@@ -1,6 +1,9 @@
 from __future__ import annotations  # used for forward reference
 
+from result import Result, Ok, Err
+
 from simulation.NetworkFunction import NetworkFunction
+from simulation.Substrate import Substrate
 
 
 class ServiceChain:
@@ -13,11 +16,105 @@ class ServiceChain:
     # by defining a next chain, we make it possible to support
     # traffic splitting and bifurcated paths
     next_chain: list[ServiceChain] = []
+    split_ratio: list[float] | None = None  # relative traffic share per next chain, equal shares if None
 
+    bandwidth: float = 0  # traffic entering the chain
+    flows: list[tuple[list[int], float]] = []  # (host path, bandwidth) allocated by Simulation.allocate_chain
     time_to_live: float = 0  # time until which this chain should be available
 
+    def __init__(self) -> None:
+        self.functions = []
+        self.next_chain = []
+        self.flows = []
+
     def add_function(self, function: NetworkFunction) -> None:
         self.functions.append(function)
 
-    def calculate_latency(self) -> float:
-        pass
+    def branch_bandwidths(self, bandwidth: float) -> Result[list[float], str]:
+        """
+        split the bandwidth leaving this chain over the next chains
+        :param bandwidth:
+        :return: bandwidth per next chain, in the order of next_chain
+        """
+        if not self.next_chain:
+            return Ok([])
+
+        ratio = self.split_ratio if self.split_ratio is not None else [1.0] * len(self.next_chain)
+        if len(ratio) != len(self.next_chain):
+            return Err(f'split ratio has {len(ratio)} shares for {len(self.next_chain)} next chains')
+        if any(share < 0 for share in ratio) or sum(ratio) <= 0:
+            return Err(f'invalid split ratio {ratio}')
+
+        total = sum(ratio)
+        return Ok([bandwidth * share / total for share in ratio])
+
+    def allocate_flows(self, substrate: Substrate, bandwidth: float, k: int = 3,
+                       path_split_ratio: list[float] | None = None) -> Result[list[tuple[list[int], float]], str]:
+        """
+        allocate the traffic of the embedded chain (hosts in vm_id): bandwidth between consecutive
+        functions, then the bandwidth leaving the last function split over next_chain (branch_bandwidths)
+        and allocated into every branch the same way. Every hop is split over up to k shortest paths by
+        Substrate.allocate_multipath. Nothing stays allocated on error.
+        :param substrate:
+        :param bandwidth: entering the chain
+        :param k:
+        :param path_split_ratio: relative share per path of every hop, see Substrate.allocate_multipath
+        :return: every allocated (host path, bandwidth), to be freed with Substrate.free_path
+        """
+        flows = []
+
+        def allocate(source_host: int, destination_host: int, hop_bandwidth: float) -> Result[None, str]:
+            if source_host == destination_host or hop_bandwidth <= 0:
+                return Ok(None)
+            allocation = substrate.allocate_multipath(source_host, destination_host, hop_bandwidth, k,
+                                                      path_split_ratio)
+            if allocation.is_err():
+                return Err(allocation.err_value)
+            flows.extend(allocation.ok_value)
+            return Ok(None)
+
+        def allocate_chain(chain: ServiceChain, chain_bandwidth: float) -> Result[None, str]:
+            for function, next_function in zip(chain.functions, chain.functions[1:]):
+                allocation = allocate(function.vm_id, next_function.vm_id, chain_bandwidth)
+                if allocation.is_err():
+                    return allocation
+
+            branches = chain.branch_bandwidths(chain_bandwidth)
+            if branches.is_err():
+                return Err(branches.err_value)
+            for next_chain, branch_bandwidth in zip(chain.next_chain, branches.ok_value):
+                if chain.functions and next_chain.functions:
+                    allocation = allocate(chain.functions[-1].vm_id, next_chain.functions[0].vm_id,
+                                          branch_bandwidth)
+                    if allocation.is_err():
+                        return allocation
+                allocation = allocate_chain(next_chain, branch_bandwidth)
+                if allocation.is_err():
+                    return allocation
+            return Ok(None)
+
+        result = allocate_chain(self, bandwidth)
+        if result.is_err():
+            for path, share in flows:
+                substrate.free_path(path, share)
+            return Err(result.err_value)
+
+        return Ok(flows)
+
+    def calculate_latency(self, substrate: Substrate) -> Result[float, str]:
+        """
+        estimate the end-to-end latency of the embedded chain: the processing time of
+        every function plus the shortest link latency between the hosts (vm_id) of
+        consecutive functions, looked up in the substrate delay matrix
+        :param substrate:
+        :return:
+        """
+        latency = sum(function.processing_time for function in self.functions)
+
+        for function, next_function in zip(self.functions, self.functions[1:]):
+            delay = substrate.get_delay(function.vm_id, next_function.vm_id)
+            if delay.is_err():
+                return Err(f'function is not embedded: {delay.err_value}')
+            latency += delay.ok_value
+
+        return Ok(latency)
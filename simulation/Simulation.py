@@ -1,26 +1,104 @@
-from result import Result
+from result import Result, Ok, Err
 from simulation import Substrate
+from simulation.ChangeFeed import ChangeFeed, ChangeKind
+from simulation.Metrics import MetricsRegistry, timed
 
-import NetworkFunction
-import ServiceChain
+from simulation.NetworkFunction import NetworkFunction
+from simulation.ServiceChain import ServiceChain
+
+
+# step_seconds times one step in this many
+STEP_TIMING_SAMPLE = 1024
 
 
 class Simulation:
     """
     The simulation class is used to interact with the Substrate object
     """
-    substrate: list[Substrate]  # allow for parallel embedding
+    substrate: Substrate.Substrate
     service_chains: dict[int, ServiceChain] = {}
+    functions: dict[int, NetworkFunction] = {}  # allocated functions by uid
+    function_counter: int = 0
+    chain_counter: int = 0
     current_time: float = 0  # used to check if chains should be deleted
+    metrics: MetricsRegistry  # counters and API latency histograms
+    steps: int = 0  # steps_total of metrics, a plain integer since step is the hottest call
+    changes: ChangeFeed  # change events, flushed once per step
+
+    def __init__(self, substrate: Substrate.Substrate | None = None) -> None:
+        self.substrate = substrate if substrate is not None else Substrate.Substrate()
+        self.metrics = MetricsRegistry()
+        self.metrics.register_counter("steps_total", self, "steps")
+        self.service_chains = {}
+        self.functions = {}
+        self.changes = ChangeFeed()
 
     def _allocate_function(self, target_vm_id: int, function: NetworkFunction) -> Result[None, str]:
-        pass
+        """
+        take the resources of function from host target_vm_id and give the function a uid
+        :param target_vm_id:
+        :param function:
+        :return:
+        """
+        host = self.substrate._get_host_by_id(target_vm_id)
+        if host.is_err():
+            return Err(host.err_value)
+        allocation = host.ok_value.allocate_resources(function.cpu_usage, function.memory_usage,
+                                                      function.storage_usage)
+        if allocation.is_err():
+            return Err(allocation.err_value)
+
+        self.function_counter += 1
+        function.uid = self.function_counter
+        function.vm_id = target_vm_id
+        self.functions[function.uid] = function
+        return Ok(None)
 
     def _free_function(self, target_function_id: int) -> None:
-        pass
+        """
+        give the resources of an allocated function back to its host
+        :param target_function_id:
+        :return:
+        """
+        function = self.functions.pop(target_function_id, None)
+        if function is None:
+            return
+
+        host = self.substrate._get_host_by_id(function.vm_id)
+        if host.is_ok():
+            host.ok_value.free_resources(function.cpu_usage, function.memory_usage, function.storage_usage)
+
+    def _allocate_functions(self, chain: ServiceChain, allocated: list[int]) -> Result[None, str]:
+        """
+        allocate every function of the chain and of the chains it branches into on its host (vm_id)
+        :param chain:
+        :param allocated: uids of the allocated functions are appended here
+        :return:
+        """
+        for function in chain.functions:
+            allocation = self._allocate_function(function.vm_id, function)
+            if allocation.is_err():
+                return allocation
+            allocated.append(function.uid)
+        for next_chain in chain.next_chain:
+            allocation = self._allocate_functions(next_chain, allocated)
+            if allocation.is_err():
+                return allocation
+        return Ok(None)
 
     def _free_chain(self, chain: ServiceChain):
-        pass
+        """
+        free the allocated flows and functions of the chain and of the chains it branches into
+        :param chain:
+        :return:
+        """
+        for path, bandwidth in chain.flows:
+            self.substrate.free_path(path, bandwidth)
+        chain.flows = []
+        for function in chain.functions:
+            self._free_function(function.uid)
+        for next_chain in chain.next_chain:
+            self._free_chain(next_chain)
 
     def _check_chain_time_to_live(self):
         """
@@ -28,9 +106,14 @@ class Simulation:
         freed and free them
         :return:
         """
-        for chain in self.service_chains.values():
-            if chain.time_to_live < self.current_time:
-                self._free_function(chain)
+        if not self.service_chains:
+            return
+        expired = [(chain_uid, chain) for chain_uid, chain in self.service_chains.items()
+                   if chain.time_to_live < self.current_time]
+        for chain_uid, chain in expired:
+            self._free_chain(chain)
+            del self.service_chains[chain_uid]
+            self.changes.publish(ChangeKind.CHAIN_EXPIRED, chain_uid, chain)
 
     def get_state(self) -> Substrate:
         """
@@ -40,8 +123,32 @@ class Simulation:
         """
         return self.substrate
 
+    @timed("step_seconds", sample=STEP_TIMING_SAMPLE)
     def step(self, time_elapsed: float) -> None:
         self.current_time += time_elapsed
+        self.steps += 1
+        self._check_chain_time_to_live()
+        self.changes.flush(self.current_time)
 
+    @timed("allocate_chain_seconds")
     def allocate_chain(self, chain: ServiceChain) -> Result[None, str]:
-        pass
+        """
+        allocate an embedded chain (every function has its host in vm_id, see simulation.Embedding):
+        the resources of its functions, then its bandwidth with ServiceChain.allocate_flows. The chain
+        is freed again once current_time passes its time_to_live. Nothing stays allocated on error.
+        :param chain:
+        :return:
+        """
+        allocated = []
+        allocation = self._allocate_functions(chain, allocated)
+        if allocation.is_ok():
+            allocation = chain.allocate_flows(self.substrate, chain.bandwidth)
+        if allocation.is_err():
+            for function_uid in allocated:
+                self._free_function(function_uid)
+            return Err(allocation.err_value)
+
+        chain.flows = allocation.ok_value
+        self.chain_counter += 1
+        self.service_chains[self.chain_counter] = chain
+        return Ok(None)
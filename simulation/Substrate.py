@@ -1,5 +1,8 @@
+import numpy as np
 from result import Result, Ok, Err, is_ok
 
+from simulation import Routing
+
 uid = int
 
 
@@ -43,7 +46,7 @@ class Host:
         increase available resources of the host
         """
         self.cpu_avail += cpu
-        self.mem_avail += mem
+        self.memory_avail += mem
         self.storage_avail += storage
 
 
@@ -84,6 +87,35 @@ class Substrate:
 
     uid_counter = 0
 
+    # host uid <-> row of the routing arrays and delay matrix
+    _host_index: dict[uid, int] = {}
+    _host_uids: list[uid] = []
+
+    # compressed sparse row adjacency, every link is stored as one arc per direction,
+    # the arcs leaving row u are indptr[u] .. indptr[u + 1] - 1. Rebuilt lazily after the topology changes.
+    indptr: np.ndarray | None = None
+    indices: np.ndarray | None = None  # destination row per arc
+    arc_latency: np.ndarray | None = None
+    arc_bandwidth: np.ndarray | None = None  # available bandwidth per arc
+    arc_link: np.ndarray | None = None  # index in link_keys per arc
+    link_keys: list[tuple[uid, uid]] = []
+    _link_arcs: np.ndarray | None = None  # the two arcs of every link
+    _routing_graph: Routing.CSRGraph | None = None
+
+    # all-pairs link latency between hosts, rebuilt lazily after the topology changes
+    _delay_matrix: np.ndarray | None = None
+
+    def __init__(self) -> None:
+        self.nodes = {}
+        self.edges = {}
+        self._host_index = {}
+        self._host_uids = []
+        self.link_keys = []
+
+    def _topology_changed(self) -> None:
+        self._routing_graph = None
+        self._delay_matrix = None
+
     def _get_uid(self) -> int:
         self.uid_counter += 1
         return self.uid_counter
@@ -95,6 +127,9 @@ class Substrate:
         uid = self._get_uid()
         host.uid = uid
         self.nodes[uid] = host
+        self._host_index[uid] = len(self._host_uids)
+        self._host_uids.append(uid)
+        self._topology_changed()
 
     def _get_host_by_id(self, host_uid: int) -> Result[Host, str]:
         """
@@ -114,6 +149,7 @@ class Substrate:
         :return:
         """
         self.edges[(source_host, destination_host)] = link
+        self._topology_changed()
 
     def _get_link_by_ids(self, source_host: uid, destination_host: uid) -> Result[Link, str]:
         """
@@ -128,7 +164,267 @@ class Substrate:
         if link:
             return Ok(link)
 
-        Err(f'link not found')
+        return Err(f'link not found')
+
+    def _build_csr(self) -> None:
+        """
+        build the CSR arrays from the links and the list mirror used by the routing engine
+        :return:
+        """
+        self.link_keys = list(self.edges)
+        links = [self.edges[key] for key in self.link_keys]
+        link_count = len(links)
+
+        source_rows = np.fromiter((self._host_index[key[0]] for key in self.link_keys), dtype=np.int64,
+                                  count=link_count)
+        destination_rows = np.fromiter((self._host_index[key[1]] for key in self.link_keys), dtype=np.int64,
+                                       count=link_count)
+        latency = np.fromiter((link.latency for link in links), dtype=float, count=link_count)
+        bandwidth = np.fromiter((link.bandwidth_avail for link in links), dtype=float, count=link_count)
+
+        arc_sources = np.concatenate([source_rows, destination_rows])
+        order = np.argsort(arc_sources, kind='stable')
+        arc_link = np.concatenate([np.arange(link_count), np.arange(link_count)])[order]
+
+        self.indptr = np.zeros(len(self._host_uids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(arc_sources, minlength=len(self._host_uids)), out=self.indptr[1:])
+        self.indices = np.concatenate([destination_rows, source_rows])[order]
+        self.arc_latency = np.concatenate([latency, latency])[order]
+        self.arc_bandwidth = np.concatenate([bandwidth, bandwidth])[order]
+        self.arc_link = arc_link
+
+        self._link_arcs = np.empty((link_count, 2), dtype=np.int64)
+        arcs_by_link = np.argsort(arc_link, kind='stable')
+        self._link_arcs[:, 0] = arcs_by_link[0::2]
+        self._link_arcs[:, 1] = arcs_by_link[1::2]
+
+        self._routing_graph = Routing.CSRGraph(self.indptr, self.indices, self.arc_latency, self.arc_bandwidth,
+                                               self.arc_link)
+
+    def routing_graph(self) -> Routing.CSRGraph:
+        """
+        return the CSR routing graph, (re)building it if the topology changed
+        :return:
+        """
+        if self._routing_graph is None:
+            self._build_csr()
+
+        return self._routing_graph
+
+    def sync_bandwidth(self) -> None:
+        """
+        reload the available bandwidth of every link into the routing arrays,
+        needed after links were allocated or freed directly instead of through the substrate
+        :return:
+        """
+        graph = self.routing_graph()
+        bandwidth = np.fromiter((self.edges[key].bandwidth_avail for key in self.link_keys), dtype=float,
+                                count=len(self.link_keys))
+        self.arc_bandwidth[self._link_arcs[:, 0]] = bandwidth
+        self.arc_bandwidth[self._link_arcs[:, 1]] = bandwidth
+        graph.bandwidth = self.arc_bandwidth.tolist()
+
+    def _path_links(self, path: list[uid]) -> Result[list[int], str]:
+        graph = self.routing_graph()
+        links = []
+        for source_host, destination_host in zip(path, path[1:]):
+            if source_host not in self._host_index:
+                return Err(f'host {source_host} not found')
+            row = self._host_index[source_host]
+            best_arc = -1
+            for arc in range(graph.indptr[row], graph.indptr[row + 1]):
+                if self._host_uids[graph.indices[arc]] == destination_host and (
+                        best_arc < 0 or graph.bandwidth[arc] > graph.bandwidth[best_arc]):
+                    best_arc = arc
+            if best_arc < 0:
+                return Err(f'link not found')
+            links.append(graph.arc_link[best_arc])
+        return Ok(links)
+
+    def _set_link_bandwidth(self, link_index: int, bandwidth: float) -> None:
+        for arc in self._link_arcs[link_index]:
+            self.arc_bandwidth[arc] = bandwidth
+            self._routing_graph.bandwidth[arc] = bandwidth
+
+    def allocate_path(self, path: list[uid], bandwidth: float) -> Result[None, str]:
+        """
+        allocate bandwidth on every link of a host path, nothing is allocated if one link lacks it
+        :param path: host uids
+        :param bandwidth:
+        :return:
+        """
+        links = self._path_links(path)
+        if links.is_err():
+            return links
+
+        demand: dict[int, float] = {}
+        for link_index in links.ok_value:
+            demand[link_index] = demand.get(link_index, 0) + bandwidth
+        for link_index, amount in demand.items():
+            if self.edges[self.link_keys[link_index]].bandwidth_avail < amount:
+                return Err(f'resources not available on link {self.link_keys[link_index]}')
+
+        for link_index, amount in demand.items():
+            link = self.edges[self.link_keys[link_index]]
+            link.allocate_resources(amount)
+            self._set_link_bandwidth(link_index, link.bandwidth_avail)
+
+        return Ok(None)
+
+    def free_path(self, path: list[uid], bandwidth: float) -> None:
+        """
+        free bandwidth previously allocated with allocate_path
+        :param path: host uids
+        :param bandwidth:
+        :return:
+        """
+        links = self._path_links(path)
+        for link_index in links.unwrap_or([]):
+            link = self.edges[self.link_keys[link_index]]
+            link.free_resources(bandwidth)
+            self._set_link_bandwidth(link_index, link.bandwidth_avail)
+
+    def allocate_multipath(self, source_host: uid, destination_host: uid, bandwidth: float, k: int = 3,
+                           split_ratio: list[float] | None = None) -> Result[list[tuple[list[uid], float]], str]:
+        """
+        allocate bandwidth split over up to k shortest paths: with split_ratio the first paths get
+        fixed shares, otherwise the shortest paths are filled first. Nothing is allocated if the
+        bandwidth does not fit.
+        :param source_host:
+        :param destination_host:
+        :param bandwidth:
+        :param k:
+        :param split_ratio: relative share per path, shortest path first
+        :return: (host path, bandwidth) per used path
+        """
+        paths = self.k_shortest_paths(source_host, destination_host, k)
+        if paths.is_err():
+            return paths
+        paths = [path for _, path in paths.ok_value]
+        if not paths:
+            return Err(f'no path from host {source_host} to host {destination_host}')
+
+        if split_ratio is not None:
+            if len(split_ratio) > len(paths):
+                return Err(f'split ratio has {len(split_ratio)} shares but there are only {len(paths)} paths '
+                           f'from host {source_host} to host {destination_host}')
+            paths = paths[:len(split_ratio)]
+            total = sum(split_ratio)
+            shares = [bandwidth * ratio / total for ratio in split_ratio]
+        else:
+            shares = None
+
+        flows = []
+        left = bandwidth
+        planned: dict[int, float] = {}
+        for index, path in enumerate(paths):
+            links = self._path_links(path).unwrap()
+            headroom = min((self.edges[self.link_keys[link_index]].bandwidth_avail - planned.get(link_index, 0)
+                            for link_index in links), default=bandwidth)
+            share = min(left, headroom) if shares is None else shares[index]
+            if shares is not None and share > headroom:
+                return Err(f'split share {share} does not fit on path {path}')
+            if share <= 0:
+                continue
+            for link_index in links:
+                planned[link_index] = planned.get(link_index, 0) + share
+            flows.append((path, share))
+            left -= share
+            if shares is None and left <= 0:
+                break
+
+        if shares is None and left > 1e-12:
+            return Err(f'{bandwidth} bandwidth does not fit on the {len(paths)} shortest paths '
+                       f'from host {source_host} to host {destination_host}')
+
+        for index, (path, share) in enumerate(flows):
+            allocation = self.allocate_path(path, share)
+            if allocation.is_err():
+                for allocated_path, allocated_share in flows[:index]:
+                    self.free_path(allocated_path, allocated_share)
+                return allocation
+
+        return Ok(flows)
+
+    def shortest_path(self, source_host: uid, destination_host: uid,
+                      min_bandwidth: float = 0.0) -> Result[tuple[float, list[uid]], str]:
+        """
+        return (latency, host path) of the lowest latency path whose links all have
+        min_bandwidth available, or an error message if there is none
+        :param source_host:
+        :param destination_host:
+        :param min_bandwidth:
+        :return:
+        """
+        for host_uid in (source_host, destination_host):
+            if host_uid not in self._host_index:
+                return Err(f'host {host_uid} not found')
+
+        path = Routing.shortest_path(self.routing_graph(), self._host_index[source_host],
+                                     self._host_index[destination_host], min_bandwidth)
+        if path is None:
+            return Err(f'no path from host {source_host} to host {destination_host}')
+
+        return Ok((path[0], [self._host_uids[row] for row in path[1]]))
+
+    def k_shortest_paths(self, source_host: uid, destination_host: uid, k: int,
+                         min_bandwidth: float = 0.0) -> Result[list[tuple[float, list[uid]]], str]:
+        """
+        return up to k loopless (latency, host path) pairs, shortest first (Yen's algorithm)
+        :param source_host:
+        :param destination_host:
+        :param k:
+        :param min_bandwidth:
+        :return:
+        """
+        for host_uid in (source_host, destination_host):
+            if host_uid not in self._host_index:
+                return Err(f'host {host_uid} not found')
+
+        paths = Routing.k_shortest_paths(self.routing_graph(), self._host_index[source_host],
+                                         self._host_index[destination_host], k, min_bandwidth)
+
+        return Ok([(latency, [self._host_uids[row] for row in rows]) for latency, rows, _ in paths])
+
+    def _build_delay_matrix(self) -> None:
+        """
+        run Dijkstra from every host over the CSR arcs and store the
+        shortest latencies in a host x host matrix
+        :return:
+        """
+        graph = self.routing_graph()
+
+        delay_matrix = np.empty((len(self._host_uids), len(self._host_uids)))
+        for row in range(len(self._host_uids)):
+            delay_matrix[row] = Routing.dijkstra(graph, row)
+
+        self._delay_matrix = delay_matrix
+
+    def delay_matrix(self) -> tuple[np.ndarray, dict[uid, int]]:
+        """
+        return the all-pairs shortest latency matrix (inf when unreachable)
+        and the mapping from host uid to matrix row/column
+        :return:
+        """
+        if self._delay_matrix is None:
+            self._build_delay_matrix()
+
+        return self._delay_matrix, self._host_index
+
+    def get_delay(self, source_host: uid, destination_host: uid) -> Result[float, str]:
+        """
+        return the shortest latency between two hosts, or an error message if a host is not found
+        :param source_host:
+        :param destination_host:
+        :return:
+        """
+        delay_matrix, host_index = self.delay_matrix()
+
+        for host_uid in (source_host, destination_host):
+            if host_uid not in host_index:
+                return Err(f'host {host_uid} not found')
+
+        return Ok(float(delay_matrix[host_index[source_host], host_index[destination_host]]))
 
     def __str__(self):
         return f"hosts in network: {len(self.nodes)}, links in network: {len(self.edges)}"
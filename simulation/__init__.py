@@ -1,2 +1,2 @@
-from NetworkFunction import NetworkFunction
-from ServiceChain import ServiceChain
\ No newline at end of file
+from simulation.NetworkFunction import NetworkFunction
+from simulation.ServiceChain import ServiceChain
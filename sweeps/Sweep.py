@@ -0,0 +1,284 @@
+"""
+Parallel, resumable parameter sweeps for VNFnet.
+
+A sweep file (JSON) declares a scenario and a grid of parameters; every combination of
+the grid values is one cell and runs once:
+
+    {
+        "scenario": "sweeps.Sweep:admission_scenario",
+        "grid": {"hosts": [100, 1000], "traffic_pattern": ["RESERVED", "SQUARE"],
+                 "arrival_rate": [5, 20], "seed": [0, 1, 2]},
+        "fixed": {"ticks": 100}
+    }
+
+The scenario is a "module:function" taking the cell parameters (grid values plus the
+fixed ones) and returning a JSON serializable summary. Cells run in a process pool with a
+bounded number of runs in flight. Every finished run is appended to results.jsonl in the
+output directory as soon as it completes; that file is also the checkpoint, so running
+the same sweep again only runs the cells that are not in it yet.
+
+usage:
+    python sweeps/Sweep.py sweeps/example.json --output sweep_results          # all cores
+    python sweeps/Sweep.py sweeps/example.json --output sweep_results --workers 8
+    python sweeps/Sweep.py sweeps/example.json --output sweep_results --retry-failed
+"""
+import argparse
+import hashlib
+import importlib
+import itertools
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+REPOSITORY_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_FILE = "results.jsonl"
+
+
+def expand_grid(sweep: dict) -> list[dict]:
+    """
+    every combination of the grid values, merged with the fixed parameters, in a stable order
+    :param sweep:
+    :return:
+    """
+    grid = sweep.get("grid", {})
+    names = sorted(grid)
+    cells = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        parameters = dict(sweep.get("fixed", {}))
+        parameters.update(zip(names, values))
+        cells.append(parameters)
+    return cells
+
+
+def cell_id(scenario: str, parameters: dict) -> str:
+    key = json.dumps({"scenario": scenario, "parameters": parameters}, sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def load_checkpoint(path: str) -> dict[str, dict]:
+    """
+    finished runs by cell id, a partly written last line (interrupted sweep) is ignored
+    :param path:
+    :return:
+    """
+    finished = {}
+    if not os.path.isfile(path):
+        return finished
+    with open(path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            finished[record["cell"]] = record
+    return finished
+
+
+def _initialize_worker(work_dir: str, log_level: str) -> None:
+    import logging
+
+    # vnfnet writes its log under the working directory
+    os.chdir(work_dir)
+    if REPOSITORY_ROOT not in sys.path:
+        sys.path.insert(0, REPOSITORY_ROOT)
+    logging.getLogger().setLevel(log_level)
+    logging.getLogger("vnfnet").setLevel(log_level)
+
+
+def run_cell(scenario: str, parameters: dict) -> dict:
+    """
+    run one cell in the current process, errors are returned in the record instead of raised
+    :param scenario: "module:function"
+    :param parameters:
+    :return:
+    """
+    record = {"cell": cell_id(scenario, parameters), "parameters": parameters, "pid": os.getpid()}
+    start = time.perf_counter()
+    try:
+        moduleName, functionName = scenario.split(":")
+        function = getattr(importlib.import_module(moduleName), functionName)
+        record["summary"] = function(dict(parameters))
+        record["error"] = None
+    except Exception:
+        record["summary"] = None
+        record["error"] = traceback.format_exc(limit=5)
+    record["seconds"] = time.perf_counter() - start
+    return record
+
+
+def run_sweep(sweep: dict, output: str, workers: int, retry_failed=False, log_level="WARNING",
+              max_in_flight: int | None = None) -> dict:
+    """
+    run the cells of sweep that are not in the checkpoint of output yet
+    :param sweep:
+    :param output: directory of results.jsonl
+    :param workers: processes
+    :param retry_failed: run the cells that finished with an error again
+    :param log_level: of the vnfnet log in the workers
+    :param max_in_flight: submitted but unfinished runs, 2 per worker by default
+    :return: counts of cells, skipped, ran and failed runs
+    """
+    scenario = sweep.get("scenario", "sweeps.Sweep:admission_scenario")
+    os.makedirs(output, exist_ok=True)
+    resultsPath = os.path.join(output, RESULTS_FILE)
+
+    finished = load_checkpoint(resultsPath)
+    cells = expand_grid(sweep)
+    pending = [parameters for parameters in cells
+               if not (cell_id(scenario, parameters) in finished and
+                       (finished[cell_id(scenario, parameters)]["error"] is None or not retry_failed))]
+    counts = {"cells": len(cells), "skipped": len(cells) - len(pending), "ran": 0, "failed": 0}
+    print("[Sweep] " + str(len(cells)) + " cells, " + str(counts["skipped"]) + " already finished, running " + str(
+        len(pending)) + " on " + str(workers) + " workers", flush=True)
+    if not pending:
+        return counts
+
+    # one thread per worker process, so the workers do not oversubscribe the cores
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(variable, "1")
+
+    # an interrupted write can leave the last record without its line end
+    if os.path.isfile(resultsPath) and os.path.getsize(resultsPath):
+        with open(resultsPath, "rb") as file:
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) != b"\n":
+                with open(resultsPath, "a") as results:
+                    results.write("\n")
+
+    maxInFlight = max_in_flight or 2 * workers
+    cellQueue = iter(pending)
+    startTime = time.perf_counter()
+    with open(resultsPath, "a") as results, ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker,
+                                                                initargs=(os.path.abspath(output),
+                                                                          log_level)) as pool:
+        try:
+            inFlight = set()
+            while True:
+                for parameters in itertools.islice(cellQueue, maxInFlight - len(inFlight)):
+                    inFlight.add(pool.submit(run_cell, scenario, parameters))
+                if not inFlight:
+                    break
+
+                done, inFlight = wait(inFlight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    results.write(json.dumps(record) + "\n")
+                    counts["ran"] += 1
+                    if record["error"] is not None:
+                        counts["failed"] += 1
+                results.flush()
+                os.fsync(results.fileno())
+
+                ran = counts["ran"]
+                if ran % max(1, len(pending) // 20) == 0 or ran == len(pending):
+                    print(" |- " + str(ran) + "/" + str(len(pending)) + " runs, " + str(counts["failed"]) +
+                          " failed, " + format(ran / (time.perf_counter() - startTime), ".3g") + " runs/s", flush=True)
+        except KeyboardInterrupt:
+            # finished runs are already in the checkpoint, drop the queued ones
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    return counts
+
+
+# Built-in Scenario
+
+def admission_scenario(parameters: dict) -> dict:
+    """
+    the seeded topology of simulation.Scenario.random_topology with users arriving at arrival_rate
+    per tick (Poisson) and staying holding_time ticks on average (geometric)
+    parameters: hosts, traffic_pattern (TrafficPattern name), arrival_rate, seed, ticks, holding_time,
+    data_rate, link_bandwidth
+    :param parameters:
+    :return: admission and load summary of the run, the throughput is the sum of the rates the traffic
+    pattern sets per tick and the utilization its share of the reserved bandwidth
+    """
+    import numpy as np
+
+    from simulation.Scenario import random_topology
+    from vnfnet import TrafficPattern
+
+    hosts = int(parameters.get("hosts", 100))
+    seed = int(parameters.get("seed", 0))
+    ticks = int(parameters.get("ticks", 100))
+    arrivalRate = float(parameters.get("arrival_rate", 5))
+    holdingTime = float(parameters.get("holding_time", 10))
+    dataRate = float(parameters.get("data_rate", 1))
+    linkBandwidth = float(parameters.get("link_bandwidth", 100))
+    pattern = TrafficPattern[parameters.get("traffic_pattern", "RESERVED")]
+
+    arrivals = np.random.default_rng(seed).poisson(arrivalRate, ticks)
+    net, hostObjects, _, chains, rng = random_topology(hosts, seed, linkBandwidth, "sweep_" + str(seed))
+
+    active = []  # (connection, user link)
+    offered = admitted = 0
+    activeSum = 0
+    throughputSum = peakThroughput = 0.0
+    reservedSum = 0.0  # bandwidth reserved by the sampled connections, summed over the ticks
+    for tick in range(ticks):
+        for _ in range(int(arrivals[tick])):
+            offered += 1
+            user = net.add_user("user" + str(offered), rng.choice(chains), data_rate=dataRate,
+                                traffic_pattern=pattern)
+            userLink = net.add_link(user, rng.choice(hostObjects), bandwidth=linkBandwidth, delay=1)
+            connection = net.start_traffic(user)
+            if connection:
+                admitted += 1
+                active.append((connection, userLink))
+            else:
+                net.remove_link(userLink)
+                net.remove_user(user)
+
+        # the traffic pattern sets the rate each connection actually sends at within its reservation
+        throughput = 0.0
+        staying = []
+        for connection, userLink in active:
+            throughput += connection.userObject.traffic_pattern_generator()
+            reservedSum += connection.userObject.bandwidth
+            if rng.random() < 1 / holdingTime:
+                net.stop_traffic(connection)
+                net.remove_link(userLink)
+                net.remove_user(connection.userObject)
+            else:
+                staying.append((connection, userLink))
+        active = staying
+        activeSum += len(active)
+        throughputSum += throughput
+        peakThroughput = max(peakThroughput, throughput)
+
+    return {
+        "offered": offered,
+        "admitted": admitted,
+        "acceptance_ratio": admitted / offered if offered else None,
+        "mean_active": activeSum / ticks if ticks else 0,
+        "mean_throughput": throughputSum / ticks if ticks else 0,
+        "peak_throughput": peakThroughput,
+        "mean_utilization": throughputSum / reservedSum if reservedSum else None,
+        "admission_rejects": {cause: net.metrics.counter_value("admission_rejects_total", cause=cause)
+                              for cause in ("bandwidth", "no_path")},
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="VNFnet parameter sweeps")
+    parser.add_argument("sweep", help="sweep JSON file")
+    parser.add_argument("--output", required=True, help="directory of the results and checkpoint")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--retry-failed", action="store_true", help="run failed cells again")
+    parser.add_argument("--log-level", default="WARNING", help="vnfnet log level in the workers")
+    args = parser.parse_args()
+
+    with open(args.sweep) as file:
+        sweep = json.load(file)
+
+    counts = run_sweep(sweep, args.output, args.workers, args.retry_failed, args.log_level)
+    print("[Sweep] " + ", ".join(name + "=" + str(value) for name, value in counts.items()))
+
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
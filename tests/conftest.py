@@ -0,0 +1,61 @@
+import pytest
+
+from simulation.Scenario import random_topology
+
+
+def random_network(hosts: int, seed: int, bandwidth=100, users=20):
+    """
+    the seeded topology of simulation.Scenario.random_topology with users attached to random hosts
+    :return: network, users, vms, hosts, random generator
+    """
+    net, hostObjects, vms, chains, rng = random_topology(hosts, seed, bandwidth, "test_" + str(hosts))
+
+    userObjects = []
+    for i in range(users):
+        user = net.add_user("user" + str(i), rng.choice(chains), data_rate=0.5)
+        net.add_link(user, rng.choice(hostObjects), bandwidth=bandwidth, delay=1)
+        userObjects.append(user)
+
+    return net, userObjects, vms, hostObjects, rng
+
+
+@pytest.fixture
+def network():
+    return random_network(30, seed=7)
+
+
+def reserved_on_links(net) -> dict:
+    """
+    bandwidth every active connection holds per link uid, rebuilt from the connection paths
+    """
+    reserved = {}
+    for connection in net.trafficActivityList:
+        for flows in net._connection_segment_flows(connection):
+            for path, share in flows:
+                for u, v in zip(path[:-1], path[1:]):
+                    uid = net.topologyGraph[u][v]["uid"]
+                    reserved[uid] = reserved.get(uid, 0) + share
+    return reserved
+
+
+def assert_link_index_consistent(net):
+    """
+    linkConnections holds exactly the active connections whose flows cross each link
+    """
+    expected = {}
+    for connection in net.trafficActivityList:
+        for flows in net._connection_segment_flows(connection):
+            for path, _ in flows:
+                for u, v in zip(path[:-1], path[1:]):
+                    expected.setdefault(net.topologyGraph[u][v]["uid"], set()).add(connection)
+    assert {uid: connections for uid, connections in net.linkConnections.items() if connections} == expected
+
+
+def assert_bandwidth_conserved(net):
+    """
+    every working link is short of its capacity by exactly the bandwidth of the connections crossing it
+    """
+    reserved = reserved_on_links(net)
+    for link in net.networkLinks:
+        if link.uid not in net.failedLinks:
+            assert link.bandwidthCap - link.bandwidthUtil == pytest.approx(reserved.get(link.uid, 0))
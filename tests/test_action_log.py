@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+from conftest import random_network
+from simulation.ActionLog import replay
+
+
+def state(net) -> tuple:
+    return (net.currentTime,
+            [(host.uid, host.CPUUtil, host.RAMUtil) for host in net.networkHosts],
+            [(link.uid, link.bandwidthUtil) for link in net.networkLinks],
+            [(connection.uid, connection.nodePath) for connection in net.trafficActivityList],
+            [(vm.uid, vm.host.uid) for vm in net.networkVMs],
+            sorted(net.failedLinks))
+
+
+def run(net, users, vms, hostObjects, ticks: int, snapshots: dict) -> None:
+    """
+    random admissions, teardowns, migrations and link failures, drawn from the seeded random module
+    """
+    for tick in range(ticks):
+        for _ in range(3):
+            action = random.random()
+            if action < 0.4:
+                net.start_traffic(random.choice(users))
+            elif action < 0.6 and net.trafficActivityList:
+                net.stop_traffic(random.choice(net.trafficActivityList))
+            elif action < 0.8:
+                vm = random.choice(vms)
+                net.migrate_vm(vm, vm.host, random.choice(hostObjects))
+            elif action < 0.9:
+                net.fail_link(random.choice(net.networkLinks))
+            elif net.failedLinks:
+                net.repair_link(net.linksByUid[random.choice(sorted(net.failedLinks))])
+        net.tick()
+        snapshots[tick + 1] = state(net)
+
+
+@pytest.mark.parametrize("keyframe_interval", [0, 4])
+def test_replay_reproduces_every_tick(tmp_path, keyframe_interval):
+    net, users, vms, hostObjects, _ = random_network(20, seed=9, bandwidth=3)
+    path = str(tmp_path / "run.vlog")
+    net.record_actions(path, keyframe_interval=keyframe_interval)
+    net.seed(5)
+    snapshots = {0: state(net)}
+    run(net, users, vms, hostObjects, 12, snapshots)
+    net.stop_recording()
+
+    for tick in (0, 3, 4, 9, 12):
+        replayed = replay(path, tick)
+        assert state(replayed) == snapshots[tick]
+        assert replayed.actionLog is None
+    assert state(replay(path)) == snapshots[12]
+
+
+def test_replayed_network_continues_like_the_original(tmp_path):
+    net, users, vms, hostObjects, _ = random_network(20, seed=9, bandwidth=3)
+    path = str(tmp_path / "run.vlog")
+    net.record_actions(path, keyframe_interval=5)
+    net.seed(6)
+    run(net, users, vms, hostObjects, 7, {})
+    net.stop_recording()
+
+    replayed = replay(path, 7)
+    continued, original = {}, {}
+    state_random = random.getstate()
+    run(net, users, vms, hostObjects, 3, original)
+    random.setstate(state_random)
+    run(replayed, replayed.networkUsers, replayed.networkVMs, replayed.networkHosts, 3, continued)
+    assert continued == original
+
+
+def test_consolidation_is_replayed_from_its_migrations(tmp_path, monkeypatch):
+    net, users, vms, hostObjects, _ = random_network(20, seed=9)
+    for user in users:
+        net.start_traffic(user)
+    path = str(tmp_path / "run.vlog")
+    net.record_actions(path)
+    report = net.consolidate(time_budget=10)
+    net.tick()
+    net.stop_recording()
+    assert report.appliedMigrations
+
+    # the plan depends on the time budget, replay must not plan again
+    monkeypatch.setattr(type(net), "consolidate", lambda *args, **kwargs: pytest.fail("consolidate replayed"))
+    assert state(replay(path)) == state(net)
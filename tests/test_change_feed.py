@@ -0,0 +1,94 @@
+from conftest import random_network
+from simulation.ChangeFeed import ChangeFeed, ChangeKind
+from simulation.NetworkFunction import NetworkFunction
+from simulation.ServiceChain import ServiceChain
+from simulation.Simulation import Simulation
+
+
+def kinds(batch) -> dict:
+    return {(event.kind, event.uid): event.value for event in batch.events}
+
+
+def test_last_value_per_entity_wins():
+    feed = ChangeFeed()
+    subscription = feed.subscribe()
+    feed.publish(ChangeKind.LINK_BANDWIDTH_CHANGED, 1, value=5)
+    feed.publish(ChangeKind.LINK_BANDWIDTH_CHANGED, 1, value=3)
+    feed.publish(ChangeKind.LINK_BANDWIDTH_CHANGED, 2, value=7)
+    batch = feed.flush(1.0)
+    assert kinds(batch) == {(ChangeKind.LINK_BANDWIDTH_CHANGED, 1): 3, (ChangeKind.LINK_BANDWIDTH_CHANGED, 2): 7}
+    [delivered] = subscription.poll()
+    assert kinds(delivered) == kinds(batch) and delivered.sequence == batch.sequence == 1 and delivered.tick == 1.0
+    assert feed.flush() is None
+
+
+def test_vm_placed_and_removed_cancel_out():
+    feed = ChangeFeed()
+    feed.publish(ChangeKind.VM_PLACED, 9, value=1)
+    feed.publish(ChangeKind.VM_REMOVED, 9, value=1)
+    feed.publish(ChangeKind.VM_PLACED, 9, value=2)
+    assert kinds(feed.flush()) == {(ChangeKind.VM_PLACED, 9): 2}
+
+
+def test_connection_started_and_stopped_in_one_batch_is_left_out():
+    feed = ChangeFeed()
+    feed.publish(ChangeKind.CONNECTION_STARTED, 4)
+    feed.publish(ChangeKind.CONNECTION_REROUTED, 4)
+    feed.publish(ChangeKind.CONNECTION_STARTED, 5)
+    feed.publish(ChangeKind.CONNECTION_STOPPED, 5)
+    assert [(event.kind, event.uid) for event in feed.flush().events] == [(ChangeKind.CONNECTION_STARTED, 4)]
+
+
+def test_slow_subscriber_gets_merged_batches():
+    feed = ChangeFeed()
+    subscription = feed.subscribe(kinds=[ChangeKind.HOST_CHANGED], max_batches=2)
+    for tick in range(5):
+        feed.publish(ChangeKind.HOST_CHANGED, 1, value=tick)
+        feed.publish(ChangeKind.HOST_CHANGED, tick + 10, value=tick)
+        feed.publish(ChangeKind.LINK_BANDWIDTH_CHANGED, 1, value=tick)
+        feed.flush(tick)
+
+    first, last = subscription.poll()
+    assert subscription.mergedBatches == 3
+    assert (first.first_sequence, first.sequence) == (1, 1)
+    assert (last.first_sequence, last.sequence) == (2, 5)
+    assert kinds(last) == {(ChangeKind.HOST_CHANGED, 1): 4, **{(ChangeKind.HOST_CHANGED, uid + 10): uid
+                                                                 for uid in range(1, 5)}}
+
+
+def test_network_changes_are_published():
+    net, users, vms, hostObjects, _ = random_network(20, seed=1)
+    feed = ChangeFeed(net)
+    connection = net.start_traffic(users[0])
+    vm = vms[0]
+    source = vm.host
+    destination = next(host for host in hostObjects if host is not source)
+    net.migrate_vm(vm, source, destination)
+    batch = feed.flush()
+
+    events = kinds(batch)
+    assert (ChangeKind.CONNECTION_STARTED, connection.uid) in events
+    assert events[(ChangeKind.VM_PLACED, vm.uid)] == destination.uid
+    assert (ChangeKind.VM_REMOVED, vm.uid) in events
+    assert events[(ChangeKind.HOST_CHANGED, destination.uid)] == (destination.CPUUtil, destination.RAMUtil,
+                                                                 destination.StorageUtil)
+
+    net.stop_traffic(connection)
+    events = kinds(feed.flush())
+    assert (ChangeKind.CONNECTION_STOPPED, connection.uid) in events
+    assert {kind for kind, _ in events} == {ChangeKind.CONNECTION_STOPPED, ChangeKind.LINK_BANDWIDTH_CHANGED}
+
+
+def test_simulation_publishes_expired_chains():
+    simulation = Simulation()
+    subscription = simulation.changes.subscribe()
+    chain = ServiceChain()
+    chain.add_function(NetworkFunction(1, 1, 1, 1))
+    chain.time_to_live = 1
+    simulation.service_chains[7] = chain
+    simulation.step(0.5)
+    assert subscription.poll() == []
+    simulation.step(1)
+    [batch] = subscription.poll()
+    assert [(event.kind, event.uid) for event in batch.events] == [(ChangeKind.CHAIN_EXPIRED, 7)]
+    assert not simulation.service_chains
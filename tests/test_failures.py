@@ -0,0 +1,69 @@
+from conftest import random_network, assert_bandwidth_conserved, assert_link_index_consistent
+
+
+def crossing(net, connection) -> set[int]:
+    return {net.topologyGraph[u][v]["uid"] for flows in net._connection_segment_flows(connection)
+            for path, _ in flows for u, v in zip(path[:-1], path[1:])}
+
+
+def loaded_network(seed: int):
+    net, users, vms, hostObjects, rng = random_network(30, seed)
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+    return net, connections, vms, hostObjects, rng
+
+
+def test_link_failure_reroutes_the_connections_crossing_it():
+    net, connections, _, _, _ = loaded_network(3)
+    link = max(net.networkLinks, key=lambda x: len(net.linkConnections.get(x.uid, ())))
+    affected = set(net.linkConnections[link.uid])
+    untouched = {connection: list(connection.nodePath) for connection in connections if connection not in affected}
+
+    report = net.fail_link(link)
+    assert report.affectedConnections == len(affected)
+    assert report.reroutedConnections + len(report.droppedConnections) == len(affected)
+    assert all(connection.nodePath == path for connection, path in untouched.items())
+    for connection in affected:
+        if connection.active:
+            assert link.uid not in crossing(net, connection)
+        else:
+            assert connection in report.droppedConnections
+    assert not net.topologyGraph.has_edge(link.source.uid, link.destination.uid)
+    assert_bandwidth_conserved(net)
+    assert_link_index_consistent(net)
+
+    assert net.repair_link(link)
+    assert net.topologyGraph.has_edge(link.source.uid, link.destination.uid)
+    assert link.bandwidthUtil == link.bandwidthCap
+
+
+def test_host_failure_relocates_vms_and_reroutes():
+    net, connections, vms, hostObjects, _ = loaded_network(4)
+    host = max(hostObjects, key=lambda x: len(net.hostVMs.get(x.uid, ())))
+    hosted = set(net.hostVMs[host.uid])
+
+    report = net.fail_host(host)
+    assert report.relocatedVMs + len(report.lostVMs) == len(hosted)
+    assert not net.hostVMs[host.uid] - set(report.lostVMs)
+    for vm in hosted - set(report.lostVMs):
+        assert vm.host is not host and vm.host.uid not in net.failedHosts
+    for connection in net.trafficActivityList:
+        assert host.uid not in connection.nodePath
+    assert_bandwidth_conserved(net)
+    assert_link_index_consistent(net)
+
+    assert net.repair_host(host)
+    assert host.uid not in net.failedHosts
+    assert all(net.topologyGraph.has_edge(*edge) for edge in
+               ((link.source.uid, link.destination.uid) for link in net.networkLinks))
+
+
+def test_connections_stopped_after_failures_return_their_bandwidth():
+    net, connections, _, hostObjects, rng = loaded_network(5)
+    for _ in range(5):
+        net.fail_link(rng.choice([link for link in net.networkLinks if link.uid not in net.failedLinks]))
+    for connection in list(net.trafficActivityList):
+        net.stop_traffic(connection)
+    for uid in list(net.failedLinks):
+        net.repair_link(net.linksByUid[uid])
+    assert all(link.bandwidthUtil == link.bandwidthCap for link in net.networkLinks)
+    assert not any(net.linkConnections.values())
@@ -0,0 +1,66 @@
+import networkx as nx
+import pytest
+
+from conftest import random_network
+
+
+def dijkstra_delays(net, hostObjects, pairs) -> list[float]:
+    """
+    host-to-host delays by Dijkstra over the working host-to-host links
+    """
+    graph = nx.Graph()
+    graph.add_nodes_from(host.uid for host in hostObjects)
+    for link in net.networkLinks:
+        u, v = link.source.uid, link.destination.uid
+        if link.uid not in net.failedLinks and u in net.hostIndex and v in net.hostIndex:
+            if not graph.has_edge(u, v) or link.latency < graph[u][v]["delay"]:
+                graph.add_edge(u, v, delay=link.latency)
+    delays = []
+    for a, b in pairs:
+        try:
+            delays.append(nx.dijkstra_path_length(graph, a.uid, b.uid, weight='delay'))
+        except nx.NetworkXNoPath:
+            delays.append(float("inf"))
+    return delays
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_matrix_follows_link_failure_repair_and_removal(seed):
+    net, _, _, hostObjects, rng = random_network(40, seed)
+    hostLinks = [link for link in net.networkLinks
+                 if link.source.uid in net.hostIndex and link.destination.uid in net.hostIndex]
+    link = rng.choice(hostLinks)
+    pairs = [(link.source, link.destination)] + [rng.sample(hostObjects, 2) for _ in range(50)]
+
+    def check(step):
+        assert [net.host_delay(a, b) for a, b in pairs] == dijkstra_delays(net, hostObjects, pairs), step
+
+    check("build")
+    net.fail_link(link)
+    check("fail_link")
+    net.repair_link(link)
+    check("repair_link")
+    net.remove_link(link)
+    check("remove_link")
+
+
+def test_matrix_grows_with_hosts_and_links(network):
+    net, _, _, hostObjects, _ = network
+    net.latency_matrix()
+
+    host = net.add_host("late", 8, 8, 8)
+    assert net.host_delay(host, hostObjects[0]) == float("inf")
+    assert net.host_delay(host, host) == 0
+
+    net.add_link(host, hostObjects[0], delay=3)
+    net.add_link(host, hostObjects[1], delay=2)
+    pairs = [(host, other) for other in hostObjects]
+    assert [net.host_delay(a, b) for a, b in pairs] == dijkstra_delays(net, hostObjects + [host], pairs)
+    assert net.host_hops(host, hostObjects[1]) == 1
+
+
+def test_chain_latency_estimate(network):
+    net, users, _, _, _ = network
+    chain = users[0].userChain
+    expected = sum(net.host_delay(a.host, b.host) for a, b in zip(chain.chain[:-1], chain.chain[1:]))
+    assert net.estimate_chain_latency(chain) == expected
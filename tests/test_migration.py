@@ -0,0 +1,82 @@
+import pytest
+
+from conftest import random_network, assert_bandwidth_conserved, assert_link_index_consistent
+
+
+def test_migration_reroutes_only_connections_through_the_vm(network):
+    net, users, vms, hostObjects, rng = network
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+    vm = max(vms, key=lambda x: len(net.vmConnections.get(x.uid, ())))
+    through = set(net.vmConnections[vm.uid])
+    assert through
+    others = {connection: list(connection.nodePath) for connection in connections if connection not in through}
+
+    source = vm.host
+    destination = next(host for host in hostObjects if host is not source)
+    report = net.migrate_vm(vm, source, destination)
+    assert report and report.reroutedConnections == len(through)
+    assert vm.host is destination and vm in net.hostVMs[destination.uid] and vm not in net.hostVMs[source.uid]
+    assert all(connection.nodePath == path for connection, path in others.items())
+    for connection in through:
+        assert destination.uid in connection.nodePath
+    assert_bandwidth_conserved(net)
+    assert_link_index_consistent(net)
+
+
+def test_migration_moves_the_host_resources(network):
+    net, _, vms, hostObjects, _ = network
+    vm = vms[0]
+    source = vm.host
+    destination = next(host for host in hostObjects if host is not source)
+    cpu = (source.CPUUtil, destination.CPUUtil)
+    assert net.migrate_vm(vm, source, destination)
+    assert (source.CPUUtil, destination.CPUUtil) == (cpu[0] - vm.service.CPU_requirements,
+                                                     cpu[1] + vm.service.CPU_requirements)
+
+
+def test_migration_rejects_a_full_or_failed_host(network):
+    net, _, vms, hostObjects, _ = network
+    vm = vms[0]
+    source = vm.host
+    full, down = [host for host in hostObjects if host is not source][:2]
+    full.CPUUtil = full.CPUcap
+    net.fail_host(down)
+    source = vm.host  # the failure may have relocated it
+    if source is down:
+        pytest.skip("the VM ran on the failed host")
+
+    assert net.migrate_vm(vm, source, full) is False
+    assert net.migrate_vm(vm, source, down) is False
+    assert vm.host is source
+    assert net.metrics.counter_value("migrations_total", result="rejected", cause="host_down") == 1
+
+
+def test_random_migrations_keep_the_indexes_consistent():
+    net, users, vms, hostObjects, rng = random_network(30, seed=11, bandwidth=5)
+    for user in users:
+        net.start_traffic(user)
+    for _ in range(100):
+        vm = rng.choice(vms)
+        net.migrate_vm(vm, vm.host, rng.choice(hostObjects))
+    assert_bandwidth_conserved(net)
+    assert_link_index_consistent(net)
+    for host in hostObjects:
+        assert net.hostVMs.get(host.uid, set()) == {vm for vm in vms if vm.host is host}
+
+
+def test_consolidation_frees_hosts_within_the_slas(network):
+    net, users, vms, hostObjects, _ = network
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+    for chain in net.networkChains:
+        pings = [net.service_ping(connection) for connection in connections
+                 if connection.userObject.userChain is chain]
+        chain.sla = max(pings) + 2 if pings else None
+    active = sum(1 for host in hostObjects if host.runningServices)
+
+    report = net.consolidate(time_budget=10)
+    assert report.appliedMigrations == report.plannedMigrations > 0
+    assert report.hostsFreed == active - sum(1 for host in hostObjects if host.runningServices)
+    assert report.energySaved > 0
+    for connection in connections:
+        assert net.service_ping(connection) <= connection.userObject.userChain.sla
+    assert_bandwidth_conserved(net)
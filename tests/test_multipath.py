@@ -0,0 +1,125 @@
+import pytest
+
+from conftest import assert_bandwidth_conserved
+from simulation.NetworkFunction import NetworkFunction
+from simulation.ServiceChain import ServiceChain
+from simulation.Substrate import Substrate, Host, Link
+from vnfnet import Network
+
+
+def diamond(bandwidth=10, second_delay=2):
+    """
+    h0 to h3 over h1 (2 ms) or h2 (1 + second_delay ms), a chain from h0 to h3
+    """
+    net = Network("diamond")
+    h = [net.add_host("h" + str(i), 8, 8, 8) for i in range(4)]
+    net.add_link(h[0], h[1], bandwidth=bandwidth, delay=1)
+    net.add_link(h[1], h[3], bandwidth=bandwidth, delay=1)
+    net.add_link(h[0], h[2], bandwidth=bandwidth, delay=1)
+    net.add_link(h[2], h[3], bandwidth=bandwidth, delay=second_delay)
+    service = net.add_service("svc", 1, 1, 1)
+    chain = net.add_chain("chain", [net.instantiate_vm(service, h[0]), net.instantiate_vm(service, h[3])], sla=None)
+    return net, h, chain
+
+
+def add_user(net, hosts, chain, data_rate):
+    user = net.add_user("user", chain, data_rate=data_rate)
+    for host in hosts:
+        net.add_link(user, host, bandwidth=100, delay=1)
+    return user
+
+
+def test_traffic_above_path_capacity_is_split():
+    net, h, chain = diamond()
+    user = add_user(net, [h[0]], chain, 15)
+    assert not net.start_traffic(user)
+
+    connection = net.start_traffic_multipath(user, k=2)
+    assert connection
+    flows = connection.segmentFlows[1]
+    assert [path for path, _ in flows] == [[h[0].uid, h[1].uid, h[3].uid], [h[0].uid, h[2].uid, h[3].uid]]
+    assert [share for _, share in flows] == pytest.approx([10, 5])
+    assert connection.nodePath == [user.uid, h[0].uid, h[1].uid, h[3].uid]
+    assert_bandwidth_conserved(net)
+
+    assert net.stop_traffic(connection)
+    assert all(link.bandwidthUtil == link.bandwidthCap for link in net.networkLinks)
+
+
+def test_split_ratio():
+    net, h, chain = diamond(bandwidth=100)
+    # the ratio applies to every segment, the user reaches h0 over h1 or h2
+    connection = net.start_traffic_multipath(add_user(net, [h[1], h[2]], chain, 8), k=2, split_ratio=[1, 3])
+    assert [share for _, share in connection.segmentFlows[1]] == pytest.approx([2, 6])
+    assert_bandwidth_conserved(net)
+
+    assert not net.start_traffic_multipath(add_user(net, [h[0]], chain, 8), k=2, split_ratio=[1, 3])
+
+
+def test_ecmp_splits_over_equal_delay_paths_only():
+    net, h, chain = diamond(bandwidth=100, second_delay=1)
+    connection = net.start_traffic_multipath(add_user(net, [h[0]], chain, 8), k=3, ecmp=True)
+    assert [share for _, share in connection.segmentFlows[1]] == pytest.approx([4, 4])
+
+    net, h, chain = diamond(bandwidth=100)
+    connection = net.start_traffic_multipath(add_user(net, [h[0]], chain, 8), k=3, ecmp=True)
+    assert [share for _, share in connection.segmentFlows[1]] == pytest.approx([8])
+    assert_bandwidth_conserved(net)
+
+
+def test_split_that_does_not_fit_is_rejected():
+    net, h, chain = diamond()
+    user = add_user(net, [h[0]], chain, 25)
+    assert not net.start_traffic_multipath(user, k=2)
+    assert not net.start_traffic_multipath(user, k=3, split_ratio=[1, 1, 1])
+    assert all(link.bandwidthUtil == link.bandwidthCap for link in net.networkLinks)
+
+
+def substrate_diamond(bandwidth=10):
+    substrate = Substrate()
+    for _ in range(4):
+        substrate.add_host(Host(100, 100, 100))
+    for (a, b), latency in (((1, 2), 1), ((2, 4), 1), ((1, 3), 1), ((3, 4), 2)):
+        substrate.add_link(a, b, Link(bandwidth, latency, bandwidth))
+    return substrate
+
+
+def test_substrate_multipath_allocation_and_rollback():
+    substrate = substrate_diamond()
+    flows = substrate.allocate_multipath(1, 4, 15, k=2).unwrap()
+    assert flows == [([1, 2, 4], 10), ([1, 3, 4], 5)]
+    assert substrate.edges[(1, 3)].bandwidth_avail == 5
+
+    assert substrate.allocate_multipath(1, 4, 10, k=2).is_err()
+    assert substrate.allocate_multipath(1, 4, 1, k=2, split_ratio=[1, 1, 1]).is_err()
+    assert [link.bandwidth_avail for link in substrate.edges.values()] == [0, 0, 5, 5]
+
+    for path, share in flows:
+        substrate.free_path(path, share)
+    assert all(link.bandwidth_avail == 10 for link in substrate.edges.values())
+
+
+def chain_on(hosts: list[int]) -> ServiceChain:
+    chain = ServiceChain()
+    for host in hosts:
+        function = NetworkFunction(1, 1, 1, 1)
+        function.vm_id = host
+        chain.add_function(function)
+    return chain
+
+
+def test_chain_branches_split_the_bandwidth():
+    substrate = substrate_diamond()
+    chain = chain_on([1])
+    chain.next_chain = [chain_on([2]), chain_on([3])]
+    chain.split_ratio = [3, 1]
+
+    flows = chain.allocate_flows(substrate, 8).unwrap()
+    assert sorted(flows) == [([1, 2], 6), ([1, 3], 2)]
+    assert substrate.edges[(1, 2)].bandwidth_avail == 4
+
+    chain.split_ratio = [1]
+    assert chain.allocate_flows(substrate, 8).is_err()
+    chain.split_ratio = None
+    assert chain.allocate_flows(substrate, 20).is_err()  # 10 per branch, h1-h2 has 4 left
+    assert substrate.edges[(1, 3)].bandwidth_avail == 8
@@ -0,0 +1,65 @@
+import numpy as np
+
+from conftest import random_network
+from simulation.Observation import GraphObservationEncoder
+
+
+def assert_same_observation(encoder, net):
+    fresh = GraphObservationEncoder(net)
+    expected = fresh.encode()
+    fresh.close()
+    observation = encoder.encode()
+    for name in ("node_features", "edge_index", "edge_features"):
+        np.testing.assert_allclose(observation[name], expected[name], rtol=1e-6, err_msg=name)
+
+
+def test_incremental_encoding_matches_a_fresh_encoder():
+    net, users, vms, hostObjects, rng = random_network(30, seed=6, bandwidth=2)
+    encoder = GraphObservationEncoder(net)
+    encoder.encode()
+
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+    assert_same_observation(encoder, net)
+
+    vm = vms[0]
+    net.migrate_vm(vm, vm.host, next(host for host in hostObjects if host is not vm.host))
+    net.stop_traffic(connections[0])
+    assert_same_observation(encoder, net)
+
+
+def test_failed_links_leave_the_edge_index():
+    net, _, _, hostObjects, rng = random_network(30, seed=6)
+    encoder = GraphObservationEncoder(net)
+    edges = encoder.encode()["edge_index"].shape[1]
+
+    link = next(link for link in net.networkLinks if link.source.uid in net.hostIndex)
+    net.fail_link(link)
+    assert encoder.encode()["edge_index"].shape[1] == edges - 2
+    assert_same_observation(encoder, net)
+
+    net.repair_link(link)
+    assert encoder.encode()["edge_index"].shape[1] == edges
+    net.fail_host(hostObjects[0])
+    assert_same_observation(encoder, net)
+
+
+def test_latency_follows_the_congestion_delays():
+    net, users, _, _, _ = random_network(30, seed=6, bandwidth=2)
+    encoder = GraphObservationEncoder(net)
+    encoder.encode()
+    net.enable_congestion_delay(packet_size=10 ** 8)
+    for user in users:
+        net.start_traffic(user)
+    net.tick()
+
+    observation = encoder.encode()
+    graph = net.topologyGraph
+    rows = observation["edge_index"][:, 0::2].T
+    hostUids = [host.uid for host in net.networkHosts]
+    delays = [graph[hostUids[a]][hostUids[b]]["delay"] / net.maxNetLatency for a, b in rows]
+    np.testing.assert_allclose(observation["edge_features"][0::2, 1], delays, rtol=1e-6)
+    assert max(delays) * net.maxNetLatency > max(link.latency for link in net.networkLinks)
+    assert_same_observation(encoder, net)
+
+    net.disable_congestion_delay()
+    assert_same_observation(encoder, net)
@@ -0,0 +1,47 @@
+import numpy as np
+
+from conftest import random_network
+from simulation.Recorder import TimeSeriesRecorder
+
+
+def test_record_state_round_trip(tmp_path):
+    net, users, _, _, _ = random_network(20, seed=8)
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+    directory = str(tmp_path / "run")
+    with TimeSeriesRecorder(directory, net.recorder_columns(max_connections=64), chunk_size=4) as recorder:
+        for tick in range(10):
+            net.record_state(recorder, tick)
+
+    data = TimeSeriesRecorder.load(directory)
+    assert data["tick"].tolist() == list(range(10))
+    assert data["connection_uid"].dtype == np.int64
+    assert data["connection_uid"][0, :len(connections)].tolist() == [connection.uid for connection in connections]
+    assert (data["connection_uid"][0, len(connections):] == -1).all()
+    np.testing.assert_allclose(data["connection_rtt"][0, :len(connections)],
+                               [net.service_ping(connection) for connection in connections])
+
+
+def test_uid_columns_default_to_integers(tmp_path):
+    recorder = TimeSeriesRecorder(str(tmp_path), {"vm_uid": 1, "load": 1}, dtypes={"load": np.float64})
+    recorder.append(0, vm_uid=[2 ** 40 + 1], load=[0.5])
+    recorder.close()
+    data = TimeSeriesRecorder.load(str(tmp_path))
+    assert data["vm_uid"].dtype == np.int64 and data["vm_uid"][0, 0] == 2 ** 40 + 1
+    assert data["load"].dtype == np.float64
+
+
+def test_hosts_and_links_added_later_are_reported(tmp_path, caplog):
+    net, _, _, hostObjects, _ = random_network(10, seed=8)
+    recorder = TimeSeriesRecorder(str(tmp_path), net.recorder_columns(max_connections=8))
+    net.record_state(recorder, 0)
+    host = net.add_host("late", 8, 8, 8)
+    net.add_link(host, hostObjects[0])
+    net.record_state(recorder, 1)
+    net.record_state(recorder, 2)
+    recorder.close()
+
+    assert net.metrics.counter_value("recorder_dropped_total", entity="hosts") == 2
+    assert net.metrics.counter_value("recorder_dropped_total", entity="links") == 2
+    assert recorder.truncated["host_cpu"] == recorder.truncated["link_utilization"] == 2
+    warnings = [record for record in caplog.records if "the rest are not recorded" in record.message]
+    assert len(warnings) == 2
@@ -0,0 +1,133 @@
+import random
+
+import networkx as nx
+import pytest
+
+from vnfnet import Network
+
+
+def domain_network(seed: int, domains=3, hosts=12):
+    """
+    domains of randomly meshed hosts, joined by a few inter-domain links, every host in a domain
+    """
+    rng = random.Random(seed)
+    net = Network("domains")
+    groups = []
+    for d in range(domains):
+        hostObjects = [net.add_host("d" + str(d) + "h" + str(i), 8, 8, 8) for i in range(hosts)]
+        links = [net.add_link(hostObjects[i], hostObjects[rng.randrange(i)], delay=rng.randint(1, 10))
+                 for i in range(1, hosts)]
+        for _ in range(hosts // 2):
+            a, b = rng.sample(hostObjects, 2)
+            if not net.topologyGraph.has_edge(a.uid, b.uid):
+                links.append(net.add_link(a, b, delay=rng.randint(1, 10)))
+        net.add_domain("domain" + str(d), hostObjects, links)
+        groups.append(hostObjects)
+    for _ in range(2 * domains):
+        first, second = rng.sample(groups, 2)
+        a, b = rng.choice(first), rng.choice(second)
+        if not net.topologyGraph.has_edge(a.uid, b.uid):
+            net.add_link(a, b, delay=rng.randint(1, 10))
+    return net, groups, rng
+
+
+def path_delay(net, path) -> float:
+    return sum(net.topologyGraph[u][v]["delay"] for u, v in zip(path[:-1], path[1:]))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_inter_domain_paths_are_shortest(seed):
+    net, groups, rng = domain_network(seed)
+    for _ in range(40):
+        first, second = rng.sample(groups, 2)
+        source, target = rng.choice(first).uid, rng.choice(second).uid
+        delay, path = net.shortest_path(source, target)
+        assert path[0] == source and path[-1] == target
+        assert path_delay(net, path) == delay
+        assert delay == nx.dijkstra_path_length(net.topologyGraph, source, target, weight='delay')
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_intra_domain_paths_are_shortest(seed):
+    net, groups, rng = domain_network(seed, hosts=8)
+    for _ in range(40):
+        source, target = (host.uid for host in rng.sample(rng.choice(groups), 2))
+        delay, path = net.shortest_path(source, target)
+        assert path[0] == source and path[-1] == target
+        assert path_delay(net, path) == delay
+        assert delay == nx.dijkstra_path_length(net.topologyGraph, source, target, weight='delay')
+
+
+def test_intra_domain_pair_takes_a_faster_detour():
+    net = Network("detour")
+    a, b, c = (net.add_host(name, 8, 8, 8) for name in ("a", "b", "c"))
+    net.add_domain("slow", [a, b], [net.add_link(a, b, delay=50)])
+    net.add_domain("fast", [c], [])
+    net.add_link(a, c, delay=1)
+    net.add_link(c, b, delay=1)
+
+    assert net.shortest_path(a.uid, b.uid) == (2, [a.uid, c.uid, b.uid])
+    net.fail_link(net.linksByUid[net.topologyGraph[a.uid][c.uid]["uid"]])
+    assert net.shortest_path(a.uid, b.uid) == (50, [a.uid, b.uid])
+
+
+def test_routes_are_cached_per_domain():
+    net, groups, rng = domain_network(1)
+    pairs = [(rng.choice(groups[0]).uid, rng.choice(groups[1]).uid) for _ in range(20)]
+    for source, target in pairs:
+        net.shortest_path(source, target)
+    calls = net.metrics.counter_value("dijkstra_calls_total", scope="domain")
+    for source, target in pairs:
+        net.shortest_path(source, target)
+    assert net.metrics.counter_value("dijkstra_calls_total", scope="domain") == calls
+    assert net.metrics.counter_value("dijkstra_calls_total", scope="global") == 0
+
+
+def test_paths_follow_link_changes():
+    net, groups, rng = domain_network(2)
+    source, target = groups[0][0].uid, groups[2][-1].uid
+    delay, path = net.shortest_path(source, target)
+
+    u, v = path[len(path) // 2 - 1], path[len(path) // 2]
+    net.fail_link(net.linksByUid[net.topologyGraph[u][v]["uid"]])
+    try:
+        expected = nx.dijkstra_path_length(net.topologyGraph, source, target, weight='delay')
+    except nx.NetworkXNoPath:
+        with pytest.raises(nx.NetworkXNoPath):
+            net.shortest_path(source, target)
+        return
+    delay, path = net.shortest_path(source, target)
+    assert delay == expected
+    assert path_delay(net, path) == delay
+
+
+def test_suspended_links_rebuild_only_their_domains():
+    net, groups, rng = domain_network(4)
+    vmHost = groups[0][-1]
+    service = net.add_service("svc", 1, 1, 1)
+    user = net.add_user("user", net.add_chain("chain", [net.instantiate_vm(service, vmHost)], sla=None), data_rate=5)
+    net.add_link(user, groups[0][0], bandwidth=100, delay=1)
+
+    pairs = [(rng.choice(first).uid, rng.choice(second).uid) for first, second in
+             (rng.sample(groups, 2) for _ in range(20))]
+    for source, target in pairs:
+        net.shortest_path(source, target)
+    graph = net.interDomainGraph
+
+    # the last link towards the VM has too little bandwidth left, start_traffic suspends it and reroutes
+    path = net.shortest_path(user.uid, vmHost.uid)[1]
+    u, v = path[-2], path[-1]
+    net.topologyGraph[u][v]["bandwidth"] = 1
+    touched = {net.nodeDomain[u].uid, net.nodeDomain[v].uid}
+    untouched = {(a, b): data for a, b, data in graph.edges(data=True)
+                 if data["domain"] is not None and data["domain"] not in touched}
+    assert untouched
+
+    net.start_traffic(user)
+    assert net.metrics.counter_value("reroute_retries_total") >= 1
+    assert not net.suspendedLinks
+    for source, target in pairs:
+        delay, path = net.shortest_path(source, target)
+        assert delay == nx.dijkstra_path_length(net.topologyGraph, source, target, weight='delay')
+    assert net.interDomainGraph is graph
+    assert all(graph[a][b] is data for (a, b), data in untouched.items())
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from conftest import random_network
+from simulation.SLA import SLAMonitor
+from vnfnet import Network, TrafficPattern
+
+
+def test_monitor_matches_service_ping_and_perf():
+    net, users, _, _, rng = random_network(30, seed=2)
+    for user in users:
+        user.traffic_pattern = rng.choice(list(TrafficPattern))
+    monitor = SLAMonitor(net)
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+
+    for _ in range(12):
+        report = monitor.evaluate()
+        expected = {connection: (net.service_ping(connection), net.service_perf(connection))
+                    for connection in connections}
+        assert set(report.connections) == set(connections)
+        for connection, rtt, throughput in zip(report.connections, report.rtt, report.throughput):
+            assert (rtt, throughput) == pytest.approx(expected[connection])
+
+
+def test_monitor_follows_the_user_traffic_pattern():
+    net, users, _, _, _ = random_network(30, seed=5)
+    for user in users:
+        user.traffic_pattern = TrafficPattern.SAW
+    monitor = SLAMonitor(net)
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+
+    monitor.evaluate()
+    monitor.evaluate()  # does not advance the pattern
+    for connection in connections[::2]:
+        net.service_perf(connection)
+
+    report = monitor.evaluate()
+    for connection, throughput in zip(report.connections, report.throughput):
+        assert throughput == pytest.approx(net.service_perf(connection))
+
+
+def test_violators_sorted_by_severity_and_counted_per_chain():
+    net, users, _, _, _ = random_network(30, seed=3)
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+    for chain in net.networkChains:
+        chain.sla = 5
+    monitor = SLAMonitor(net, window=4)
+
+    report = monitor.evaluate()
+    violating = [connection for connection in connections if net.service_ping(connection) > 5]
+    assert set(report.violators) == set(violating)
+    assert np.all(np.diff(report.severity) <= 0)
+
+    for _ in range(5):
+        monitor.evaluate()
+    perChain = {}
+    for connection in violating:
+        chainUid = connection.userObject.userChain.uid
+        perChain[chainUid] = perChain.get(chainUid, 0) + 4
+    assert monitor.chain_violations() == perChain
+
+
+def test_monitor_follows_reroutes_and_stops():
+    net, users, vms, hostObjects, rng = random_network(30, seed=4)
+    monitor = SLAMonitor(net)
+    connections = [connection for connection in (net.start_traffic(user) for user in users) if connection]
+    monitor.evaluate()
+
+    net.stop_traffic(connections[0])
+    vm = connections[1].userObject.userChain.chain[0]
+    net.migrate_vm(vm, vm.host, next(host for host in hostObjects if host is not vm.host))
+    net.fail_link(max(net.networkLinks, key=lambda x: len(net.linkConnections.get(x.uid, ()))))
+
+    report = monitor.evaluate()
+    assert set(report.connections) == set(net.trafficActivityList)
+    for connection, rtt in zip(report.connections, report.rtt):
+        assert rtt == net.service_ping(connection)
+
+
+def test_split_connection_rtt_is_its_slowest_path():
+    net = Network("diamond")
+    h = [net.add_host("h" + str(i), 8, 8, 8) for i in range(4)]
+    net.add_link(h[0], h[1], bandwidth=10, delay=1)
+    net.add_link(h[1], h[3], bandwidth=10, delay=1)
+    net.add_link(h[0], h[2], bandwidth=10, delay=1)
+    net.add_link(h[2], h[3], bandwidth=10, delay=5)
+    service = net.add_service("svc", 1, 1, 1)
+    chain = net.add_chain("chain", [net.instantiate_vm(service, h[0]), net.instantiate_vm(service, h[3])], sla=5)
+    user = net.add_user("user", chain, data_rate=15)
+    net.add_link(user, h[0], bandwidth=100, delay=1)
+    monitor = SLAMonitor(net)
+
+    connection = net.start_traffic_multipath(user, k=2)
+    report = monitor.evaluate()
+    assert net.service_ping(connection) == 3  # the largest flow, over h1
+    assert list(report.rtt) == [7]
+    assert list(report.violators) == [connection]
+
+    net.stop_traffic(connection)
+    assert len(monitor.evaluate().connections) == 0
+    user = net.add_user("user", chain, data_rate=1)
+    net.add_link(user, h[0], bandwidth=100, delay=1)
+    net.start_traffic(user)
+    assert list(monitor.evaluate().rtt) == [3]
@@ -0,0 +1,57 @@
+import random
+
+import numpy as np
+import pytest
+
+from vnfnet import RunningStatistics, NETWORK_STATISTICS
+
+
+def test_running_statistics_match_numpy_under_add_and_remove():
+    rng = random.Random(3)
+    statistics = RunningStatistics()
+    values = []
+    for _ in range(2000):
+        if values and rng.random() < 0.45:
+            value = values.pop(rng.randrange(len(values)))
+            statistics.remove(value)
+        else:
+            value = rng.choice([rng.randint(0, 20), rng.uniform(-5, 5)])
+            values.append(value)
+            statistics.add(value)
+
+        assert statistics.count == len(values)
+        if values:
+            assert statistics.minimum == min(values)
+            assert statistics.maximum == max(values)
+            assert statistics.mean == pytest.approx(np.mean(values), abs=1e-9)
+            assert statistics.variance == pytest.approx(np.var(values), abs=1e-7)
+
+
+def test_remove_unknown_value_raises():
+    statistics = RunningStatistics()
+    statistics.add(1)
+    with pytest.raises(ValueError):
+        statistics.remove(2)
+
+
+def test_empty_statistics():
+    statistics = RunningStatistics()
+    statistics.add(4)
+    statistics.remove(4)
+    assert statistics.minimum is None and statistics.maximum is None
+    assert statistics.mean == 0 and statistics.variance == 0
+
+
+def test_network_statistics_follow_entities(network):
+    net, users, _, hostObjects, _ = network
+    vector = net.normalization_vector()
+    latencies = [link.latency for link in net.networkLinks]
+    row = 4 * NETWORK_STATISTICS.index("link_latency")
+    assert tuple(vector[row:row + 4]) == pytest.approx((min(latencies), max(latencies), np.mean(latencies),
+                                                        np.std(latencies)), rel=1e-6)
+
+    slowest = max(net.networkLinks, key=lambda link: link.latency)
+    net.remove_link(slowest)
+    latencies.remove(slowest.latency)
+    assert net.maxNetLatency == max(latencies)
+    assert net.normalize("link_latency", [min(latencies), max(latencies)]).tolist() == [0, 1]
@@ -3,18 +3,20 @@
 # Dr. Anestis Dalgkitsis ✖️ | VNFnet2020 started 29 March 2020 | Last update of VNFnet2020: 23 Jan 2022
 
 # Python Modules
+import heapq
 import os
+import random
+import time
 import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
 from enum import Enum
 
 import networkx as nx
-import matplotlib.pyplot as plt
+import numpy as np
 import logging
 
-# Apple ARM Fix
-# import matplotlib  
-# matplotlib.use('Qt5Agg')
-# from matplotlib import pyplot as plt
+from simulation.ActionLog import ActionLog, recorded
+from simulation.Metrics import MetricsRegistry, timed
 
 # Suppress Warnings
 warnings.filterwarnings("ignore")
@@ -29,6 +31,18 @@ logging.basicConfig(filename='./logs/VNFnetLog.log', level=logging.INFO, format=
 logger.info(" >>>> New VNFnet Session >>>>")
 
 
+# Bandwidth left on a link by split flows, create_connection refuses to leave zero or less
+MIN_LINK_HEADROOM = 1e-9
+
+# Energy a powered on host draws with no load, as a fraction of its CPU energy at full load. Hosts without
+# running services are suspended and draw nothing
+HOST_IDLE_ENERGY_RATIO = 0.6
+
+# Quantities with running statistics in Network.statistics, in the order of Network.normalization_vector
+NETWORK_STATISTICS = ("host_cpu", "host_ram", "host_storage", "link_bandwidth", "link_latency", "user_data_rate",
+                      "chain_sla")
+
+
 # Simulation Classes
 
 class TrafficPattern(Enum):
@@ -37,6 +51,12 @@ class TrafficPattern(Enum):
     SAW = 3
 
 
+class AdmissionPolicy(Enum):
+    ARRIVAL = 1  # in the order the users were given
+    LARGEST_FIRST = 2  # highest data rate first
+    SLA_PRIORITY = 3  # tightest chain SLA first, chains without SLA last
+
+
 class Service:
     def __init__(self, uid: int, title="Untitled_Service", cpu_cores=1, ram=1, storage=1, bandwidth=0.22) -> None:
         self.name = title
@@ -92,14 +112,25 @@ class Host:
 
         return 0
 
+    def missing_resource(self, service_object: Service) -> str | None:
+        """ name of the first resource the service does not fit in (cpu, ram, storage), None if it fits """
+
+        if self.CPUcap < (self.CPUUtil + service_object.CPU_requirements):
+            return "cpu"
+        if self.RAMcap < (self.RAMUtil + service_object.RAM_requirements):
+            return "ram"
+        if self.StorageCap < (self.StorageUtil + service_object.storage_requirements):
+            return "storage"
+        return None
+
     def kill_service(self, service_object: Service) -> int:
         """ return 0 means killed ok, return 1 means that the service does not run in this host """
 
         for service in range(len(self.runningServices)):
             if service_object.uid == self.runningServices[service].uid:
-                self.CPUUtil -= self.runningServices[service].CPUrequirements
-                self.RAMUtil -= self.runningServices[service].RAMrequirements
-                self.StorageUtil -= self.runningServices[service].StorageRequirements
+                self.CPUUtil -= self.runningServices[service].CPU_requirements
+                self.RAMUtil -= self.runningServices[service].RAM_requirements
+                self.StorageUtil -= self.runningServices[service].storage_requirements
 
                 del self.runningServices[service]
 
@@ -112,6 +143,15 @@ class Host:
                     self.cpuFrequency ** 2)
         return server_consumption
 
+    def sample_total_energy_consumption(self) -> float:
+        """ idle plus load energy of the host, zero while it runs no services (suspended) """
+
+        if not self.runningServices:
+            return 0
+        idle_consumption = HOST_IDLE_ENERGY_RATIO * self.CPUcap * self.architectureEffectiveSwitchedCapacitance * \
+            self.cpuCyclesPerSampleData * self.bitsOverhead * (self.cpuFrequency ** 2)
+        return idle_consumption + self.sample_energy_consumption()
+
 
 class VM:
     def __init__(self, uid: int, name: str, service_image, host_object: Host) -> None:
@@ -199,6 +239,141 @@ class Link:
         return link_consumption
 
 
+class LinkDelayModel:
+    """ load dependent delay of every link in numpy arrays: the propagation latency plus the M/M/1 queueing delay
+    service_time * rho / (1 - rho), with rho the used share of the link capacity (at most max_utilization) and
+    service_time the transmission time of one packet at the link capacity """
+
+    def __init__(self, packet_size=1500, max_utilization=0.99, tolerance=1e-6) -> None:
+        self.packetSize = packet_size  # bytes
+        self.maxUtilization = max_utilization
+        self.tolerance = tolerance  # ms, smaller delay changes are not written to the graph
+
+        self.rows = {}  # link uid -> row, a removed link's row is taken by the last link
+        self.links = []  # row -> Link
+        self.capacity = np.zeros(64)  # Gbps
+        self.residual = np.zeros(64)  # Gbps, as bandwidthUtil
+        self.latency = np.zeros(64)  # ms, propagation
+        self.delay = np.zeros(64)  # ms, as last written to the graph edge
+
+    def add(self, link_object: Link, delay: float) -> None:
+        row = len(self.links)
+        if row == len(self.capacity):
+            for name in ("capacity", "residual", "latency", "delay"):
+                setattr(self, name, np.concatenate((getattr(self, name), np.zeros(row))))
+        self.rows[link_object.uid] = row
+        self.links.append(link_object)
+        self.capacity[row] = link_object.bandwidthCap
+        self.residual[row] = link_object.bandwidthUtil
+        self.latency[row] = link_object.latency
+        self.delay[row] = delay
+
+    def remove(self, link_object: Link) -> None:
+        row = self.rows.pop(link_object.uid)
+        last = len(self.links) - 1
+        if row != last:
+            lastLink = self.links[last]
+            self.links[row] = lastLink
+            self.rows[lastLink.uid] = row
+            for values in (self.capacity, self.residual, self.latency, self.delay):
+                values[row] = values[last]
+        self.links.pop()
+
+    def set_residual(self, link_uid: int, bandwidth: float) -> None:
+        self.residual[self.rows[link_uid]] = bandwidth
+
+    def compute(self) -> np.ndarray:
+        """ delay of every link under its current load, ms """
+
+        count = len(self.links)
+        capacity = self.capacity[:count]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rho = np.clip(1 - self.residual[:count] / capacity, 0, self.maxUtilization)
+            serviceTime = self.packetSize * 8 / (capacity * 10 ** 6)  # ms
+        queueing = np.where(capacity > 0, serviceTime * rho / (1 - rho), 0)
+        return self.latency[:count] + queueing
+
+
+class RunningStatistics:
+    """ count, min, max, mean and variance of a multiset of values under add and remove: mean and variance by
+    Welford's update (undone on remove), min and max from lazy heaps over the counted values """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+
+        self.counts = {}  # value -> copies in the multiset
+        self.minHeap = []
+        self.maxHeap = []  # negated values
+        self.minHeapValues = set()  # values in each heap, some may have no copies left (removed lazily)
+        self.maxHeapValues = set()
+
+    def add(self, value: float) -> None:
+        value = float(value)
+        self.counts[value] = self.counts.get(value, 0) + 1
+        if value not in self.minHeapValues:
+            self.minHeapValues.add(value)
+            heapq.heappush(self.minHeap, value)
+        if value not in self.maxHeapValues:
+            self.maxHeapValues.add(value)
+            heapq.heappush(self.maxHeap, -value)
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def remove(self, value: float) -> None:
+        value = float(value)
+        copies = self.counts.get(value, 0)
+        if copies == 0:
+            raise ValueError(str(value) + " is not in the statistics")
+        if copies == 1:
+            del self.counts[value]
+            # heaps full of removed values are rebuilt from the remaining ones
+            if max(len(self.minHeapValues), len(self.maxHeapValues)) > 2 * len(self.counts) + 64:
+                self.minHeapValues = set(self.counts)
+                self.maxHeapValues = set(self.counts)
+                self.minHeap = list(self.counts)
+                self.maxHeap = [-v for v in self.counts]
+                heapq.heapify(self.minHeap)
+                heapq.heapify(self.maxHeap)
+        else:
+            self.counts[value] = copies - 1
+
+        self.count -= 1
+        if self.count == 0:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(self.m2 - delta * (value - self.mean), 0.0)
+
+    @property
+    def minimum(self) -> float | None:
+        while self.minHeap and self.minHeap[0] not in self.counts:
+            self.minHeapValues.discard(heapq.heappop(self.minHeap))
+        return self.minHeap[0] if self.minHeap else None
+
+    @property
+    def maximum(self) -> float | None:
+        while self.maxHeap and -self.maxHeap[0] not in self.counts:
+            self.maxHeapValues.discard(-heapq.heappop(self.maxHeap))
+        return -self.maxHeap[0] if self.maxHeap else None
+
+    @property
+    def variance(self) -> float:
+        """ population variance """
+
+        return self.m2 / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return self.variance ** 0.5
+
+
 class Domain:
     def __init__(self, uid: int, name: str, host_list: list[Host], link_list: list[Link]) -> None:
         self.uid = uid
@@ -206,6 +381,25 @@ class Domain:
         self.hostList = host_list
         self.linkList = link_list
 
+        # Routing Variables (maintained by the Network for hierarchical path computation)
+        self.routingNodes = set()  # hosts of the domain plus users attached only to them
+        self.borderNodes = set()  # routing nodes with a link towards another domain
+        self.routeCache = {}  # source uid -> (distances, paths) inside the domain
+        self.metrics = None  # registry of the Network the domain belongs to
+
+    def invalidate_routes(self) -> None:
+        self.routeCache = {}
+
+    def routes_from(self, graph: nx.Graph, source: int) -> tuple[dict, dict]:
+        """ delay-weighted shortest paths from source that stay inside the domain, cached until invalidated """
+
+        if source not in self.routeCache:
+            if self.metrics is not None:
+                self.metrics.increment("dijkstra_calls_total", scope="domain")
+            self.routeCache[source] = nx.single_source_dijkstra(graph.subgraph(self.routingNodes), source,
+                                                                weight='delay')
+        return self.routeCache[source]
+
 
 class User:
     def __init__(self, uid: int, name: str, vm_chain: Chain, data_rate: float, traffic_pattern: TrafficPattern) -> None:
@@ -240,10 +434,63 @@ class User:
 
 
 class Connection:
-    def __init__(self, uid: int, node_path, user_object: User) -> None:
+    def __init__(self, uid: int, node_path, user_object: User, segment_flows=None) -> None:
         self.uid = uid
-        self.nodePath = node_path
+        self.nodePath = node_path  # of a split connection: the path carrying the largest share per segment
         self.userObject = user_object
+        self.segmentFlows = segment_flows  # split connections only: per chain segment a list of (path, bandwidth)
+        self.active = True  # False once stopped or dropped after a failure
+        self.linkCounts = {}  # link uid -> flows of the connection crossing it, kept by the link index
+
+
+class MigrationReport:
+    def __init__(self, vm_uid: int, source_uid: int, destination_uid: int, rerouted_connections: int) -> None:
+        self.vmUid = vm_uid
+        self.sourceUid = source_uid
+        self.destinationUid = destination_uid
+        self.reroutedConnections = rerouted_connections
+
+        self.movedBytes = 0  # VM memory copied to the destination host
+        self.transferTime = 0  # s, pre-copy over the source-destination path
+        self.downtime = 0  # ms, switchover of the VM to the destination host
+
+    def __str__(self) -> str:
+        return "rerouted: " + str(self.reroutedConnections) + ", moved: " + str(self.movedBytes) + \
+            " bytes, transfer: " + str(self.transferTime) + "s, downtime: " + str(self.downtime) + "ms"
+
+
+class FailureReport:
+    def __init__(self, element: str, uid: int) -> None:
+        self.element = element  # "link" or "host"
+        self.uid = uid
+        self.affectedConnections = 0
+        self.reroutedConnections = 0
+        self.droppedConnections = []  # Connection objects that could not be rerouted
+        self.relocatedVMs = 0
+        self.lostVMs = []  # VMs left on a failed host, no other host could hold them
+        self.recoveryTime = 0  # s
+
+    def __str__(self) -> str:
+        return self.element + " " + str(self.uid) + " failed, affected: " + str(self.affectedConnections) + \
+            ", rerouted: " + str(self.reroutedConnections) + ", dropped: " + str(len(self.droppedConnections)) + \
+            ", relocated VMs: " + str(self.relocatedVMs) + ", recovery: " + str(self.recoveryTime) + "s"
+
+
+class ConsolidationReport:
+    def __init__(self) -> None:
+        self.plannedMigrations = 0
+        self.appliedMigrations = 0
+        self.failedMigrations = 0
+        self.hostsFreed = 0
+        self.energyBefore = 0
+        self.energyAfter = 0
+        self.energySaved = 0
+        self.elapsed = 0  # s
+        self.migrationReports = []
+
+    def __str__(self) -> str:
+        return "migrations: " + str(self.appliedMigrations) + "/" + str(self.plannedMigrations) + ", hosts freed: " + \
+            str(self.hostsFreed) + ", energy saved: " + str(self.energySaved) + ", elapsed: " + str(self.elapsed) + "s"
 
 
 class Network:
@@ -262,19 +509,53 @@ class Network:
         self.networkChains = []
         self.networkDomains = []
 
-        # Statistics (Used for ML regularization)
-        self.maxNetCPU = -1
-        self.maxNetRAM = -1
-        self.maxNetStorage = -1
-        self.maxNetLatency = -1
-        self.maxNetBandwidth = -1
-        self.maxNetSLA = -1
+        # Statistics (Used for ML regularization), kept up to date as entities are added and removed
+        self.statistics = {name: RunningStatistics() for name in NETWORK_STATISTICS}
+        self.statisticValues = {}  # (statistic, entity uid) -> value added, removed again with the entity
+
+        # Topology Rendering
+        self.layoutCache = {"full": {}, "hosts": {}}  # view -> node uid -> (x, y)
+        self.renderExecutor = None
+        self.renderFuture = None
+
+        # Instrumentation (counters and API latency histograms)
+        self.metrics = MetricsRegistry()
+
+        # Congestion-aware Link Delays (off until enable_congestion_delay)
+        self.linkDelayModel = None
+
+        # Action Log (see record_actions)
+        self.actionLog = None
+        self.currentTime = 0  # advanced by tick
+
+        # State Listeners (e.g. observation encoders), told which hosts, links, VMs and connections changed
+        self.stateListeners = []
 
         # Internal Variables
         self.guidCounter = -1  # Graph Unique Identifier Counter
 
+        self.linksByUid = {}
+
         self.suspendedLinks = []
         self.trafficActivityList = []
+        self.vmConnections = {}  # vm uid -> set of active connections through the VM
+        self.linkConnections = {}  # link uid -> set of active connections crossing the link
+        self.hostVMs = {}  # host uid -> set of VMs placed on the host
+
+        # Failures
+        self.failedLinks = {}  # link uid -> [source uid, destination uid, edge attributes] of links that are down
+        self.failedHosts = {}  # host uid -> uids of the links that went down with the host
+
+        # Host-to-host Latency Matrix (physical host links only, built on the first query)
+        self.hostIndex = {}  # host uid -> row/column of the matrices
+        self.delayMatrix = None  # ms, inf when unreachable
+        self.hopMatrix = None  # hops of the minimum delay path, -1 when unreachable
+
+        # Hierarchical Routing
+        self.nodeDomain = {}  # routing node uid -> Domain
+        self.interDomainGraph = None  # border nodes only, rebuilt lazily after membership changes
+        self.staleDomains = set()  # domains whose border nodes in interDomainGraph are rebuilt lazily
+        self.domainMembershipStale = False
 
     # Internal Utilities
 
@@ -282,50 +563,541 @@ class Network:
         self.guidCounter += 1
         return self.guidCounter
 
+    def __getstate__(self) -> dict:
+        # keyframes of the action log pickle the network without the render thread, listeners and the log itself
+        state = self.__dict__.copy()
+        state["renderExecutor"] = None
+        state["renderFuture"] = None
+        state["stateListeners"] = []
+        state["actionLog"] = None
+        return state
+
+    # Normalization Statistics
+
+    def _track_statistic(self, name: str, entity_uid: int, value) -> None:
+        if value is None:  # e.g. chains without an SLA
+            return
+        self.statistics[name].add(value)
+        self.statisticValues[(name, entity_uid)] = value
+
+    def _untrack_statistic(self, name: str, entity_uid: int) -> None:
+        value = self.statisticValues.pop((name, entity_uid), None)
+        if value is not None:
+            self.statistics[name].remove(value)
+
+    def _statistic_maximum(self, name: str) -> float:
+        maximum = self.statistics[name].maximum
+        return -1 if maximum is None else maximum
+
+    maxNetCPU = property(lambda self: self._statistic_maximum("host_cpu"))
+    maxNetRAM = property(lambda self: self._statistic_maximum("host_ram"))
+    maxNetStorage = property(lambda self: self._statistic_maximum("host_storage"))
+    maxNetLatency = property(lambda self: self._statistic_maximum("link_latency"))
+    maxNetBandwidth = property(lambda self: self._statistic_maximum("link_bandwidth"))
+    maxNetSLA = property(lambda self: self._statistic_maximum("chain_sla"))
+
+    def normalization_vector(self) -> np.ndarray:
+        """ minimum, maximum, mean and standard deviation of every NETWORK_STATISTICS quantity (zeros while there is
+        no value), read from the running statistics without scanning the entities """
+
+        vector = np.zeros(4 * len(NETWORK_STATISTICS), dtype=np.float32)
+        for n, name in enumerate(NETWORK_STATISTICS):
+            statistic = self.statistics[name]
+            if statistic.count:
+                vector[4 * n:4 * n + 4] = (statistic.minimum, statistic.maximum, statistic.mean, statistic.std)
+        return vector
+
+    def normalize(self, name: str, values, method="minmax") -> np.ndarray:
+        """ scale values of a NETWORK_STATISTICS quantity by its running statistics: "minmax" to [0, 1] over the
+        current range, "zscore" to zero mean and unit standard deviation """
+
+        statistic = self.statistics[name]
+        values = np.asarray(values, dtype=float)
+        if not statistic.count:
+            return np.zeros_like(values)
+        if method == "minmax":
+            offset, scale = statistic.minimum, statistic.maximum - statistic.minimum
+        elif method == "zscore":
+            offset, scale = statistic.mean, statistic.std
+        else:
+            raise ValueError("unknown normalization " + str(method))
+        return (values - offset) / scale if scale > 0 else np.zeros_like(values)
+
+    # Action Log
+
+    def record_actions(self, path: str, keyframe_interval=100) -> ActionLog:
+        """ write the recorded calls (see simulation.ActionLog) and ticks to a binary log from now on, with the
+        network itself as the first keyframe and again every keyframe_interval ticks """
+
+        self.stop_recording()
+        self.actionLog = ActionLog(path, self, "tick", keyframe_interval)
+        return self.actionLog
+
+    def stop_recording(self) -> None:
+        if self.actionLog is not None:
+            self.actionLog.close()
+            self.actionLog = None
+
+    def replay_entities(self) -> list:
+        return (self.networkHosts + self.networkUsers + self.networkLinks + self.networkServices + self.networkVMs +
+                self.networkChains + self.networkDomains + self.trafficActivityList)
+
+    @staticmethod
+    def replay_entity_types() -> tuple:
+        return Host, User, Link, Service, VM, Chain, Domain, Connection
+
+    @recorded
+    def seed(self, value: int) -> None:
+        """ seed the random and numpy random generators used by the simulation scripts """
+
+        random.seed(value)
+        np.random.seed(value)
+
+    def tick(self, time_elapsed=1.0) -> None:
+        """ end of a simulation tick: recompute the congestion-aware link delays and mark the tick in the action log """
+
+        self.currentTime += time_elapsed
+        self.update_link_delays()
+        if self.actionLog is not None:
+            self.actionLog.write_tick(self, time_elapsed)
+
+    def _topology_changed(self, source_uid: int, destination_uid: int) -> None:
+        """ invalidate the cached routing state touched by adding or removing the edge (source)-(destination) """
+
+        if source_uid not in self.nodeDomain or destination_uid not in self.nodeDomain:
+            self.domainMembershipStale = True
+        elif self.nodeDomain[source_uid] is not self.nodeDomain[destination_uid]:
+            # an edge between domains may turn its ends into border nodes
+            if source_uid not in self.nodeDomain[source_uid].borderNodes or \
+                    destination_uid not in self.nodeDomain[destination_uid].borderNodes:
+                self.domainMembershipStale = True
+        for node in (source_uid, destination_uid):
+            self._node_routes_changed(node)
+
+    def _node_routes_changed(self, node_uid: int) -> None:
+        """ drop the cached routes of the domain of the node and its part of the inter-domain graph """
+
+        domain = self.nodeDomain.get(node_uid)
+        if domain is not None:
+            domain.invalidate_routes()
+            self.staleDomains.add(domain)
+
+    def _host_changed(self, host_uid: int) -> None:
+        for listener in self.stateListeners:
+            listener.host_changed(host_uid)
+
+    def _link_changed(self, link_uid: int) -> None:
+        for listener in self.stateListeners:
+            listener.link_changed(link_uid)
+
+    def _vm_changed(self, vm_object: VM, host_uid: int, placed: bool) -> None:
+        """ a VM was placed on (placed) or removed from the host """
+
+        for listener in self.stateListeners:
+            listener.vm_changed(vm_object, host_uid, placed)
+
+    def _connection_changed(self, connection_object: Connection) -> None:
+        """ a connection was admitted, stopped, dropped or got a new path """
+
+        for listener in self.stateListeners:
+            listener.connection_changed(connection_object)
+
+    def _entities_changed(self) -> None:
+        """ hosts or links were added or removed, or links failed or were repaired """
+
+        for listener in self.stateListeners:
+            listener.topology_changed()
+
+    # Hierarchical Routing
+
+    def _update_domain_membership(self) -> None:
+
+        nodeDomain = {}
+        for domain in self.networkDomains:
+            for host in domain.hostList:
+                nodeDomain[host.uid] = domain
+
+        # Users attached only to hosts of a single domain are routed inside that domain
+        for user in self.networkUsers:
+            if user.uid not in self.topologyGraph:
+                continue
+            neighbourDomains = set(nodeDomain.get(n) for n in self.topologyGraph.neighbors(user.uid))
+            if len(neighbourDomains) == 1 and None not in neighbourDomains:
+                nodeDomain[user.uid] = neighbourDomains.pop()
+
+        routingNodes = {domain.uid: set() for domain in self.networkDomains}
+        for node, domain in nodeDomain.items():
+            routingNodes[domain.uid].add(node)
+
+        for domain in self.networkDomains:
+            borderNodes = set()
+            for node in routingNodes[domain.uid]:
+                for neighbour in self.topologyGraph.neighbors(node):
+                    neighbourDomain = nodeDomain.get(neighbour)
+                    if neighbourDomain is not None and neighbourDomain is not domain:
+                        borderNodes.add(node)
+                        break
+            if routingNodes[domain.uid] != domain.routingNodes or borderNodes != domain.borderNodes:
+                domain.routingNodes = routingNodes[domain.uid]
+                domain.borderNodes = borderNodes
+                domain.invalidate_routes()
+
+        self.nodeDomain = nodeDomain
+        self.interDomainGraph = None
+        self.domainMembershipStale = False
+
+    def _build_inter_domain_graph(self) -> None:
+        """ abstract graph of border nodes: intra-domain shortest distances plus the inter-domain links. Only the
+        border nodes of the stale domains are rebuilt once the graph exists """
+
+        if self.interDomainGraph is None:
+            graph = self.interDomainGraph = nx.Graph()
+            domains = self.networkDomains
+        else:
+            graph = self.interDomainGraph
+            domains = self.staleDomains
+            for domain in domains:
+                # drops the inter-domain links too, re-added from this side below
+                graph.remove_nodes_from(domain.borderNodes)
+        for domain in domains:
+            for border in domain.borderNodes:
+                graph.add_node(border)
+                distances = domain.routes_from(self.topologyGraph, border)[0]
+                for other in domain.borderNodes:
+                    if other != border and other in distances:
+                        graph.add_edge(border, other, delay=distances[other], domain=domain.uid)
+                for neighbour in self.topologyGraph.neighbors(border):
+                    neighbourDomain = self.nodeDomain.get(neighbour)
+                    if neighbourDomain is not None and neighbourDomain is not domain:
+                        graph.add_edge(border, neighbour, delay=self.topologyGraph[border][neighbour]["delay"],
+                                       domain=None)
+        self.staleDomains = set()
+
+    def _hierarchical_path(self, source_uid: int, target_uid: int) -> tuple[float, list[int]] | None:
+
+        sourceDomain = self.nodeDomain[source_uid]
+        targetDomain = self.nodeDomain[target_uid]
+
+        if source_uid == target_uid:
+            return 0, [source_uid]
+
+        # Distances between the endpoints and the border nodes of their domains (graph is undirected, so the
+        # cached border routes also give the distance from the source to each border)
+        sourceBorders = {}
+        for border in sourceDomain.borderNodes:
+            distances = sourceDomain.routes_from(self.topologyGraph, border)[0]
+            if source_uid in distances:
+                sourceBorders[border] = distances[source_uid]
+        targetBorders = {}
+        for border in targetDomain.borderNodes:
+            distances = targetDomain.routes_from(self.topologyGraph, border)[0]
+            if target_uid in distances:
+                targetBorders[border] = distances[target_uid]
+
+        direct = None
+        if sourceDomain is targetDomain:
+            distances, paths = sourceDomain.routes_from(self.topologyGraph, source_uid)
+            if target_uid in distances:
+                direct = distances[target_uid], paths[target_uid]
+                # a detour through other domains leaves and re-enters the domain at border nodes
+                if len(sourceBorders) < 2 or len(targetBorders) < 2 or \
+                        direct[0] <= min(sourceBorders.values()) + min(targetBorders.values()):
+                    return direct
+
+        if self.interDomainGraph is None or self.staleDomains:
+            self._build_inter_domain_graph()
+
+        # Attach both endpoints to the border nodes of their domains, and to each other over the direct path
+        sourceKey = ("source", source_uid)
+        targetKey = ("target", target_uid)
+        graph = self.interDomainGraph
+        for border, delay in sourceBorders.items():
+            graph.add_edge(sourceKey, border, delay=delay)
+        for border, delay in targetBorders.items():
+            graph.add_edge(border, targetKey, delay=delay)
+        if direct is not None:
+            graph.add_edge(sourceKey, targetKey, delay=direct[0])
+
+        try:
+            self.metrics.increment("dijkstra_calls_total", scope="inter_domain")
+            delay, abstractPath = nx.single_source_dijkstra(graph, sourceKey, targetKey, weight='delay')
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return None
+        finally:
+            graph.remove_nodes_from([sourceKey, targetKey])
+        if len(abstractPath) == 2:
+            return direct
+
+        # Expand the abstract path with the cached intra-domain pieces
+        nodePath = [source_uid]
+        for u, v in zip(abstractPath[:-1], abstractPath[1:]):
+            if u == sourceKey:
+                piece = sourceDomain.routes_from(self.topologyGraph, v)[1][source_uid][::-1]
+            elif v == targetKey:
+                piece = targetDomain.routes_from(self.topologyGraph, u)[1][target_uid]
+            elif graph[u][v]["domain"] is None:
+                piece = [u, v]
+            else:
+                piece = self.nodeDomain[u].routes_from(self.topologyGraph, u)[1][v]
+            nodePath.extend(piece[1:])
+
+        return delay, nodePath
+
+    def shortest_path(self, source_uid: int, target_uid: int) -> tuple[float, list[int]]:
+        """ delay-weighted shortest path, hierarchical when both ends belong to a domain. Raises NetworkXNoPath """
+
+        if self.networkDomains:
+            if self.domainMembershipStale:
+                self._update_domain_membership()
+            if source_uid in self.nodeDomain and target_uid in self.nodeDomain:
+                route = self._hierarchical_path(source_uid, target_uid)
+                if route is not None:
+                    return route
+
+        self.metrics.increment("dijkstra_calls_total", scope="global")
+        return nx.single_source_dijkstra(self.topologyGraph, source_uid, target_uid, weight='delay')
+
+    # Congestion-aware Link Delays
+
+    @recorded
+    def enable_congestion_delay(self, packet_size=1500, max_utilization=0.99, tolerance=1e-6) -> LinkDelayModel:
+        """ make the link delays load dependent (see LinkDelayModel), they are recomputed by update_link_delays """
+
+        model = LinkDelayModel(packet_size, max_utilization, tolerance)
+        for linkObject in self.networkLinks:
+            linkAttributes = self._link_edge_data(linkObject)
+            model.add(linkObject, linkObject.latency if linkAttributes is None else linkAttributes["delay"])
+        self.linkDelayModel = model
+        self.update_link_delays()
+        return model
+
+    @recorded
+    def disable_congestion_delay(self) -> None:
+        """ back to the static link latencies """
+
+        if self.linkDelayModel is None:
+            return
+        model = self.linkDelayModel
+        self._write_link_delays(model, model.latency[:len(model.links)].copy())
+        self.linkDelayModel = None
+
+    def _link_edge_data(self, link_object: Link) -> dict | None:
+        """ attributes of the graph edge of the link, None while the link is down or suspended """
+
+        linkAttributes = self.topologyGraph.get_edge_data(link_object.source.uid, link_object.destination.uid)
+        if linkAttributes is None or linkAttributes["uid"] != link_object.uid:
+            return None
+        return linkAttributes
+
+    def _write_link_delays(self, model: LinkDelayModel, delays: np.ndarray) -> int:
+
+        changed = np.flatnonzero(np.abs(delays - model.delay[:len(delays)]) > model.tolerance)
+        written = 0
+        for row in changed.tolist():
+            linkObject = model.links[row]
+            linkAttributes = self._link_edge_data(linkObject)
+            if linkAttributes is None:
+                continue
+            linkAttributes["delay"] = model.delay[row] = delays[row]
+            written += 1
+
+            # cached routes over the link are stale
+            for node in (linkObject.source.uid, linkObject.destination.uid):
+                self._node_routes_changed(node)
+        return written
+
+    @timed("update_link_delays_seconds")
+    def update_link_delays(self) -> int:
+        """ recompute the delay of every link from its load and write the changed ones to the graph, where routing
+        and service_ping read them (call once per tick). Returns the number of links whose delay changed """
+
+        if self.linkDelayModel is None:
+            return 0
+        written = self._write_link_delays(self.linkDelayModel, self.linkDelayModel.compute())
+        self.metrics.increment("link_delay_updates_total", written)
+        return written
+
+    # Host-to-host Latency Matrix
+
+    def _physical_host_graph(self) -> nx.Graph:
+        """ graph of the working host-to-host links only, keeping the lowest delay of parallel links """
+
+        graph = nx.Graph()
+        graph.add_nodes_from(self.hostIndex)
+        for link in self.networkLinks:
+            if link.uid in self.failedLinks:
+                continue
+            u, v = link.source.uid, link.destination.uid
+            if u in self.hostIndex and v in self.hostIndex:
+                if not graph.has_edge(u, v) or link.latency < graph[u][v]["delay"]:
+                    graph.add_edge(u, v, delay=link.latency)
+        return graph
+
+    def _set_latency_rows(self, graph: nx.Graph, host_uids) -> None:
+        """ recompute the rows (and, by symmetry, columns) of the given hosts with Dijkstra """
+
+        for uid in host_uids:
+            row = self.hostIndex[uid]
+            self.metrics.increment("dijkstra_calls_total", scope="latency_matrix")
+            distances, paths = nx.single_source_dijkstra(graph, uid, weight='delay')
+            columns = np.fromiter((self.hostIndex[n] for n in distances), dtype=np.intp, count=len(distances))
+            delays = np.fromiter(distances.values(), dtype=float, count=len(distances))
+            hops = np.fromiter((len(paths[n]) - 1 for n in distances), dtype=np.int32, count=len(distances))
+
+            self.delayMatrix[row, :] = np.inf
+            self.hopMatrix[row, :] = -1
+            self.delayMatrix[row, columns] = delays
+            self.hopMatrix[row, columns] = hops
+            self.delayMatrix[:, row] = self.delayMatrix[row, :]
+            self.hopMatrix[:, row] = self.hopMatrix[row, :]
+
+    def _build_latency_matrix(self) -> None:
+
+        size = max(len(self.hostIndex), 1)
+        self.delayMatrix = np.full((size, size), np.inf)
+        self.hopMatrix = np.full((size, size), -1, dtype=np.int32)
+        self._set_latency_rows(self._physical_host_graph(), self.hostIndex)
+        logger.info("Latency matrix built for " + str(len(self.hostIndex)) + " hosts.")
+
+    def _grow_latency_matrix(self) -> None:
+        """ make room for a newly added (still isolated) host, doubling the capacity when full """
+
+        capacity = self.delayMatrix.shape[0]
+        index = len(self.hostIndex) - 1
+        if index >= capacity:
+            delayMatrix = np.full((2 * capacity, 2 * capacity), np.inf)
+            hopMatrix = np.full((2 * capacity, 2 * capacity), -1, dtype=np.int32)
+            delayMatrix[:capacity, :capacity] = self.delayMatrix
+            hopMatrix[:capacity, :capacity] = self.hopMatrix
+            self.delayMatrix = delayMatrix
+            self.hopMatrix = hopMatrix
+        self.delayMatrix[index, index] = 0
+        self.hopMatrix[index, index] = 0
+
+    def _latency_link_added(self, link_object: Link) -> None:
+
+        if self.delayMatrix is None:
+            return
+        if link_object.source.uid not in self.hostIndex or link_object.destination.uid not in self.hostIndex:
+            return
+
+        size = len(self.hostIndex)
+        delay = self.delayMatrix[:size, :size]
+        hops = self.hopMatrix[:size, :size]
+        a = self.hostIndex[link_object.source.uid]
+        b = self.hostIndex[link_object.destination.uid]
+
+        # A new shortest path crosses the new link once, in either direction
+        for u, v in ((a, b), (b, a)):
+            candidate = delay[:, u, None] + link_object.latency + delay[None, v, :]
+            improved = candidate < delay
+            if improved.any():
+                delay[improved] = candidate[improved]
+                hops[improved] = (hops[:, u, None] + 1 + hops[None, v, :])[improved]
+
+    def _latency_link_removed(self, link_object: Link) -> None:
+
+        if self.delayMatrix is None:
+            return
+        if link_object.source.uid not in self.hostIndex or link_object.destination.uid not in self.hostIndex:
+            return
+
+        size = len(self.hostIndex)
+        delay = self.delayMatrix[:size, :size]
+        a = self.hostIndex[link_object.source.uid]
+        b = self.hostIndex[link_object.destination.uid]
+
+        # Only pairs whose shortest path may have crossed the removed link need recomputing
+        affected = np.zeros(size, dtype=bool)
+        for u, v in ((a, b), (b, a)):
+            throughLink = delay[:, u, None] + link_object.latency + delay[None, v, :]
+            finite = np.isfinite(throughLink) & np.isfinite(delay)
+            affected |= (finite & np.isclose(throughLink, delay)).any(axis=1)
+        if not affected.any():
+            return
+
+        hostUids = np.array(list(self.hostIndex), dtype=np.int64)
+        self._set_latency_rows(self._physical_host_graph(), hostUids[affected].tolist())
+
+    def latency_matrix(self) -> tuple[np.ndarray, np.ndarray]:
+        """ all-pairs host-to-host (delay, hop count) matrices, indexed through hostIndex """
+
+        if self.delayMatrix is None:
+            self._build_latency_matrix()
+        size = len(self.hostIndex)
+        return self.delayMatrix[:size, :size], self.hopMatrix[:size, :size]
+
+    def host_delay(self, source_host_object: Host, destination_host_object: Host) -> float:
+        delayMatrix = self.latency_matrix()[0]
+        return float(delayMatrix[self.hostIndex[source_host_object.uid], self.hostIndex[destination_host_object.uid]])
+
+    def host_hops(self, source_host_object: Host, destination_host_object: Host) -> int:
+        hopMatrix = self.latency_matrix()[1]
+        return int(hopMatrix[self.hostIndex[source_host_object.uid], self.hostIndex[destination_host_object.uid]])
+
+    def estimate_chain_latency(self, chain_object: Chain) -> float:
+        """ host-to-host delay along the chain VMs without allocating anything, inf if a hop is unreachable """
+
+        delayMatrix = self.latency_matrix()[0]
+        rows = np.fromiter((self.hostIndex[vm.host.uid] for vm in chain_object.chain), dtype=np.intp,
+                           count=len(chain_object.chain))
+        return float(delayMatrix[rows[:-1], rows[1:]].sum())
+
     # Network Building Commands
 
+    @recorded
     def add_host(self, hostname: str, cpu_cores: int, ram: int, storage: int) -> Host:
 
         uid = self.get_guid()
         hostObject = Host(uid, hostname, cpu_cores, ram, storage)
         self.networkHosts.append(hostObject)
+        self.hostIndex[uid] = len(self.hostIndex)
+        if self.delayMatrix is not None:
+            self._grow_latency_matrix()
 
         self.topologyGraph.add_node(uid, label=hostname, shapes="o")
         logger.info("Host added with uid: " + str(uid) + ", hostname: " + str(hostname) + ".")
 
-        if cpu_cores > self.maxNetCPU:
-            self.maxNetCPU = cpu_cores
-        if ram > self.maxNetRAM:
-            self.maxNetRAM = ram
-        if storage > self.maxNetStorage:
-            self.maxNetStorage = storage
+        self._track_statistic("host_cpu", uid, cpu_cores)
+        self._track_statistic("host_ram", uid, ram)
+        self._track_statistic("host_storage", uid, storage)
+
+        self._entities_changed()
 
         return hostObject
 
+    @recorded
     def add_user(self, name: str, vm_chain, data_rate=1, traffic_pattern=TrafficPattern.RESERVED) -> User:  # , sla=10
 
         uid = self.get_guid()
         userObject = User(uid, name, vm_chain, data_rate, traffic_pattern)  # , sla
         self.networkUsers.append(userObject)
+        self._track_statistic("user_data_rate", uid, data_rate)
 
         self.topologyGraph.add_node(uid, uid=uid, label=name, shapes="v")
         logger.info("User with uid: " + str(uid) + " added.")
 
         return userObject
 
+    @recorded
     def remove_user(self, user_object: User) -> bool:
 
+        if user_object.uid in self.nodeDomain:
+            self.domainMembershipStale = True
         self.topologyGraph.remove_node(user_object.uid)
         self.networkUsers.remove(user_object)
+        self._untrack_statistic("user_data_rate", user_object.uid)
         del user_object
 
         return True
 
+    @recorded
     def add_link(self, source_host_object: Host, destination_host_object: Host, bandwidth=10, delay=5, loss=0) -> Link:
 
         uid = self.get_guid()
         linkObject = Link(uid, source_host_object, destination_host_object, bandwidth=bandwidth, latency=delay)
         self.networkLinks.append(linkObject)
+        self.linksByUid[uid] = linkObject
 
         if loss > 0:
             self.topologyGraph.add_edge(source_host_object.uid, destination_host_object.uid, uid=uid, color='m',
@@ -340,21 +1112,42 @@ class Network:
             destination_host_object.uid) + ")" + " with bandwidth: " + str(bandwidth) + " added with uid: " + str(
             uid) + ".")
 
-        if delay > self.maxNetLatency:
-            self.maxNetLatency = delay
-        if bandwidth > self.maxNetBandwidth:
-            self.maxNetBandwidth = bandwidth
+        self._topology_changed(source_host_object.uid, destination_host_object.uid)
+        self._latency_link_added(linkObject)
+        if self.linkDelayModel is not None:
+            self.linkDelayModel.add(linkObject, delay)
+
+        self._track_statistic("link_bandwidth", uid, bandwidth)
+        self._track_statistic("link_latency", uid, delay)
+
+        self._entities_changed()
 
         return linkObject
 
+    @recorded
     def remove_link(self, link_object: Link) -> bool:
 
-        self.topologyGraph.remove_edge(link_object.source, link_object.destination)
+        # Connections crossing the link are rerouted (or dropped) as after a link failure
+        wasWorking = link_object.uid not in self.failedLinks
+        if wasWorking:
+            affected = self._take_links_down([link_object], update_latency=False)
+            self._recover_connections(affected, FailureReport("link", link_object.uid))
+        del self.failedLinks[link_object.uid]
+        self.linkConnections.pop(link_object.uid, None)
         self.networkLinks.remove(link_object)
+        del self.linksByUid[link_object.uid]
+        if wasWorking:
+            self._latency_link_removed(link_object)
+        self._untrack_statistic("link_bandwidth", link_object.uid)
+        self._untrack_statistic("link_latency", link_object.uid)
+        if self.linkDelayModel is not None:
+            self.linkDelayModel.remove(link_object)
+        self._entities_changed()
         del link_object
 
         return True
 
+    @recorded
     def add_service(self, title: str, cpu_cores=2, ram=3, storage=8) -> Service:
 
         uid = self.get_guid()
@@ -365,34 +1158,51 @@ class Network:
 
         return service_object
 
+    @recorded
     def add_chain(self, title: str, service_object_list: list[VM], sla: int) -> Chain:
 
         uid = self.get_guid()
         chainObject = Chain(uid=uid, title=title, chain_list=service_object_list, sla=sla)
         self.networkChains.append(chainObject)
+        self._track_statistic("chain_sla", uid, sla)
         logger.info("Chain added with uid: " + str(uid) + ".")
 
         return chainObject
 
+    @recorded
     def remove_chain(self, chain_object: Chain) -> bool:
 
         self.networkChains.remove(chain_object)
+        self._untrack_statistic("chain_sla", chain_object.uid)
         del chain_object
 
         return True
 
+    @recorded
     def add_domain(self, name: str, host_list: list[Host], link_list: list[Link]) -> Domain:
 
         uid = self.get_guid()
         domainObject = Domain(uid, name, host_list, link_list)
         self.networkDomains.append(domainObject)
+        domainObject.metrics = self.metrics
+        self.domainMembershipStale = True
         logger.info("Domain " + str(name) + " added with uid: " + str(uid) + ".")
 
         return domainObject
 
     # VM Orchestration Operations
 
-    def instantiate_vm(self, service_object: Service, host_object: Host) -> VM:
+    @timed("instantiate_vm_seconds")
+    @recorded
+    def instantiate_vm(self, service_object: Service, host_object: Host) -> VM | None:
+        """ None if the service does not fit in the host, the VM is then not registered """
+
+        cause = host_object.missing_resource(service_object)
+        error = host_object.instantiate_service(service_object)
+        if error:
+            self.metrics.increment("admission_rejects_total", cause=cause)
+            logger.error("Error Instantiating Service VM in Host, check logfile. Err: " + str(error))
+            return None
 
         uid = self.get_guid()
         title2 = service_object.name + str(uid)
@@ -400,10 +1210,9 @@ class Network:
         self.networkVMs.append(VM_object)
         logger.info("Service VM Instantiated with uid: " + str(uid) + ".")
 
-        error = host_object.instantiate_service(service_object)
-
-        if error:
-            logger.error("Error Instantiating Service VM in Host, check logfile. Err: " + str(error))
+        self.hostVMs.setdefault(host_object.uid, set()).add(VM_object)
+        self._host_changed(host_object.uid)
+        self._vm_changed(VM_object, host_object.uid, True)
 
         self.topologyGraph.add_node(uid, uid=uid, label=title2, shapes="^")
         self.topologyGraph.add_edge(uid, host_object.uid, uid=uid, color='g', style="dashed", weight=1, length=12,
@@ -411,88 +1220,605 @@ class Network:
 
         return VM_object
 
+    @recorded
     def terminate_vm(self, vm_object: VM) -> bool:
         hostObject = vm_object.host
         error = hostObject.kill_service(vm_object.service)
         if error:
             logger.error("Error while terminating VM in host. Check the class code.")
             return False
+        self.hostVMs[hostObject.uid].discard(vm_object)
+        self._host_changed(hostObject.uid)
+        self._vm_changed(vm_object, hostObject.uid, False)
 
         self.topologyGraph.remove_node(vm_object.uid)
         self.topologyGraph.remove_edge(vm_object.uid, hostObject.uid)
 
         return True
 
-    def migrate_vm(self, vm: VM, source_host_object: Host, destination_host_object: Host) -> bool:
+    @staticmethod
+    def _connection_segment_flows(connection_object: Connection) -> list[list[tuple[list[int], float]]]:
+        """ per chain segment (user to first VM host, then host to host) the (path, bandwidth) flows it carries """
 
-        connectionsWithThisHost = []
+        if connection_object.segmentFlows is not None:
+            return connection_object.segmentFlows
 
-        # Discover connections to update
+        # Single path: split nodePath where it reaches each chain host in turn
+        nodePath = connection_object.nodePath
+        positions = [0]
+        for chainVM in connection_object.userObject.userChain.chain:
+            positions.append(nodePath.index(chainVM.host.uid, positions[-1]))
+        return [[(nodePath[positions[n]:positions[n + 1] + 1], connection_object.userObject.bandwidth)]
+                for n in range(len(positions) - 1)]
 
-        if source_host_object == destination_host_object:
-            logger.warning("Source and destination hosts are the same.")
-            return True
-        for connection in self.trafficActivityList:
-            if vm.host in connection.nodePath:
-                connectionsWithThisHost.append(connection)
+    @staticmethod
+    def _primary_node_path(segment_flows: list[list[tuple[list[int], float]]]) -> list[int]:
+        """ chain node path through the largest flow of every segment """
+
+        nodePath = []
+        for flows in segment_flows:
+            segment = max(flows, key=lambda flow: flow[1])[0]
+            nodePath.extend(segment[1:] if nodePath else segment)
+        return nodePath
+
+    def _plan_connection_reroute(self, connection_object: Connection, vm: VM, destination_host_object: Host,
+                                 path_cache: dict) -> tuple[list, list, list] | None:
+        """ segment flows of a connection once vm runs on the destination host, with the flows released and
+        reserved (only the chain segments entering or leaving the VM change), or None if a segment has no path.
+        A split connection keeps its split: the same shares over as many shortest paths, None if they do not fit """
+
+        chain = connection_object.userObject.userChain.chain
+        oldFlows = self._connection_segment_flows(connection_object)
+
+        # Waypoints are the user followed by the chain hosts
+        waypoints = [connection_object.userObject.uid]
+        for chainVM in chain:
+            waypoints.append(destination_host_object.uid if chainVM is vm else chainVM.host.uid)
+
+        newFlows = []
+        released = []
+        reserved = []
+        for n in range(len(chain)):
+            if chain[n] is vm or (n > 0 and chain[n - 1] is vm):
+                if connection_object.segmentFlows is not None:
+                    flows = self._split_segment(waypoints[n], waypoints[n + 1], connection_object.userObject.bandwidth,
+                                                {}, len(oldFlows[n]), [share for _, share in oldFlows[n]], False)
+                    if flows is None:
+                        return None
+                else:
+                    segment = self._cached_path(path_cache, waypoints[n], waypoints[n + 1])
+                    if segment is None:
+                        return None
+                    flows = [(segment, connection_object.userObject.bandwidth)]
+                released.extend(oldFlows[n])
+                reserved.extend(flows)
+            else:
+                flows = oldFlows[n]
+            newFlows.append(flows)
 
-        # Stop Traffic in old host (BM)
+        return newFlows, released, reserved
 
-        for connection in connectionsWithThisHost:
-            # self.stopTraffic(connection.userObject)
-            er = self.stop_traffic(connection)
-            if not er:
-                logger.error("Error in vm.stop(): " + str(er))
-                return False
+    def _set_link_bandwidth(self, source_uid: int, destination_uid: int, bandwidth: float) -> None:
+        """ residual bandwidth of the link, kept in both the graph edge and the Link object """
 
-        # Start traffic in new host (AM)
+        linkAttributes = self.topologyGraph[source_uid][destination_uid]
+        linkAttributes['bandwidth'] = bandwidth
+        self.linksByUid[linkAttributes["uid"]].bandwidthUtil = bandwidth
+        if self.linkDelayModel is not None:
+            self.linkDelayModel.set_residual(linkAttributes["uid"], bandwidth)
+        self._link_changed(linkAttributes["uid"])
 
-        for connection in connectionsWithThisHost:
-            error = self.start_traffic(connection)
-            if not error:
-                logger.error("Error migrating, could not start connection in new host.")
-                return False
+    def _adjust_link_bandwidth(self, source_uid: int, destination_uid: int, delta: float) -> None:
+        self._set_link_bandwidth(source_uid, destination_uid,
+                                 self.topologyGraph[source_uid][destination_uid]['bandwidth'] + delta)
 
-        # Terminate VM instance in old host (BM)
+    @timed("migrate_vm_seconds")
+    @recorded
+    def migrate_vm(self, vm: VM, source_host_object: Host, destination_host_object: Host) -> bool | MigrationReport:
+        """ live (make-before-break) migration, only the connections through the VM are rerouted """
 
-        error = source_host_object.kill_service(vm.service)
-        if error:
-            logger.error("Error while terminating VM with uid " + str(vm.uid) + " in host with uid " + str(
-                source_host_object.uid) + ". VM not found in host.")
+        if source_host_object == destination_host_object:
+            logger.warning("Source and destination hosts are the same.")
+            return True
+        if destination_host_object.uid in self.failedHosts:
+            self.metrics.increment("migrations_total", result="rejected", cause="host_down")
+            logger.error("Error migrating, host " + str(destination_host_object.uid) + " is down.")
+            return False
+        if vm.host is not source_host_object:
+            logger.error("VM with uid " + str(vm.uid) + " does not run in host " + str(source_host_object.uid) + ".")
             return False
-        else:
-            logger.info(
-                "VM with uid " + str(vm.uid) + " in host " + str(source_host_object.uid) + " terminated successfully.")
-            self.topologyGraph.remove_edge(vm.uid, source_host_object.uid)
 
-        # Instantiate VM instance in new host (AM)
+        # Reserve resources in new host (BM)
 
-        # self.instantiateVM(vm.service, destinationHostObject)
+        cause = destination_host_object.missing_resource(vm.service)
         error = destination_host_object.instantiate_service(vm.service)
         if error:
-            logger.error("Error Instantiating Service VM in Host, check logfile. Err: " + str(error))
-        else:
-            logger.info("Service VM Instantiated.")
-            self.topologyGraph.add_edge(vm.uid, destination_host_object.uid, uid=vm.uid, color='g', style="dashed",
-                                        weight=1, length=12, delay=99999, bandwidth=0, loss=100)
+            self.metrics.increment("migrations_total", result="rejected", cause=cause)
+            logger.error("Error migrating, VM with uid " + str(vm.uid) + " does not fit in host " + str(
+                destination_host_object.uid) + ".")
+            return False
 
-        # Log Action
+        # Plan new paths of the affected chain segments and check that they fit next to the old ones
+
+        pathCache = {}
+        plans = []
+        reserve = {}
+        release = {}
+        for connection in self.vmConnections.get(vm.uid, ()):
+            plan = self._plan_connection_reroute(connection, vm, destination_host_object, pathCache)
+            if plan is None and connection.segmentFlows is not None:
+                destination_host_object.kill_service(vm.service)
+                self.metrics.increment("migrations_total", result="rejected", cause="bandwidth")
+                logger.error("Error migrating, the split of connection " + str(connection.uid) + " does not fit on the "
+                             "paths through the new host.")
+                return False
+            if plan is None:
+                destination_host_object.kill_service(vm.service)
+                self.metrics.increment("migrations_total", result="rejected", cause="no_path")
+                logger.error("Error migrating, no path for connection " + str(connection.uid) + " in new host.")
+                return False
+            plans.append((connection, plan))
+            for flows, demand in ((plan[1], release), (plan[2], reserve)):
+                for segment, share in flows:
+                    for edge in range(len(segment) - 1):
+                        u, v = segment[edge], segment[edge + 1]
+                        key = (u, v) if u < v else (v, u)
+                        demand[key] = demand.get(key, 0) + share
+
+        for (u, v), amount in reserve.items():
+            if self.topologyGraph[u][v]['bandwidth'] - amount <= 0:
+                destination_host_object.kill_service(vm.service)
+                self.metrics.increment("migrations_total", result="rejected", cause="bandwidth")
+                logger.error("Error migrating, not enough bandwidth on link (" + str(u) + ")-(" + str(
+                    v) + ") to reroute connections through the new host.")
+                return False
 
+        # Make new paths, then break the old ones
+
+        for (u, v), amount in reserve.items():
+            self._adjust_link_bandwidth(u, v, -amount)
+        for (u, v), amount in release.items():
+            self._adjust_link_bandwidth(u, v, amount)
+        for connection, (newFlows, _, _) in plans:
+            connection.nodePath = self._primary_node_path(newFlows)
+            if connection.segmentFlows is not None:
+                connection.segmentFlows = newFlows
+
+        # Terminate VM instance in old host (AM)
+
+        if source_host_object.kill_service(vm.service):
+            logger.error("VM with uid " + str(vm.uid) + " held no resources in host " + str(
+                source_host_object.uid) + ", nothing released there.")
+        self.topologyGraph.remove_edge(vm.uid, source_host_object.uid)
+        self.topologyGraph.add_edge(vm.uid, destination_host_object.uid, uid=vm.uid, color='g', style="dashed",
+                                    weight=1, length=12, delay=99999, bandwidth=0, loss=100)
         vm.host = destination_host_object
+        self.hostVMs[source_host_object.uid].discard(vm)
+        self.hostVMs.setdefault(destination_host_object.uid, set()).add(vm)
+        for connection, (_, released, reserved) in plans:
+            self._move_connection_links(connection, released, reserved)
+        self._host_changed(source_host_object.uid)
+        self._host_changed(destination_host_object.uid)
+        self._vm_changed(vm, source_host_object.uid, False)
+        self._vm_changed(vm, destination_host_object.uid, True)
+
+        # Migration Cost (memory pre-copied at the bottleneck bandwidth, downtime is the switchover delay)
+
+        report = MigrationReport(vm.uid, source_host_object.uid, destination_host_object.uid, len(plans))
+        report.movedBytes = vm.service.RAM_requirements * 10 ** 9
+        try:
+            delay, transferPath = self.shortest_path(source_host_object.uid, destination_host_object.uid)
+            bottleneck = min((self.topologyGraph[transferPath[edge]][transferPath[edge + 1]]['bandwidth']
+                              for edge in range(len(transferPath) - 1)), default=float('inf'))
+            report.downtime = delay
+            report.transferTime = report.movedBytes * 8 / (bottleneck * 10 ** 9) if bottleneck > 0 else float('inf')
+        except nx.NetworkXNoPath:
+            report.downtime = float('inf')
+            report.transferTime = float('inf')
+
+        # Log Action
+
+        self.metrics.increment("migrations_total", result="ok")
+        self.metrics.increment("migrated_bytes_total", report.movedBytes)
         logger.info("Migration successful. Info: " + str(vm.uid) + " (" + str(source_host_object.uid) + ")->-(" + str(
-            destination_host_object.uid) + ").")
+            destination_host_object.uid) + "). " + str(report))
+        return report
+
+    def _host_capacity_state(self) -> tuple[np.ndarray, np.ndarray]:
+        """ (capacity, utilization) arrays of shape (hosts, 3) with CPU, RAM and storage, rows follow hostIndex """
+
+        capacity = np.array([(h.CPUcap, h.RAMcap, h.StorageCap) for h in self.networkHosts], dtype=float)
+        utilization = np.array([(h.CPUUtil, h.RAMUtil, h.StorageUtil) for h in self.networkHosts], dtype=float)
+        return capacity.reshape(-1, 3), utilization.reshape(-1, 3)
+
+    def _access_delay(self, user_object: User, row: int, delay_matrix: np.ndarray) -> float:
+        """ delay from the user over its access links to the host of row """
+
+        return min((attributes["delay"] + delay_matrix[self.hostIndex[hostUid], row]
+                    for hostUid, attributes in self.topologyGraph[user_object.uid].items()
+                    if hostUid in self.hostIndex), default=float('inf'))
+
+    def _placement_meets_slas(self, vm: VM, placement: dict, rtt: dict) -> bool:
+        """ the RTT measured by service_ping, corrected by the delay change of the tentative placement (user to
+        first VM host, then host to host), must stay within the SLA of every chain through the VM """
+
+        delayMatrix = self.latency_matrix()[0]
+        for connection in self.vmConnections.get(vm.uid, ()):
+            chain = connection.userObject.userChain
+            if chain.sla is None:
+                continue
+            oldRows = [self.hostIndex[chainVM.host.uid] for chainVM in chain.chain]
+            newRows = [self.hostIndex[placement.get(chainVM.uid, chainVM.host).uid] for chainVM in chain.chain]
+            estimate = rtt[connection] - delayMatrix[oldRows[:-1], oldRows[1:]].sum() + \
+                delayMatrix[newRows[:-1], newRows[1:]].sum()
+            if newRows[0] != oldRows[0]:
+                estimate += self._access_delay(connection.userObject, newRows[0], delayMatrix) - \
+                    self._access_delay(connection.userObject, oldRows[0], delayMatrix)
+            if estimate > chain.sla:
+                return False
         return True
 
+    @timed("consolidate_seconds")
+    def consolidate(self, time_budget=1.0, respect_sla=True) -> ConsolidationReport:
+        """ pack VMs onto fewer hosts: evacuate the least utilized hosts into the remaining ones (best fit
+        decreasing), planning until the time budget (s) runs out, then apply the plan with live migrations.
+        Not recorded: the plan depends on the wall clock, so the action log gets the applied migrate_vm calls """
+
+        startTime = time.perf_counter()
+        report = ConsolidationReport()
+        report.energyBefore = sum(h.sample_total_energy_consumption() for h in self.networkHosts)
+
+        capacity, utilization = self._host_capacity_state()
+        requirements = {vm.uid: np.array((vm.service.CPU_requirements, vm.service.RAM_requirements,
+                                          vm.service.storage_requirements), dtype=float) for vm in self.networkVMs}
+        hostVMs = {}
+        for vm in self.networkVMs:
+            hostVMs.setdefault(vm.host.uid, []).append(vm)
+
+        rtt = {}
+        if respect_sla:
+            for connection in self.trafficActivityList:
+                rtt[connection] = self.service_ping(connection)
+
+        # Candidate hosts, least CPU utilized first, and the hosts that may receive their VMs
+        active = np.zeros(len(self.networkHosts), dtype=bool)
+        for hostUid in hostVMs:
+            active[self.hostIndex[hostUid]] = hostUid not in self.failedHosts
+        cpuRatio = np.where(capacity[:, 0] > 0, utilization[:, 0] / np.maximum(capacity[:, 0], 1e-12), np.inf)
+        candidates = [row for row in np.argsort(cpuRatio, kind="stable") if active[row]]
+
+        placement = {}  # vm uid -> destination Host
+        plan = []
+        receiving = set()  # hosts that got VMs are kept, so no VM is moved twice
+        for source in candidates:
+            if time.perf_counter() - startTime > time_budget:
+                logger.info("Consolidation time budget exhausted, plan truncated.")
+                break
+
+            sourceHost = self.networkHosts[source]
+            if sourceHost.uid not in hostVMs or source in receiving:
+                continue
+            receivers = active.copy()
+            receivers[source] = False
+
+            tentativeUtilization = utilization.copy()
+            tentativePlacement = {}
+            tentativeReceiving = set()
+            evacuated = True
+            for vm in sorted(hostVMs[sourceHost.uid], key=lambda x: requirements[x.uid][0], reverse=True):
+                residual = capacity - tentativeUtilization
+                feasible = receivers & np.all(residual >= requirements[vm.uid], axis=1)
+                destination = -1
+                # Best fit: the feasible host left with the least CPU slack that keeps the chain SLAs
+                for row in np.flatnonzero(feasible)[np.argsort(residual[feasible, 0], kind="stable")]:
+                    tentativePlacement[vm.uid] = self.networkHosts[row]
+                    if not respect_sla or self._placement_meets_slas(vm, placement | tentativePlacement, rtt):
+                        destination = row
+                        break
+                    del tentativePlacement[vm.uid]
+                if destination < 0:
+                    evacuated = False
+                    break
+                tentativeUtilization[destination] += requirements[vm.uid]
+                tentativeUtilization[source] -= requirements[vm.uid]
+                tentativeReceiving.add(destination)
+
+            if not evacuated:
+                continue
+
+            utilization = tentativeUtilization
+            placement.update(tentativePlacement)
+            receiving.update(tentativeReceiving)
+            active[source] = False
+            for vm in hostVMs.pop(sourceHost.uid):
+                plan.append((vm, tentativePlacement[vm.uid]))
+                hostVMs.setdefault(tentativePlacement[vm.uid].uid, []).append(vm)
+
+        # Apply Migration Plan
+
+        report.plannedMigrations = len(plan)
+        hostsWithVMs = set(vm.host.uid for vm in self.networkVMs)
+        for vm, destinationHost in plan:
+            migrationReport = self.migrate_vm(vm, vm.host, destinationHost)
+            if migrationReport:
+                report.appliedMigrations += 1
+                report.migrationReports.append(migrationReport)
+            else:
+                report.failedMigrations += 1
+        report.hostsFreed = len(hostsWithVMs - set(vm.host.uid for vm in self.networkVMs))
+
+        report.energyAfter = sum(h.sample_total_energy_consumption() for h in self.networkHosts)
+        report.energySaved = report.energyBefore - report.energyAfter
+        report.elapsed = time.perf_counter() - startTime
+        logger.info("Consolidation done. " + str(report))
+        return report
+
     # Traffic Flows Management
 
+    # Failure Injection
+
+    def _release_flows(self, connection_object: Connection) -> None:
+        """ give back the bandwidth of a connection and take it out of the link index """
+
+        for flows in self._connection_segment_flows(connection_object):
+            for segment, share in flows:
+                for edge in range(len(segment) - 1):
+                    self._adjust_link_bandwidth(segment[edge], segment[edge + 1], share)
+        self._unindex_connection_links(connection_object)
+
+    def _take_links_down(self, link_objects: list[Link], update_latency=True) -> set[Connection]:
+        """ release the connections crossing the links, then remove the links from the graph (kept in
+        failedLinks), returns the released connections. update_latency=False leaves the latency matrix to
+        the caller (remove_link updates it once the link is out of networkLinks) """
+
+        affected = set()
+        for linkObject in link_objects:
+            affected.update(self.linkConnections.get(linkObject.uid, ()))
+        for connection in affected:
+            self._release_flows(connection)
+
+        for linkObject in link_objects:
+            u, v = linkObject.source.uid, linkObject.destination.uid
+            self.failedLinks[linkObject.uid] = [u, v, self.topologyGraph[u][v]]
+            self.topologyGraph.remove_edge(u, v)
+            self._topology_changed(u, v)
+            if update_latency:
+                self._latency_link_removed(linkObject)
+        self._entities_changed()
+
+        return affected
+
+    def _bring_link_up(self, link_uid: int) -> None:
+
+        u, v, attributes = self.failedLinks.pop(link_uid)
+        self.topologyGraph.add_edge(u, v, **attributes)
+        self._topology_changed(u, v)
+        self._latency_link_added(self.linksByUid[link_uid])
+        self._entities_changed()
+
+    def _reroute_connections(self, connections: list[Connection]) -> list[Connection]:
+        """ route released connections again on one path per chain segment, sharing the residual bandwidth
+        in one pass as start_traffic_batch does, returns the connections that could not be rerouted. A split
+        connection keeps its split (the same shares over as many shortest paths per segment, as in migrate_vm) """
+
+        pathCache = {}
+        residual = {}
+        rerouted = []
+        dropped = []
+        for connection in connections:
+            chain = connection.userObject.userChain.chain
+            waypoints = [connection.userObject.uid] + [vm.host.uid for vm in chain]
+            if connection.segmentFlows is not None:
+                segmentFlows = self._split_connection_again(connection, waypoints, residual)
+                if segmentFlows is None:
+                    dropped.append(connection)
+                    continue
+                connection.segmentFlows = segmentFlows
+                connection.nodePath = self._primary_node_path(segmentFlows)
+                rerouted.append(connection)
+                continue
+
+            nodePath = [waypoints[0]]
+            for n in range(len(waypoints) - 1):
+                segment = self._cached_path(pathCache, waypoints[n], waypoints[n + 1])
+                if segment is None:
+                    nodePath = None
+                    break
+                nodePath.extend(segment[1:])
+            if nodePath is None:
+                dropped.append(connection)
+                continue
+
+            demand = {}
+            for edge in range(len(nodePath) - 1):
+                u, v = nodePath[edge], nodePath[edge + 1]
+                key = (u, v) if u < v else (v, u)
+                demand[key] = demand.get(key, 0) + connection.userObject.bandwidth
+            for key in demand:
+                if key not in residual:
+                    residual[key] = self.topologyGraph[key[0]][key[1]]["bandwidth"]
+            if any(residual[key] - amount <= 0 for key, amount in demand.items()):
+                dropped.append(connection)
+                continue
+
+            for key, amount in demand.items():
+                residual[key] -= amount
+            connection.nodePath = nodePath
+            connection.segmentFlows = None
+            rerouted.append(connection)
+
+        for (u, v), bandwidthAfter in residual.items():
+            self._set_link_bandwidth(u, v, bandwidthAfter)
+        for connection in rerouted:
+            self._index_connection_links(connection)
+
+        return dropped
+
+    def _split_connection_again(self, connection_object: Connection, waypoints: list[int],
+                                residual: dict) -> list | None:
+        """ split every segment of a released split connection with its previous shares, taking the bandwidth
+        from residual (as _split_segment does), None (and residual unchanged) if a segment does not fit """
+
+        segmentFlows = []
+        for n, oldFlows in enumerate(connection_object.segmentFlows):
+            flows = self._split_segment(waypoints[n], waypoints[n + 1], connection_object.userObject.bandwidth,
+                                        residual, len(oldFlows), [share for _, share in oldFlows], False)
+            if flows is None:
+                for planned in segmentFlows:
+                    for path, share in planned:
+                        for u, v in zip(path[:-1], path[1:]):
+                            residual[(u, v) if u < v else (v, u)] += share
+                return None
+            segmentFlows.append(flows)
+        return segmentFlows
+
+    def _recover_connections(self, affected: set[Connection], report: FailureReport) -> None:
+        """ reroute the released connections, the ones without a path or bandwidth are dropped """
+
+        dropped = self._reroute_connections(sorted(affected, key=lambda c: c.uid))
+
+        if dropped:
+            droppedSet = set(dropped)
+            self.trafficActivityList = [c for c in self.trafficActivityList if c not in droppedSet]
+            for connection in dropped:
+                for vm in connection.userObject.userChain.chain:
+                    self.vmConnections[vm.uid].discard(connection)
+                connection.active = False
+                self._connection_changed(connection)
+
+        report.affectedConnections = len(affected)
+        report.reroutedConnections = len(affected) - len(dropped)
+        report.droppedConnections = dropped
+        self.metrics.increment("failure_rerouted_connections_total", report.reroutedConnections)
+        self.metrics.increment("failure_dropped_connections_total", len(dropped))
+
+    @timed("fail_link_seconds")
+    @recorded
+    def fail_link(self, link_object: Link) -> FailureReport:
+        """ take a link down, the connections crossing it are rerouted (found through the link index) """
+
+        startTime = time.perf_counter()
+        report = FailureReport("link", link_object.uid)
+        if link_object.uid in self.failedLinks:
+            logger.warning("Link " + str(link_object.uid) + " is already down.")
+            return report
+
+        affected = self._take_links_down([link_object])
+        self._recover_connections(affected, report)
+
+        report.recoveryTime = time.perf_counter() - startTime
+        self.metrics.increment("failures_total", element="link")
+        logger.info("Failure injected: " + str(report))
+        return report
+
+    @recorded
+    def repair_link(self, link_object: Link) -> bool:
+        """ bring a failed link up again, connections keep their current paths """
+
+        if link_object.uid not in self.failedLinks:
+            logger.warning("Link " + str(link_object.uid) + " is not down.")
+            return False
+        for hostUid in (link_object.source.uid, link_object.destination.uid):
+            if hostUid in self.failedHosts:
+                logger.warning("Link " + str(link_object.uid) + " is attached to failed host " + str(hostUid) + ".")
+                return False
+
+        self._bring_link_up(link_object.uid)
+        self.metrics.increment("repairs_total", element="link")
+        return True
+
+    @timed("fail_host_seconds")
+    @recorded
+    def fail_host(self, host_object: Host) -> FailureReport:
+        """ take a host and its links down: its VMs are placed again on the best fitting working hosts,
+        then the connections through those VMs or links are rerouted """
+
+        startTime = time.perf_counter()
+        report = FailureReport("host", host_object.uid)
+        if host_object.uid in self.failedHosts:
+            logger.warning("Host " + str(host_object.uid) + " is already down.")
+            return report
+
+        # Release every connection through the host before its VMs move
+
+        vms = list(self.hostVMs.get(host_object.uid, ()))
+        links = []
+        for _, _, attributes in self.topologyGraph.edges(host_object.uid, data=True):
+            if attributes["uid"] in self.linksByUid:  # VM attachments are not links
+                links.append(self.linksByUid[attributes["uid"]])
+        affected = set()
+        for vm in vms:
+            affected.update(self.vmConnections.get(vm.uid, ()))
+        for connection in affected:
+            self._release_flows(connection)
+        affected.update(self._take_links_down(links))
+        self.failedHosts[host_object.uid] = [linkObject.uid for linkObject in links]
+
+        # Relocate the VMs (best fit: the working host left with the least CPU slack)
+
+        capacity, utilization = self._host_capacity_state()
+        working = np.ones(len(self.networkHosts), dtype=bool)
+        for hostUid in self.failedHosts:
+            working[self.hostIndex[hostUid]] = False
+        for vm in sorted(vms, key=lambda x: x.service.CPU_requirements, reverse=True):
+            requirement = np.array((vm.service.CPU_requirements, vm.service.RAM_requirements,
+                                    vm.service.storage_requirements), dtype=float)
+            residual = capacity - utilization
+            feasible = np.flatnonzero(working & np.all(residual >= requirement, axis=1))
+            if not len(feasible):
+                report.lostVMs.append(vm)
+                continue
+            row = feasible[np.argmin(residual[feasible, 0])]
+            destinationHost = self.networkHosts[row]
+
+            if destinationHost.instantiate_service(vm.service):
+                report.lostVMs.append(vm)
+                continue
+            if host_object.kill_service(vm.service):
+                logger.error("VM with uid " + str(vm.uid) + " held no resources in failed host " + str(
+                    host_object.uid) + ", nothing released there.")
+            utilization[row] += requirement
+            self.topologyGraph.remove_edge(vm.uid, host_object.uid)
+            self.topologyGraph.add_edge(vm.uid, destinationHost.uid, uid=vm.uid, color='g', style="dashed",
+                                        weight=1, length=12, delay=99999, bandwidth=0, loss=100)
+            vm.host = destinationHost
+            self.hostVMs[host_object.uid].discard(vm)
+            self.hostVMs.setdefault(destinationHost.uid, set()).add(vm)
+            self._host_changed(destinationHost.uid)
+            self._vm_changed(vm, host_object.uid, False)
+            self._vm_changed(vm, destinationHost.uid, True)
+            report.relocatedVMs += 1
+        self._host_changed(host_object.uid)
+
+        self._recover_connections(affected, report)
+
+        report.recoveryTime = time.perf_counter() - startTime
+        self.metrics.increment("failures_total", element="host")
+        logger.info("Failure injected: " + str(report))
+        return report
+
+    @recorded
+    def repair_host(self, host_object: Host) -> bool:
+        """ bring a failed host and its links up again, relocated VMs stay where they are """
+
+        if host_object.uid not in self.failedHosts:
+            logger.warning("Host " + str(host_object.uid) + " is not down.")
+            return False
+
+        for linkUid in self.failedHosts.pop(host_object.uid):
+            if linkUid in self.failedLinks:
+                self._bring_link_up(linkUid)
+        self.metrics.increment("repairs_total", element="host")
+        return True
+
+    @timed("create_connection_seconds")
     def create_connection(self, user_object: User) -> bool | list[any]:
 
-        # Calculate Available Route (Dijkstra)
+        # Calculate Available Route (Dijkstra, hierarchical across domains)
 
         chainNodePath = []
         try:
-            nodePath = nx.single_source_dijkstra(self.topologyGraph, user_object.uid,
-                                                 user_object.userChain.chain[0].host.uid, weight='delay')
+            nodePath = self.shortest_path(user_object.uid, user_object.userChain.chain[0].host.uid)
         except nx.NetworkXNoPath:
             logger.error("except NetworkXNoPath")
             return False
@@ -500,8 +1826,8 @@ class Network:
         for n in range(len(user_object.userChain.chain) - 1):
             chainNodePath = chainNodePath[:-1]
             try:
-                nodePath = nx.single_source_dijkstra(self.topologyGraph, user_object.userChain.chain[n].host.uid,
-                                                     user_object.userChain.chain[n + 1].host.uid, weight='delay')
+                nodePath = self.shortest_path(user_object.userChain.chain[n].host.uid,
+                                              user_object.userChain.chain[n + 1].host.uid)
             except nx.NetworkXNoPath:
                 return False
             chainNodePath.extend(nodePath[1])
@@ -511,13 +1837,14 @@ class Network:
             logger.info(" |- VM [" + str(user_object.userChain.chain[h].uid) + "] in host (" + str(
                 user_object.userChain.chain[h].host.uid) + ")")
 
-        # Allocate bandwidth on Links
+        # Allocate bandwidth on Links, only once every link of the path has it (a path may cross a link twice)
 
+        demand = dict()
         for edge in range(len(chainNodePath) - 1):
             linkAttributesJSON = self.topologyGraph.get_edge_data(chainNodePath[edge], chainNodePath[edge + 1])
-            linkbandwidth = linkAttributesJSON["bandwidth"]
             linkuid = linkAttributesJSON["uid"]
-            bandwidthAfter = linkbandwidth - user_object.bandwidth
+            demand[linkuid] = demand.get(linkuid, 0) + user_object.bandwidth
+            bandwidthAfter = linkAttributesJSON["bandwidth"] - demand[linkuid]
             logger.info(
                 "Link uid: " + str(linkuid) + " bandwidth_after is " + str(bandwidthAfter) + " of connection (" + str(
                     chainNodePath[edge]) + ")-(" + str(chainNodePath[edge + 1]) + ").")
@@ -528,18 +1855,15 @@ class Network:
                 self.suspendedLinks.append([chainNodePath[edge], chainNodePath[edge + 1],
                                             self.topologyGraph[chainNodePath[edge]][chainNodePath[edge + 1]]])
                 self.topologyGraph.remove_edge(chainNodePath[edge], chainNodePath[edge + 1])
+                self._topology_changed(chainNodePath[edge], chainNodePath[edge + 1])
                 return True
-            self.topologyGraph[chainNodePath[edge]][chainNodePath[edge + 1]]['bandwidth'] = bandwidthAfter
 
-            index = 0
-            for link in self.networkLinks:
-                if link.uid == linkuid:
-                    break
-                index += 1
-            self.networkLinks[index].bandwidthUtil = bandwidthAfter
+        for edge in range(len(chainNodePath) - 1):
+            self._adjust_link_bandwidth(chainNodePath[edge], chainNodePath[edge + 1], -user_object.bandwidth)
 
         return chainNodePath
 
+    @recorded
     def unsuspend_links(self) -> None:
         if self.suspendedLinks:
             for link in self.suspendedLinks[:]:
@@ -548,9 +1872,64 @@ class Network:
                                             style=attributesList["style"], weight=attributesList["weight"],
                                             length=attributesList["length"], delay=attributesList["delay"],
                                             bandwidth=attributesList["bandwidth"], loss=attributesList["loss"])
+                self._topology_changed(link[0], link[1])
                 self.suspendedLinks.remove(link)
         return
 
+    def _count_flow_links(self, link_counts: dict, flows: list[tuple[list[int], float]], step: int) -> None:
+        """ add step to the count of every link the flows cross, a link leaves or joins the link index of the
+        connection when its count drops to or rises from zero """
+
+        for segment, _ in flows:
+            for edge in range(len(segment) - 1):
+                linkUid = self.topologyGraph[segment[edge]][segment[edge + 1]]["uid"]
+                count = link_counts.get(linkUid, 0) + step
+                if count:
+                    link_counts[linkUid] = count
+                else:
+                    del link_counts[linkUid]
+
+    def _index_connection_links(self, connection_object: Connection) -> None:
+        connection_object.linkCounts = {}
+        for flows in self._connection_segment_flows(connection_object):
+            self._count_flow_links(connection_object.linkCounts, flows, 1)
+        for linkUid in connection_object.linkCounts:
+            self.linkConnections.setdefault(linkUid, set()).add(connection_object)
+        self._connection_changed(connection_object)
+
+    def _unindex_connection_links(self, connection_object: Connection) -> None:
+        for linkUid in connection_object.linkCounts:
+            self.linkConnections[linkUid].discard(connection_object)
+        connection_object.linkCounts = {}
+        self._connection_changed(connection_object)
+
+    def _move_connection_links(self, connection_object: Connection, released: list, reserved: list) -> None:
+        """ update the link index for the released and reserved flows of a rerouted connection only """
+
+        before = set(connection_object.linkCounts)
+        self._count_flow_links(connection_object.linkCounts, released, -1)
+        self._count_flow_links(connection_object.linkCounts, reserved, 1)
+        for linkUid in before.difference(connection_object.linkCounts):
+            self.linkConnections[linkUid].discard(connection_object)
+        for linkUid in connection_object.linkCounts.keys() - before:
+            self.linkConnections.setdefault(linkUid, set()).add(connection_object)
+        self._connection_changed(connection_object)
+
+    def _index_connection(self, connection_object: Connection) -> None:
+        self.trafficActivityList.append(connection_object)
+        for vm in connection_object.userObject.userChain.chain:
+            self.vmConnections.setdefault(vm.uid, set()).add(connection_object)
+        self._index_connection_links(connection_object)
+
+    def _unindex_connection(self, connection_object: Connection) -> None:
+        self.trafficActivityList.remove(connection_object)
+        for vm in connection_object.userObject.userChain.chain:
+            self.vmConnections[vm.uid].discard(connection_object)
+        connection_object.active = False
+        self._unindex_connection_links(connection_object)
+
+    @timed("start_traffic_seconds")
+    @recorded
     def start_traffic(self, user_object: User) -> bool | Connection:
 
         while True:
@@ -560,6 +1939,8 @@ class Network:
                 break
             elif not chainNodePath:
 
+                cause = "bandwidth" if self.suspendedLinks else "no_path"
+                self.metrics.increment("admission_rejects_total", cause=cause)
                 logger.info("suspended links <<ffXX>> dump: " + str(self.suspendedLinks))
 
                 self.unsuspend_links()
@@ -572,8 +1953,8 @@ class Network:
 
                 return False  # Refuse service
             else:
+                self.metrics.increment("reroute_retries_total")
                 logger.info("Rerouting. Removed unavailable link from graph.")
-                pass
 
         logger.info("suspended links <<ff>> dump: " + str(self.suspendedLinks))
 
@@ -581,37 +1962,240 @@ class Network:
 
         logger.info("suspended links <<rr>> dump: " + str(self.suspendedLinks))
 
-        uid = len(self.trafficActivityList)
-        connectionObject = Connection(uid, chainNodePath, user_object)
-        self.trafficActivityList.append(connectionObject)
+        connectionObject = Connection(self.get_guid(), chainNodePath, user_object)
+        self._index_connection(connectionObject)
+        self.metrics.increment("admissions_total")
+
+        return connectionObject
+
+    def _cached_path(self, path_cache: dict, source_uid: int, target_uid: int) -> list[int] | None:
+
+        if (source_uid, target_uid) not in path_cache:
+            try:
+                path_cache[(source_uid, target_uid)] = self.shortest_path(source_uid, target_uid)[1]
+            except (nx.NetworkXNoPath, nx.NodeNotFound):
+                path_cache[(source_uid, target_uid)] = None
+        return path_cache[(source_uid, target_uid)]
+
+    @timed("start_traffic_batch_seconds")
+    @recorded
+    def start_traffic_batch(self, user_objects: list[User], policy=AdmissionPolicy.ARRIVAL,
+                            reroute=True) -> list[bool | Connection]:
+        """ admit many users in one routing pass, returns a Connection or False per user (in the given order) """
+
+        # Admission Order (stable sort, ties keep arrival order)
+
+        order = list(range(len(user_objects)))
+        if policy == AdmissionPolicy.LARGEST_FIRST:
+            order.sort(key=lambda i: user_objects[i].bandwidth, reverse=True)
+        elif policy == AdmissionPolicy.SLA_PRIORITY:
+            order.sort(key=lambda i: (user_objects[i].userChain.sla is None, user_objects[i].userChain.sla or 0))
+
+        # Shared Chain Paths (one Dijkstra per distinct host pair, one path per distinct host sequence)
+
+        pathCache = {}
+        chainPaths = {}
+        for i in order:
+            hostSequence = tuple(vm.host.uid for vm in user_objects[i].userChain.chain)
+            if hostSequence in chainPaths:
+                continue
+            chainPath = [hostSequence[0]]
+            for n in range(len(hostSequence) - 1):
+                segmentPath = self._cached_path(pathCache, hostSequence[n], hostSequence[n + 1])
+                if segmentPath is None:
+                    chainPath = None
+                    break
+                chainPath.extend(segmentPath[1:])
+            chainPaths[hostSequence] = chainPath
+
+        # Aggregate Bandwidth Check (residual per link, shared by all users of the batch)
+
+        results = [False] * len(user_objects)
+        nodePaths = {}
+        residual = {}
+        rejectedNoPath = 0
+        rejectedBandwidth = []
+        for i in order:
+            user_object = user_objects[i]
+            hostSequence = tuple(vm.host.uid for vm in user_object.userChain.chain)
+            userPath = self._cached_path(pathCache, user_object.uid, hostSequence[0])
+            if userPath is None or chainPaths[hostSequence] is None:
+                rejectedNoPath += 1
+                continue
+            nodePath = userPath + chainPaths[hostSequence][1:]
+
+            demand = {}
+            for edge in range(len(nodePath) - 1):
+                u, v = nodePath[edge], nodePath[edge + 1]
+                key = (u, v) if u < v else (v, u)
+                demand[key] = demand.get(key, 0) + user_object.bandwidth
+            for key in demand:
+                if key not in residual:
+                    residual[key] = self.topologyGraph[key[0]][key[1]]["bandwidth"]
+            if any(residual[key] - amount <= 0 for key, amount in demand.items()):
+                rejectedBandwidth.append(i)
+                continue
+
+            for key, amount in demand.items():
+                residual[key] -= amount
+            nodePaths[i] = nodePath
+
+        # Commit Bandwidth and Connections
+
+        for (u, v), bandwidthAfter in residual.items():
+            self._set_link_bandwidth(u, v, bandwidthAfter)
+
+        for i in order:
+            if i in nodePaths:
+                connectionObject = Connection(self.get_guid(), nodePaths[i], user_objects[i])
+                self._index_connection(connectionObject)
+                results[i] = connectionObject
+
+        self.metrics.increment("admissions_total", len(nodePaths))
+        self.metrics.increment("admission_rejects_total", rejectedNoPath, cause="no_path")
+        if not reroute:
+            self.metrics.increment("admission_rejects_total", len(rejectedBandwidth), cause="bandwidth")
+        logger.info("Batch admission of " + str(len(user_objects)) + " users: " + str(len(nodePaths)) +
+                    " admitted, " + str(len(rejectedBandwidth)) + " without bandwidth, " + str(rejectedNoPath) +
+                    " without path.")
+
+        # Users refused on their shortest paths may still fit on a detour
+        if reroute:
+            for i in rejectedBandwidth:
+                results[i] = self.start_traffic(user_objects[i])
+
+        return results
+
+    def _split_segment(self, source_uid: int, target_uid: int, bandwidth: float, residual: dict, k: int,
+                       split_ratio: list[float] | None, ecmp: bool) -> list[tuple[list[int], float]] | None:
+        """ spread bandwidth over up to k shortest paths between two nodes, None if it does not fit """
+
+        try:
+            paths = []
+            for path in nx.shortest_simple_paths(self.topologyGraph, source_uid, target_uid, weight='delay'):
+                paths.append((nx.path_weight(self.topologyGraph, path, 'delay'), path))
+                if len(paths) == k:
+                    break
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return None
+        self.metrics.increment("dijkstra_calls_total", len(paths), scope="multipath")
+
+        if source_uid == target_uid:
+            return [([source_uid], bandwidth)]
+
+        def edges_of(path: list[int]) -> list[tuple[int, int]]:
+            return [(u, v) if u < v else (v, u) for u, v in zip(path[:-1], path[1:])]
+
+        for u, v in set(edge for _, path in paths for edge in edges_of(path)):
+            if (u, v) not in residual:
+                residual[(u, v)] = self.topologyGraph[u][v]["bandwidth"]
+
+        if ecmp:
+            paths = [(delay, path) for delay, path in paths if delay == paths[0][0]]
+            shares = [bandwidth / len(paths)] * len(paths)
+        elif split_ratio is not None:
+            if len(split_ratio) > len(paths):
+                logger.warning("Split ratio of " + str(len(split_ratio)) + " shares but only " + str(len(paths)) +
+                               " paths between (" + str(source_uid) + ")-(" + str(target_uid) + ").")
+                return None
+            paths = paths[:len(split_ratio)]
+            total = sum(split_ratio)
+            shares = [bandwidth * ratio / total for ratio in split_ratio]
+        else:
+            shares = None
+
+        flows = []
+        left = bandwidth
+        planned = dict()
+        for index, (_, path) in enumerate(paths):
+            # a link keeps some headroom, as in create_connection
+            headroom = min((residual[edge] - planned.get(edge, 0) - MIN_LINK_HEADROOM for edge in edges_of(path)),
+                           default=float('inf'))
+            if shares is None:
+                share = min(left, headroom)
+                if share <= 0:
+                    continue
+            else:
+                share = shares[index]
+                if share > headroom:
+                    return None
+            for edge in edges_of(path):
+                planned[edge] = planned.get(edge, 0) + share
+            flows.append((path, share))
+            left -= share
+            if shares is None and left <= 0:
+                break
+
+        if shares is None and left > 1e-12:
+            return None
+        for edge, amount in planned.items():
+            residual[edge] -= amount
+        return flows
+
+    @timed("start_traffic_multipath_seconds")
+    @recorded
+    def start_traffic_multipath(self, user_object: User, k=3, split_ratio: list[float] | None = None,
+                                ecmp=False) -> bool | Connection:
+        """ admit a user whose bandwidth may be split over up to k shortest paths per chain segment: filling
+        the shortest paths first (default), with a fixed split_ratio over the first paths, or equally over the
+        equal-delay paths (ecmp) """
+
+        waypoints = [user_object.uid] + [vm.host.uid for vm in user_object.userChain.chain]
+        residual = {}
+        segmentFlows = []
+        for n in range(len(waypoints) - 1):
+            flows = self._split_segment(waypoints[n], waypoints[n + 1], user_object.bandwidth, residual, k,
+                                        split_ratio, ecmp)
+            if flows is None:
+                self.metrics.increment("admission_rejects_total", cause="bandwidth")
+                logger.warning("Split chain path of user " + str(user_object.uid) + " COULD NOT BE DEFINED. Not "
+                               "enough bandwidth on the " + str(k) + " shortest paths of segment (" + str(
+                                waypoints[n]) + ")-(" + str(waypoints[n + 1]) + ").")
+                return False
+            segmentFlows.append(flows)
+
+        for flows in segmentFlows:
+            for segment, share in flows:
+                for edge in range(len(segment) - 1):
+                    self._adjust_link_bandwidth(segment[edge], segment[edge + 1], -share)
+
+        connectionObject = Connection(self.get_guid(), self._primary_node_path(segmentFlows),
+                                      user_object, segment_flows=segmentFlows)
+        self._index_connection(connectionObject)
+        self.metrics.increment("admissions_total")
+        pathCount = sum(len(flows) for flows in segmentFlows)
+        logger.info("User uid " + str(user_object.uid) + " admitted over " + str(pathCount) +
+                    " paths, primary chain path: " + str(connectionObject.nodePath))
 
         return connectionObject
 
+    @timed("stop_traffic_seconds")
+    @recorded
     def stop_traffic(self, connection_object: Connection) -> bool:
         if not connection_object:
             logger.warning("Connection does not exist. Service was denied during request.")
             return False
+        if not connection_object.active:
+            logger.warning("Connection " + str(connection_object.uid) + " is not active (stopped or dropped).")
+            return False
         logger.info("stopTraffic(@args) >> connectionObject.nodePath: " + str(connection_object.nodePath))
+        if connection_object.segmentFlows is not None:
+            for flows in connection_object.segmentFlows:
+                for segment, share in flows:
+                    for edge in range(len(segment) - 1):
+                        self._adjust_link_bandwidth(segment[edge], segment[edge + 1], share)
+            self._unindex_connection(connection_object)
+            logger.info("Split traffic connection " + str(connection_object.nodePath) + " stopped successfully.")
+            return True
         for edge in range(len(connection_object.nodePath) - 1):
-            linkAttributesJSON = self.topologyGraph.get_edge_data(connection_object.nodePath[edge],
-                                                                  connection_object.nodePath[edge + 1])
-            linkbandwidth = linkAttributesJSON["bandwidth"]
-            linkuid = linkAttributesJSON["uid"]
-            bandwidthAfter = linkbandwidth + connection_object.userObject.bandwidth
-            self.topologyGraph[connection_object.nodePath[edge]][connection_object.nodePath[edge + 1]][
-                'bandwidth'] = bandwidthAfter
-            index = 0
-            for link in self.networkLinks:
-
-                if link.uid == linkuid:
-                    break
-                index += 1
-            self.networkLinks[index].bandwidthUtil = bandwidthAfter
+            self._adjust_link_bandwidth(connection_object.nodePath[edge], connection_object.nodePath[edge + 1],
+                                        connection_object.userObject.bandwidth)
             logger.info("Traffic stopped in edge: " + str(connection_object.nodePath[edge]))
-        self.trafficActivityList.remove(connection_object)
+        self._unindex_connection(connection_object)
         logger.info("Traffic connection " + str(connection_object.nodePath) + " stopped successfully.")
         return True
 
+    @timed("service_ping_seconds")
     def service_ping(self, connection_object: Connection) -> int:
         if not connection_object:
             logger.error(
@@ -628,6 +2212,7 @@ class Network:
             "servicePing for chain " + str(connection_object.nodePath) + " done with result: " + str(rtt) + "ms.")
         return rtt
 
+    @timed("service_data_seconds")
     def service_data(self, connection_object: Connection) -> int:
         if not connection_object:
             logger.error(
@@ -638,30 +2223,14 @@ class Network:
 
         linkEnergy = 0
         if len(connection_object.nodePath) - 2 != 0:  # is not
-            for i in range(len(connection_object.nodePath) - 2):
-                for link in self.networkLinks:
-                    if link.source.uid == connection_object.nodePath[i] and link.destination.uid == \
-                            connection_object.nodePath[i + 1]:
-                        linkEnergy += link.sample_energy_consumption(link.source.bitsOverhead)
-                        if linkEnergy == 0:
-                            print(linkEnergy)
-                            print(link.source.bitsOverhead)
-                            print(connection_object.nodePath)
-                            print(connection_object.nodePath[i])
-                            print(connection_object.nodePath[i + 1])
-                            exit()
+            hops = len(connection_object.nodePath) - 2
         else:
-            for link in self.networkLinks:
-                if link.source.uid == connection_object.nodePath[0] and link.destination.uid == \
-                        connection_object.nodePath[1]:
-                    linkEnergy += link.sample_energy_consumption(link.source.bitsOverhead)
-                    if linkEnergy == 0:
-                        print(linkEnergy)
-                        print(link.source.bitsOverhead)
-                        print(connection_object.nodePath)
-                        print(connection_object.nodePath[0])
-                        print(connection_object.nodePath[1])
-                        exit()
+            hops = 1
+        for i in range(hops):
+            # the graph edge knows which link the path crosses, whatever direction the link was declared in
+            linkuid = self.topologyGraph[connection_object.nodePath[i]][connection_object.nodePath[i + 1]]["uid"]
+            link = self.linksByUid[linkuid]
+            linkEnergy += link.sample_energy_consumption(link.source.bitsOverhead)
         if linkEnergy == 0:
             print("Zero Energy! ERROR! Dump info:")
             print(connection_object.nodePath)
@@ -684,47 +2253,179 @@ class Network:
         logger.info("SERVICE PERF done with result: " + str(bw) + "Gbps.")
         return bw
 
+    @recorded
     def service_performance_score(self, connection_object: Connection) -> float:
         rtt = self.service_ping(connection_object)
         bw = self.service_perf(connection_object)
         return bw / rtt
 
-    # Interactive Terminal Commands
+    # State Recording
+
+    def recorder_columns(self, max_connections=1024) -> dict[str, int]:
+        """ column widths for a TimeSeriesRecorder fed by record_state, sized for the current topology """
+
+        return {
+            "host_cpu": len(self.networkHosts),
+            "host_ram": len(self.networkHosts),
+            "host_storage": len(self.networkHosts),
+            "host_energy": len(self.networkHosts),
+            "link_utilization": len(self.networkLinks),
+            "connection_uid": max_connections,
+            "connection_rtt": max_connections,
+        }
+
+    def record_state(self, recorder, tick: float) -> None:
+        """ append the host utilization and energy, link utilization and per-connection RTT of this tick """
+
+        hostCount = len(self.networkHosts)
+        capacity, utilization = self._host_capacity_state()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hostRatio = utilization / capacity
+        hostEnergy = np.fromiter((h.sample_energy_consumption() for h in self.networkHosts), dtype=float,
+                                 count=hostCount)
+
+        # bandwidthUtil holds the bandwidth left on the link
+        linkUtilization = np.fromiter((1 - link.bandwidthUtil / link.bandwidthCap for link in self.networkLinks),
+                                      dtype=float, count=len(self.networkLinks))
+
+        connectionUids = np.fromiter((c.uid for c in self.trafficActivityList), dtype=np.int64,
+                                     count=len(self.trafficActivityList))
+        connectionRtt = np.fromiter((sum(self.topologyGraph[c.nodePath[edge]][c.nodePath[edge + 1]]["delay"]
+                                         for edge in range(len(c.nodePath) - 1)) for c in self.trafficActivityList),
+                                    dtype=float, count=len(self.trafficActivityList))
+
+        # Hosts, links and connections beyond the column widths are dropped by the recorder
+        entities = (("hosts", "host_cpu", hostCount), ("links", "link_utilization", len(self.networkLinks)),
+                    ("connections", "connection_uid", len(self.trafficActivityList)))
+        for entity, column, count in entities:
+            dropped = count - recorder.columns[column]
+            if dropped <= 0:
+                continue
+            self.metrics.increment("recorder_dropped_total", dropped, entity=entity)
+            if recorder.truncated[column] == 0:
+                logger.warning(str(count) + " " + entity + " but the recorder keeps " + str(
+                    recorder.columns[column]) + ", the rest are not recorded. Size the recorder with "
+                    "recorder_columns() of the grown network (max_connections for connections).")
+
+        recorder.append(tick, host_cpu=hostRatio[:, 0], host_ram=hostRatio[:, 1], host_storage=hostRatio[:, 2],
+                        host_energy=hostEnergy, link_utilization=linkUtilization, connection_uid=connectionUids,
+                        connection_rtt=connectionRtt)
 
-    def print_topology(self) -> None:
-
-        plt.figure(1)
-        plt.clf()
-
-        # Positions for all nodes
-        pos = nx.spring_layout(self.topologyGraph)
-
-        # Fetch graph attributes / Calculate graph element attributes
-        edges = self.topologyGraph.edges()
-        colors = [self.topologyGraph[u][v]['color'] for u, v in edges]
-        weights = [self.topologyGraph[u][v]['weight'] for u, v in edges]
-        lengths = [self.topologyGraph[u][v]['length'] for u, v in edges]
-        styles = [self.topologyGraph[u][v]['style'] for u, v in edges]
-
-        nodes = self.topologyGraph.nodes()
-        shapes = set((aShape[1]["shapes"] for aShape in nodes(data=True)))
-
-        # Blue nodes: Servers, size = capacity
-        # Magenta nodes: Users
-        for aShape in shapes:
-            nx.draw_networkx_nodes(self.topologyGraph, pos, node_size=700, node_shape=aShape,
-                                   nodelist=[sNode[0] for sNode in filter(lambda x: x[1]["shapes"] == aShape,
-                                                                          self.topologyGraph.nodes(data=True))])
+    # Interactive Terminal Commands
 
-        # Solid lines: optical links, size = free capacity
-        # Magenta dashed lines: wireless links, size = free capacity.
-        nx.draw_networkx_edges(self.topologyGraph, pos, edgelist=self.topologyGraph.edges, edge_color=colors,
-                               style=styles, width=weights)  # length=lengths
-        nx.draw_networkx_labels(self.topologyGraph, pos, font_size=20, font_family='sans-serif')
+    def _layout_positions(self, graph: nx.Graph, view: str, relayout=False) -> dict:
+        """ cached layout, only nodes without a position are placed (next to their placed neighbours) """
+
+        positions = self.layoutCache[view]
+        for node in [node for node in positions if node not in graph]:
+            del positions[node]
+
+        if relayout or not positions:
+            positions.clear()
+            positions.update(nx.spring_layout(graph, seed=0))
+            return positions
+
+        rng = np.random.default_rng(len(positions))
+        for node in graph:
+            if node not in positions:
+                neighbours = [positions[n] for n in graph.neighbors(node) if n in positions]
+                center = np.mean(neighbours, axis=0) if neighbours else rng.uniform(-1, 1, 2)
+                positions[node] = center + rng.normal(0, 0.02, 2)
+        return positions
+
+    def _topology_snapshot(self, hosts_only: bool, relayout: bool, labels: bool) -> dict:
+        """ everything needed to draw the topology, copied so the rendering can run while the network changes """
+
+        if hosts_only:
+            # Aggregated view: hosts sized by the VMs and users they serve, links sized by their utilization
+            graph = nx.Graph()
+            load = {}
+            for host in self.networkHosts:
+                graph.add_node(host.uid)
+                load[host.uid] = len(host.runningServices)
+            for link in self.networkLinks:
+                u, v = link.source.uid, link.destination.uid
+                if u in load and v in load:
+                    graph.add_edge(u, v, color='skyblue', style="solid",
+                                   weight=1 + 4 * (1 - link.bandwidthUtil / link.bandwidthCap))
+                elif u in load or v in load:
+                    load[u if u in load else v] += 1
+            view = "hosts"
+        else:
+            graph = self.topologyGraph
+            view = "full"
+
+        positions = self._layout_positions(graph, view, relayout)
+
+        shapeNodes = {}
+        for node, attributes in graph.nodes(data=True):
+            shapeNodes.setdefault(attributes.get("shapes", "o"), []).append(node)
+        nodes = []
+        for shape, nodeList in shapeNodes.items():
+            sizes = [100 + 50 * load[n] for n in nodeList] if hosts_only else 700
+            nodes.append((shape, np.array([positions[n] for n in nodeList]).reshape(-1, 2), sizes))
+
+        edges = list(graph.edges(data=True))
+        return {
+            "nodes": nodes,
+            "segments": np.array([(positions[u], positions[v]) for u, v, _ in edges]).reshape(-1, 2, 2),
+            "colors": [attributes['color'] for _, _, attributes in edges],
+            "widths": [attributes['weight'] for _, _, attributes in edges],
+            "styles": [attributes['style'] for _, _, attributes in edges],
+            "labels": [(positions[n], str(n)) for n in graph] if labels else [],
+        }
 
-        plt.axis('off')
-        plt.savefig("./figures/topology.png", format="PNG")
-        plt.clf()
+    @staticmethod
+    def _render_topology(snapshot: dict, path: str) -> None:
+
+        # Drawn on the Agg canvas without pyplot, so rendering is headless and thread safe. Imported here since
+        # matplotlib is most of the import time of vnfnet and only figures need it
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.collections import LineCollection
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=(12, 12))
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
+
+        # Solid lines: optical links, size = capacity (utilization in the hosts view)
+        # Magenta dashed lines: wireless links. Green dashed lines: VM placement.
+        axes.add_collection(LineCollection(snapshot["segments"], colors=snapshot["colors"],
+                                           linewidths=snapshot["widths"], linestyles=snapshot["styles"], zorder=1))
+        # o: hosts, v: users, ^: VMs
+        for shape, positions, sizes in snapshot["nodes"]:
+            axes.scatter(positions[:, 0], positions[:, 1], s=sizes, marker=shape, zorder=2)
+        for (x, y), text in snapshot["labels"]:
+            axes.text(x, y, text, fontsize=20, family='sans-serif', ha='center', va='center', zorder=3)
+
+        axes.autoscale()
+        axes.axis('off')
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        figure.savefig(path, format="PNG")
+
+    def print_topology(self, path="./figures/topology.png", hosts_only=None, background=False,
+                       relayout=False) -> Future | None:
+        """ hosts_only defaults to the aggregated host view above 500 nodes. With background the figure is
+        rendered by a worker thread and a Future is returned, a snapshot is skipped while one is still rendering """
+
+        if hosts_only is None:
+            hosts_only = self.topologyGraph.number_of_nodes() > 500
+        labels = not hosts_only or len(self.networkHosts) <= 500
+
+        if not background:
+            self._render_topology(self._topology_snapshot(hosts_only, relayout, labels), path)
+            return None
+
+        if self.renderFuture is not None and not self.renderFuture.done():
+            logger.info("Topology rendering still in progress, snapshot skipped.")
+            return self.renderFuture
+        if self.renderExecutor is None:
+            self.renderExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="TopologyRenderer")
+        snapshot = self._topology_snapshot(hosts_only, relayout, labels)
+        self.renderFuture = self.renderExecutor.submit(self._render_topology, snapshot, path)
+        return self.renderFuture
 
     def print_hosts(self) -> None:
         print("[Hosts in Network: " + str(len(self.networkHosts)) + "]")